@@ -1,4 +1,5 @@
-from typing import AsyncGenerator
+from functools import lru_cache
+from typing import AsyncGenerator, Optional
 
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
@@ -10,6 +11,10 @@ from app import schemas
 from app.core import security
 from app.models.user import User
 from app.db.session import async_session
+from app.core.config import settings
+from app.services.analyzer.prediction_cache import PredictionCache
+from app.services.model_registry import ModelRegistry
+from app.services.api_cache import ResponseCache, shared_response_cache
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl="auth/access-token")
 
@@ -22,6 +27,22 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+@lru_cache()
+def get_prediction_cache() -> Optional[PredictionCache]:
+    if not settings.PREDICTION_CACHE_PATH:
+        return None
+    return PredictionCache(settings.PREDICTION_CACHE_PATH)
+
+
+@lru_cache()
+def get_model_registry() -> ModelRegistry:
+    return ModelRegistry(ttl=settings.MODEL_REGISTRY_TTL)
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    return shared_response_cache()
+
+
 async def get_user_db(session: AsyncSession = Depends(get_session)):
     yield SQLAlchemyUserDatabase(schemas.UserDB, session, User)
 
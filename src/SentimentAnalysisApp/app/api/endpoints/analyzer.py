@@ -1,13 +1,14 @@
 """
 Created by Frantisek Sabol
 """
-from typing import Any, List
+from typing import Any, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models, schemas
 from app.services.analyzer import get_extractor, extract_aspects, clean
+from app.services.analyzer.prediction_cache import PredictionCache
 from app.api import deps
 
 router = APIRouter()
@@ -20,12 +21,14 @@ async def analyze_text(
         review: schemas.ReviewCreate,
         model: str = None,
         current_user: models.User = Depends(deps.get_current_active_user),
+        cache: Optional[PredictionCache] = Depends(deps.get_prediction_cache),
 ) -> Any:
     """
     Uses service app.services.analyzer to extract aspects from text
     """
     extractor = get_extractor(model_name=model)
-    results = extract_aspects(text=clean(review.text), language=review.language, extractor=extractor)
+    results = extract_aspects(text=clean(review.text), language=review.language, extractor=extractor, cache=cache,
+                              model_name=extractor.model_name)
     # return original text and result aspect and sentiment for result in results
     review = await crud.review.create(db=db, obj_in=review)
     aspects = []
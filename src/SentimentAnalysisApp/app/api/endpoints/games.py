@@ -5,12 +5,13 @@ from collections import Counter
 from datetime import datetime
 from typing import Any, List, Optional, Dict, Tuple, Literal, Union
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, func, and_
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models, schemas
 from app.api import deps
+from app.services.model_registry import ModelRegistry
+from app.services.api_cache import ResponseCache, cached_json_response
 
 router = APIRouter()
 
@@ -33,17 +34,13 @@ async def read_game(
 async def read_game(
         *,
         db: AsyncSession = Depends(deps.get_session),
+        registry: ModelRegistry = Depends(deps.get_model_registry),
         id: int
 ) -> Any:
     """
     Get game by ID.
     """
-    result = await db.execute(select(models.Aspect.model_id, func.count(models.Aspect.id))
-                              .join(models.Review,
-                                    and_(models.Review.id == models.Aspect.review_id, models.Review.game_id == id))
-                              .group_by(models.Aspect.model_id)
-                              .order_by(func.count(models.Aspect.id).desc()).limit(1))
-    model_id = result.scalars().first()
+    model_id = await registry.get_most_utilized_model(db, game_id=id)
     game = await crud.game.get_game_list_item(db=db, id=id, model_id=model_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
@@ -70,8 +67,10 @@ async def delete_game(
 @router.get("/", response_model=schemas.GameListResponse)
 async def read_games(*,
                      db: AsyncSession = Depends(deps.get_session),
+                     registry: ModelRegistry = Depends(deps.get_model_registry),
                      limit: int = 100,
                      offset: int = 0,
+                     cursor: Optional[str] = None,
                      num_reviews: Optional[Literal['asc', 'desc']] = None,
                      score: Optional[Literal['asc', 'desc']] = None,
                      release_date: Optional[Literal['asc', 'desc']] = None,
@@ -87,6 +86,7 @@ async def read_games(*,
                      ) -> schemas.GameListResponse:
     """
     Get list of games.
+    Pass next_cursor of a page as cursor to get the next page (offset is ignored).
     """
     sort = schemas.GameListSort(
         num_reviews=num_reviews,
@@ -105,14 +105,13 @@ async def read_games(*,
         developers=developers.split(',') if developers else None
     )
     # most utilized model
-    result = await db.execute(select(models.Aspect.model_id, func.count(models.Aspect.id))
-                              .join(models.Review,
-                                    and_(models.Review.id == models.Aspect.review_id))
-                              .group_by(models.Aspect.model_id)
-                              .order_by(func.count(models.Aspect.id).desc()).limit(1))
-    model_id = result.scalars().first()
-
-    glist = await crud.game.get_game_list(db, limit=limit, offset=offset, filter=filter, sort=sort, model_id=model_id)
+    model_id = await registry.get_most_utilized_model(db)
+
+    try:
+        glist = await crud.game.get_game_list(db, limit=limit, offset=offset, cursor=cursor, filter=filter, sort=sort,
+                                              model_id=model_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return glist
 
 
@@ -165,7 +164,10 @@ async def get_sources(*,
 
 @router.get("/{id}/summary/v2/{time_interval}", response_model=schemas.ReviewsSummaryV2)
 async def get_summary_v2(*,
+                         request: Request,
                          db: AsyncSession = Depends(deps.get_session),
+                         registry: ModelRegistry = Depends(deps.get_model_registry),
+                         cache: Optional[ResponseCache] = Depends(deps.get_response_cache),
                          id: int,
                          time_interval: str = "day"):
     # validate time interval
@@ -175,44 +177,47 @@ async def get_summary_v2(*,
     allowed_time_intervals = ["hour", "day", "week", "month", "year"]
     if time_interval not in allowed_time_intervals:
         raise HTTPException(status_code=400, detail=f"Invalid time interval. Possible values: {allowed_time_intervals}")
-    # get recent model
-    result = await db.execute(select(models.Aspect.model_id, func.count(models.Aspect.id))
-                              .group_by(models.Aspect.model_id)
-                              .order_by(func.count(models.Aspect.id).desc()).limit(1))
-    model_id = result.scalars().first()
-    # get summary
-    summary = await crud.review.get_summary_v2(db, game_id=id, time_interval=time_interval, model=model_id)
-    return summary
+
+    async def compute():
+        # get recent model
+        model_id = await registry.get_most_utilized_model(db)
+        # get summary
+        return await crud.review.get_summary_v2(db, game_id=id, time_interval=time_interval, model=model_id)
+
+    return await cached_json_response(request, cache, compute, game_id=id)
 
 
 @router.get("/{id}/summary/aspects", response_model=schemas.AspectsSummary)
 async def get_aspect_summary(*,
+                             request: Request,
                              db: AsyncSession = Depends(deps.get_session),
+                             registry: ModelRegistry = Depends(deps.get_model_registry),
+                             cache: Optional[ResponseCache] = Depends(deps.get_response_cache),
                              id: int,
                              group_by: Optional[str] = None,
                              time_interval: str = "day"
                              ) -> schemas.AspectsSummary:
-    # get recent model
-    result = await db.execute(select(models.Aspect.model_id, func.count(models.Aspect.id))
-                              .group_by(models.Aspect.model_id)
-                              .order_by(func.count(models.Aspect.id).desc()).limit(1))
-    model_id = result.scalars().first()
-    if group_by is None:
-        summary = await crud.review.get_aspect_summary_by_category_and_sources(
-            db, game_id=id, model=model_id)
-        summary2 = await crud.review.get_aspects_summary_by_date_and_categories(
-            db, game_id=id, model=model_id, time_interval=time_interval)
-        summary.dates = summary2.dates
-
-    elif group_by == "source":
-        summary = await crud.review.get_aspect_summary_by_category_and_sources(
-            db, game_id=id, model=model_id)
-    elif group_by == "date":
-        summary = await crud.review.get_aspects_summary_by_date_and_categories(
-            db, game_id=id, model=model_id, time_interval=time_interval)
-    else:
+    if group_by not in (None, "source", "date"):
         raise HTTPException(status_code=400, detail="Invalid group_by parameter")
-    return summary
+
+    async def compute():
+        # get recent model
+        model_id = await registry.get_most_utilized_model(db)
+        if group_by is None:
+            summary = await crud.review.get_aspect_summary_by_category_and_sources(
+                db, game_id=id, model=model_id)
+            summary2 = await crud.review.get_aspects_summary_by_date_and_categories(
+                db, game_id=id, model=model_id, time_interval=time_interval)
+            summary.dates = summary2.dates
+        elif group_by == "source":
+            summary = await crud.review.get_aspect_summary_by_category_and_sources(
+                db, game_id=id, model=model_id)
+        else:
+            summary = await crud.review.get_aspects_summary_by_date_and_categories(
+                db, game_id=id, model=model_id, time_interval=time_interval)
+        return summary
+
+    return await cached_json_response(request, cache, compute, game_id=id)
 
 
 
@@ -220,12 +225,13 @@ async def get_aspect_summary(*,
 
 @router.get("/search/", response_model=List[str])
 async def get_name_matches(*,
+                           request: Request,
                            db: AsyncSession = Depends(deps.get_session),
+                           cache: Optional[ResponseCache] = Depends(deps.get_response_cache),
                            name: str,
                            limit: int = 10
                            ) -> List[str]:
-    matches = await crud.game.get_matches(db, name=name, limit=limit)
-    return matches
+    return await cached_json_response(request, cache, lambda: crud.game.get_matches(db, name=name, limit=limit))
 
 
 @router.get("/search/developers", response_model=List[schemas.Developer])
@@ -248,20 +254,19 @@ async def get_categories(*, db: AsyncSession = Depends(deps.get_session), name:
 
 @router.get("/{id}/aspects/wordcloud", response_model=schemas.AspectWordcloud)
 async def get_wordcloud(
-        *, db: AsyncSession = Depends(deps.get_session), id: int, limit: int = 100
+        *, request: Request, db: AsyncSession = Depends(deps.get_session), id: int, limit: int = 100,
+        registry: ModelRegistry = Depends(deps.get_model_registry),
+        cache: Optional[ResponseCache] = Depends(deps.get_response_cache)
 ) -> schemas.AspectWordcloud:
-    # most utilized model
-    result = await db.execute(select(models.Aspect.model_id, func.count(models.Aspect.id))
-                              .join(models.Review,
-                                    and_(models.Review.id == models.Aspect.review_id, models.Review.game_id == id))
-                              .group_by(models.Aspect.model_id)
-                              .order_by(func.count(models.Aspect.id).desc()).limit(1))
-    model_id = result.scalars().first()
-    # get words
-    wordcloud = await crud.aspect.get_wordcloud(db, game_id=id, model_id=model_id)
-    for c in wordcloud.categories.values():
-        c.positive = c.positive[:limit]
-        c.negative = c.negative[:limit]
-        c.neutral = c.neutral[:limit]
-
-    return wordcloud
+    async def compute():
+        # most utilized model
+        model_id = await registry.get_most_utilized_model(db, game_id=id)
+        # get words
+        wordcloud = await crud.aspect.get_wordcloud(db, game_id=id, model_id=model_id)
+        for c in wordcloud.categories.values():
+            c.positive = c.positive[:limit]
+            c.negative = c.negative[:limit]
+            c.neutral = c.neutral[:limit]
+        return wordcloud
+
+    return await cached_json_response(request, cache, compute, game_id=id)
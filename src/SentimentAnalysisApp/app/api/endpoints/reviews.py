@@ -38,10 +38,12 @@ async def read_reviews(
         polarity: Optional[str] = None,
         model: Optional[str] = None,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        cursor: Optional[str] = None
 ) -> Any:
     """
     Read all reviews.
+    Pass next_cursor of a page as cursor to get the next page (skip is ignored).
     """
     model = model.split(",") if model else None
     aspects = aspect.split(",") if aspect else []
@@ -54,13 +56,17 @@ async def read_reviews(
     polarities = polarities if len(polarities) > 0 else None
 
 
-    result = await crud.review.get_multi_with_aspects(db,
-                                                      model_ids=model,
-                                                      game_id=game_id,
-                                                      aspects=aspects,
-                                                      polarities=polarities,
-                                                      offset=skip,
-                                                      limit=limit)
+    try:
+        result = await crud.review.get_multi_with_aspects(db,
+                                                          model_ids=model,
+                                                          game_id=game_id,
+                                                          aspects=aspects,
+                                                          polarities=polarities,
+                                                          offset=skip,
+                                                          limit=limit,
+                                                          cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return result
 
@@ -72,6 +72,20 @@ class Settings(BaseSettings):
     # GAMESPOT API KEY
     GAMESPOT_API_KEY: str
 
+    # ANALYZER
+    # SQLite cache of predictions of the analyze endpoint, disabled if empty
+    PREDICTION_CACHE_PATH: str = ""
+    # seconds the API reuses the most utilized model of a game (see app/services/model_registry.py)
+    MODEL_REGISTRY_TTL: float = 300.0
+
+    # API RESPONSE CACHE (see app/services/api_cache.py)
+    # "redis://host:port/db" (shared with and invalidated by the analyzer and scraper),
+    # "memory://" (per process, not invalidated, entries are served until they expire), disabled if empty
+    RESPONSE_CACHE_URL: str = ""
+    # seconds a cached response is served
+    RESPONSE_CACHE_TTL: float = 600.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+
     # VALIDATORS
     @validator("BACKEND_CORS_ORIGINS")
     def _assemble_cors_origins(cls, cors_origins: Union[str, List[AnyHttpUrl]]):
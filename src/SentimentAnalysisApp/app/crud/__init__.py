@@ -1,10 +1,11 @@
-from .review import crud_review as review
-from .game import crud_game as game, crud_category as category
+from .review import crud_review as review, crud_review_stats as review_stats
+from .game import crud_game as game, crud_category as category, crud_game_stats as game_stats
 from .source import crud_source as source
 from .reviewer import crud_reviewer as reviewer
 from .aspect import crud_aspect as aspect
 from .developer import crud_developer as developer
 from .scraper import crud_scraper as scraper
+from .scraper import crud_scraping_job as scraping_job
 from .analyzer import crud_analyzer as analyzer
 from .analyzer import crud_analyzed_review as analyzed_review
 from .analyzer import crud_analyzed_review_sentence as analyzed_review_sentence
@@ -1,13 +1,16 @@
 """
 Created by Frantisek Sabol
 """
-from typing import List
-from sqlalchemy import func
+from datetime import datetime
+from typing import List, Optional, Iterable, Dict, Tuple
+from sqlalchemy import func, delete, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from app import models, schemas
 from .base import CRUDBase
+from .game import crud_game_stats
+from .review import crud_review, crud_review_stats
 
 
 class CRUDAnalyzer(CRUDBase[models.AnalyzedReview, schemas.AnalyzedReviewCreate, schemas.AnalyzedReviewUpdate]):
@@ -70,6 +73,117 @@ class CRUDAnalyzer(CRUDBase[models.AnalyzedReview, schemas.AnalyzedReviewCreate,
                                                           .limit(limit))
         return games_with_unprocessed_reviews.scalars().all()
 
+    async def claim_unprocessed_reviews(self, db: AsyncSession, *, limit: int = 100,
+                                        game_id: Optional[int] = None,
+                                        exclude_ids: Optional[Iterable[int]] = None) -> List[models.Review]:
+        """
+        Selects unprocessed reviews and locks them (SELECT ... FOR UPDATE SKIP LOCKED), reviews locked by other
+        sessions are skipped, so concurrent workers (processes or hosts) never get the same reviews.
+        The locks are held until the transaction ends, commit the results with store_analysis,
+        rollback (or a lost connection) releases the reviews for other workers.
+        :param db: AsyncSession
+        :param limit: max number of reviews
+        :param game_id: only reviews of the game if set
+        :param exclude_ids: ids of reviews not to claim
+        :return: List[Review] ordered by id
+        """
+        conditions = [models.Review.processed_at == None]
+        if game_id is not None:
+            conditions.append(models.Review.game_id == game_id)
+        if exclude_ids:
+            conditions.append(models.Review.id.notin_(exclude_ids))
+        result = await db.execute(select(models.Review)
+                                  .where(*conditions)
+                                  .order_by(models.Review.id.asc())
+                                  .limit(limit)
+                                  .with_for_update(skip_locked=True))
+        return result.scalars().all()
+
+    async def get_previous_analysis(self, db: AsyncSession, *, review_ids: List[int], model: str,
+                                    task: str) -> Dict[int, Dict[str, str]]:
+        """
+        Get sentence predictions of reviews analyzed before by the model
+        :param db: AsyncSession
+        :param review_ids: ids of the reviews
+        :param model: name of the model
+        :param task: task of the model
+        :return: {sentence: prediction} by review id, empty dict for analyzed reviews without sentences
+        """
+        result = await db.execute(select(models.AnalyzedReview.review_id,
+                                         models.AnalyzedReviewSentence.sentence,
+                                         models.AnalyzedReviewSentence.prediction)
+                                  .outerjoin(models.AnalyzedReviewSentence,
+                                             models.AnalyzedReviewSentence.analyzed_review_id
+                                             == models.AnalyzedReview.id)
+                                  .where(models.AnalyzedReview.review_id.in_(review_ids),
+                                         models.AnalyzedReview.model == model,
+                                         models.AnalyzedReview.task == task))
+        previous = {}
+        for review_id, sentence, prediction in result.all():
+            sentences = previous.setdefault(review_id, {})
+            if sentence is not None:
+                sentences[sentence] = prediction
+        return previous
+
+    async def store_analysis(self, db: AsyncSession, *,
+                             review_ids: List[int],
+                             analyzed_reviews_in: List[schemas.AnalyzedReviewCreate],
+                             aspects_in: List[schemas.AspectCreate],
+                             sentences_in: Optional[Dict[int, List[Tuple[str, str]]]] = None,
+                             replace_review_ids: Iterable[int] = (),
+                             processed_at: Optional[datetime] = None) -> None:
+        """
+        Stores analysis results of a batch of reviews in one transaction: marks the reviews as processed
+        and inserts their aspects, analyzed reviews and sentences of long reviews (one bulk insert per table).
+        Stats of the games (crud.game_stats) and the daily rollup (crud.review_stats) are updated
+        in the same transaction.
+        Review objects loaded in the session are not updated.
+        :param db: AsyncSession
+        :param review_ids: ids of all reviews of the batch, not updated if empty
+        :param analyzed_reviews_in: analyzed reviews of the batch
+        :param aspects_in: aspects of the batch
+        :param sentences_in: (sentence, prediction) pairs of the long reviews by review id
+        :param replace_review_ids: ids of reviews analyzed before by the model of the batch,
+            their previous analyzed reviews, sentences and aspects are deleted
+        :param processed_at: time of the processing, now if None
+        """
+        await crud_review.mark_processed(db, review_ids=review_ids, processed_at=processed_at)
+        replace_review_ids = list(replace_review_ids)
+        if replace_review_ids and analyzed_reviews_in:
+            model, task = analyzed_reviews_in[0].model, analyzed_reviews_in[0].task
+            previous_ids = (select(models.AnalyzedReview.id)
+                            .where(models.AnalyzedReview.review_id.in_(replace_review_ids),
+                                   models.AnalyzedReview.model == model,
+                                   models.AnalyzedReview.task == task))
+            await db.execute(delete(models.AnalyzedReviewSentence)
+                             .where(models.AnalyzedReviewSentence.analyzed_review_id.in_(previous_ids))
+                             .execution_options(synchronize_session=False))
+            await db.execute(delete(models.AnalyzedReview)
+                             .where(models.AnalyzedReview.id.in_(previous_ids))
+                             .execution_options(synchronize_session=False))
+            await crud_game_stats.remove_reviews(db, review_ids=replace_review_ids, model_id=model)
+            await crud_review_stats.remove_reviews(db, review_ids=replace_review_ids, model_id=model)
+            await db.execute(delete(models.Aspect)
+                             .where(models.Aspect.review_id.in_(replace_review_ids),
+                                    models.Aspect.model_id == model)
+                             .execution_options(synchronize_session=False))
+        db.add_all([models.Aspect(**obj.dict()) for obj in aspects_in])
+        if aspects_in:
+            await db.flush()
+            aspect_review_ids = {obj.review_id for obj in aspects_in}
+            await crud_game_stats.add_reviews(db, review_ids=aspect_review_ids, model_id=aspects_in[0].model_id)
+            await crud_review_stats.add_reviews(db, review_ids=aspect_review_ids, model_id=aspects_in[0].model_id)
+        if analyzed_reviews_in:
+            result = await db.execute(insert(models.AnalyzedReview)
+                                      .values([obj.dict() for obj in analyzed_reviews_in])
+                                      .returning(models.AnalyzedReview.id, models.AnalyzedReview.review_id))
+            sentence_rows = [{"analyzed_review_id": analyzed_review_id, "sentence": sentence, "prediction": prediction}
+                             for analyzed_review_id, review_id in result.all()
+                             for sentence, prediction in (sentences_in or {}).get(review_id, [])]
+            if sentence_rows:
+                await db.execute(insert(models.AnalyzedReviewSentence), sentence_rows)
+        await db.commit()
+
 
 class CRUDAnalyzedReview(CRUDBase[models.AnalyzedReview, schemas.AnalyzedReviewCreate, schemas.AnalyzedReviewUpdate]):
     """
@@ -2,16 +2,19 @@
 Created by Frantisek Sabol
 """
 from datetime import timedelta, datetime
-from typing import List, Optional, Any, Tuple, Dict
-from sqlalchemy import column, update, func, cast, and_, text, or_, case, nullslast, nullsfirst
+from typing import List, Optional, Any, Tuple, Dict, Iterable
+from sqlalchemy import column, update, func, cast, and_, text, or_, case, nullslast, nullsfirst, delete
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from app.crud.base import CRUDBase
+from app.crud.pagination import encode_cursor, decode_cursor, after_key, total_cache
 from app.db.session import RegConfig
 from app.schemas.game import GameCreate, GameUpdate
 from app.schemas.game import CategoryCreate, CategoryUpdate
 from app.schemas.game import GameCategoryCreate, GameCategoryUpdate
+from app.schemas.game import GameStatsCreate, GameStatsUpdate
 import logging
 from app import models, schemas
 
@@ -93,6 +96,123 @@ class CRUDGameCategory(CRUDBase[models.GameCategory, GameCategoryCreate, GameCat
     pass
 
 
+class CRUDGameStats(CRUDBase[models.GameStats, GameStatsCreate, GameStatsUpdate]):
+    """
+    Rollup of the aspects of the games by model (table gamestats) read by the game list.
+    The analyzer updates the rollup incrementally from the aspects of each stored batch (add_reviews, remove_reviews),
+    refresh recomputes it from all aspects of the games.
+    """
+    COUNTS = ("num_reviews", "num_aspects", "num_positive", "num_negative", "num_neutral")
+
+    @staticmethod
+    def score_expression(num_positive, num_negative, num_aspects):
+        """ game score: 8 points per positive and -6 per negative aspect averaged over all aspects, shifted by 5 """
+        return (num_positive * 8 - num_negative * 6) / (num_aspects + 0.1) + 5.0
+
+    def _aggregate_aspects(self, *conditions, sign: int = 1):
+        """ counts of the aspects matching the conditions by game and model, multiplied by sign """
+        num_positive = func.count(case((models.Aspect.polarity == "positive", models.Aspect.id)))
+        num_negative = func.count(case((models.Aspect.polarity == "negative", models.Aspect.id)))
+        num_aspects = func.count(models.Aspect.id)
+        return select(
+            models.Review.game_id,
+            models.Aspect.model_id,
+            self.score_expression(num_positive, num_negative, num_aspects),
+            sign * func.count(models.Review.id.distinct()),
+            sign * num_aspects,
+            sign * num_positive,
+            sign * num_negative,
+            sign * func.count(case((models.Aspect.polarity == "neutral", models.Aspect.id))),
+        ).select_from(models.Aspect).join(models.Review, models.Review.id == models.Aspect.review_id) \
+            .where(models.Review.game_id != None, *conditions) \
+            .group_by(models.Review.game_id, models.Aspect.model_id)
+
+    async def _upsert(self, db: AsyncSession, aggregate, increment: bool):
+        stmt = insert(self.model).from_select(["game_id", "model_id", "score", *self.COUNTS], aggregate)
+        if increment:
+            values = {name: getattr(self.model, name) + getattr(stmt.excluded, name) for name in self.COUNTS}
+        else:
+            values = {name: getattr(stmt.excluded, name) for name in self.COUNTS}
+        values["score"] = self.score_expression(values["num_positive"], values["num_negative"], values["num_aspects"])
+        values["updated_at"] = func.now()
+        await db.execute(stmt.on_conflict_do_update(index_elements=[self.model.game_id, self.model.model_id],
+                                                    set_=values))
+
+    async def add_reviews(self, db: AsyncSession, *, review_ids: Iterable[int], model_id: str):
+        """
+        Adds the aspects of the reviews extracted by the model to the stats of their games.
+        Call after the aspects are inserted (flushed), in the same transaction. Does not commit.
+        """
+        review_ids = list(review_ids)
+        if not review_ids:
+            return
+        await self._upsert(db, self._aggregate_aspects(models.Aspect.review_id.in_(review_ids),
+                                                       models.Aspect.model_id == model_id), increment=True)
+
+    async def remove_reviews(self, db: AsyncSession, *, review_ids: Iterable[int], model_id: str):
+        """
+        Subtracts the aspects of the reviews extracted by the model from the stats of their games.
+        Call before the aspects are deleted, in the same transaction. Does not commit.
+        """
+        review_ids = list(review_ids)
+        if not review_ids:
+            return
+        await self._upsert(db, self._aggregate_aspects(models.Aspect.review_id.in_(review_ids),
+                                                       models.Aspect.model_id == model_id, sign=-1),
+                           increment=True)
+        # games without aspects of the model are not listed
+        await db.execute(delete(self.model)
+                         .where(self.model.model_id == model_id,
+                                self.model.num_aspects <= 0,
+                                self.model.game_id.in_(select(models.Review.game_id)
+                                                       .where(models.Review.id.in_(review_ids))))
+                         .execution_options(synchronize_session=False))
+
+    async def get_most_utilized_model(self, db: AsyncSession, *, game_id: Optional[int] = None) -> Optional[str]:
+        """
+        Get the model with the most extracted aspects
+        :param game_id: aspects of the game, of all games if None
+        :return: model id, None if there are no aspects
+        """
+        stmt = select(self.model.model_id) \
+            .group_by(self.model.model_id) \
+            .order_by(func.sum(self.model.num_aspects).desc(), self.model.model_id) \
+            .limit(1)
+        if game_id is not None:
+            stmt = stmt.where(self.model.game_id == game_id)
+        result = await db.scalars(stmt)
+        return result.first()
+
+    async def refresh(self, db: AsyncSession, *, game_ids: Optional[Iterable[int]] = None,
+                      model_id: Optional[str] = None):
+        """
+        Recomputes the stats of the games from all their aspects and commits.
+        Existing stats of the games are locked first, so increments of batches stored concurrently by the analyzer
+        are applied after the recomputation.
+        :param game_ids: ids of the games, all games if None
+        :param model_id: only stats of the model if set
+        """
+        stats_conditions = []
+        aspect_conditions = []
+        if game_ids is not None:
+            game_ids = list(game_ids)
+            stats_conditions.append(self.model.game_id.in_(game_ids))
+            aspect_conditions.append(models.Review.game_id.in_(game_ids))
+        if model_id is not None:
+            stats_conditions.append(self.model.model_id == model_id)
+            aspect_conditions.append(models.Aspect.model_id == model_id)
+        await db.execute(select(self.model.game_id).where(*stats_conditions).with_for_update())
+        await self._upsert(db, self._aggregate_aspects(*aspect_conditions), increment=False)
+        has_aspects = select(models.Aspect.id) \
+            .join(models.Review, models.Review.id == models.Aspect.review_id) \
+            .where(models.Review.game_id == self.model.game_id, models.Aspect.model_id == self.model.model_id) \
+            .correlate(self.model).exists()
+        await db.execute(delete(self.model)
+                         .where(*stats_conditions, ~has_aspects)
+                         .execution_options(synchronize_session=False))
+        await db.commit()
+
+
 class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
     async def get_by_source_id(self, db: AsyncSession, source_id: int, source_game_id: Any) -> Optional[models.Game]:
         """
@@ -249,7 +369,8 @@ class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
             check_interval: timedelta = None
     ) -> List[Tuple[id, str]]:
         """Get all games from source that need to be scraped for reviews determined by check_interval
-        or if they have never been scraped before.
+        or if they have never been scraped before. Games that were never scraped or were scraped the longest time ago
+        come first.
         """
         if check_interval is None:
             check_interval = timedelta(days=1)
@@ -261,6 +382,7 @@ class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
                 (models.GameSource.source_id == source_id) &
                 or_(models.GameSource.reviews_scraped_at == None, models.GameSource.reviews_scraped_at <= check_time)
             )
+            .order_by(nullsfirst(models.GameSource.reviews_scraped_at.asc()))
         )
         return result.all()
 
@@ -317,12 +439,14 @@ class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
             self, db: AsyncSession, *,
             source_id: int,
             game_id: Optional[int] = None,
-            source_game_id: Optional[str] = None
+            source_game_id: Optional[str] = None,
+            reviews_updated_until: Optional[datetime] = None
     ):
         """
         Update the following columns of table models.GameSource:
         - reviews_scraped_at
         - num_reviews
+        - reviews_updated_until (high water mark, only moves forward)
         """
         if game_id is None and source_game_id is None:
             raise ValueError("game_id or source_game_id must be provided")
@@ -342,8 +466,18 @@ class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
             (models.Review.game_id == db_obj.game_id) & (models.Review.source_id == source_id)))
         db_obj.reviews_scraped_at = datetime.now()
         db_obj.num_reviews = num_reviews
+        if reviews_updated_until is not None and (
+                db_obj.reviews_updated_until is None or reviews_updated_until > db_obj.reviews_updated_until):
+            db_obj.reviews_updated_until = reviews_updated_until
         await db.commit()
 
+    async def get_reviews_high_water_mark(self, db: AsyncSession, *, source_id: int, game_id: int
+                                          ) -> Optional[datetime]:
+        """Returns the newest timestamp_updated of scraped reviews of the game from the source."""
+        return await db.scalar(
+            select(models.GameSource.reviews_updated_until)
+            .where((models.GameSource.game_id == game_id) & (models.GameSource.source_id == source_id)))
+
     async def add_category(self, db: AsyncSession, *, game_id: int, category_id: int):
         db_obj = models.GameCategory(game_id=game_id, category_id=category_id)
         db.add(db_obj)
@@ -373,38 +507,30 @@ class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
         gs = result.scalars().all()
         return [g.source for g in gs]
 
-    @staticmethod
-    def _create_game_score_subquery():
-        """ used to compute the game score in for game list and game list item"""
-        return (func.coalesce(
-            (func.sum(
-                case(
-                    (models.Aspect.polarity == "positive", 8),
-                    (models.Aspect.polarity == "negative", -6),
-                    (models.Aspect.polarity == "neutral", 0.0),
-                    else_=0.0)
-            ) / (func.count(models.Aspect.id.distinct()) + 0.1)) + 5.0,
-            -1.0)).label("score")
+    # columns of the sort keys of the game list and the types of their values in cursors
+    SORT_KEYS = {"num_reviews": int, "score": float, "release_date": datetime.fromisoformat, "name": str}
 
     async def get_game_list(self, db: AsyncSession, *,
                             limit: int = 100,
                             offset: int = 0,
+                            cursor: Optional[str] = None,
                             sort: schemas.GameListSort = None,
                             filter: schemas.GameListFilter = None,
                             model_id: str = "mt5-acos-1.0"
                             ) -> schemas.GameListResponse:
         """
-        Get a list of games with optional sorting and filtering. The list is paginated and the total number of games is returned.
+        Get a list of games with optional sorting and filtering. The list is paginated by offset or by cursor
+        (next_cursor of the previous page, offset is ignored), games are ordered by the sort key and id.
+        The total number of games is counted with the first page and reused by the next pages (total_cache).
         The game score is computed based on the extracted aspects by a chosen model.
         :param db:
+        :raises ValueError: if the cursor is malformed
         """
-        # compute game score based on extracted aspects by a chosen model
-        game_score = self._create_game_score_subquery()
-
-        stmt = select(self.model, game_score, func.count(models.Review.id.distinct())).select_from(self.model) \
-            .outerjoin(models.Review) \
-            .outerjoin(models.Aspect).where(models.Aspect.model_id == model_id) \
-            .group_by(self.model.id) \
+        # game score and number of reviews of the model are read from the rollup
+        stats = models.GameStats
+        stats_join = and_(stats.game_id == self.model.id, stats.model_id == model_id)
+        stmt = select(self.model, stats.score, stats.num_reviews).select_from(self.model) \
+            .join(stats, stats_join) \
             .options(selectinload(self.model.categories).selectinload(models.GameCategory.category),
                      selectinload(self.model.developers).selectinload(models.GameDeveloper.developer))
 
@@ -426,65 +552,49 @@ class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
             if filter.max_release_date is not None:
                 filters.append(self.model.release_date <= filter.max_release_date)
 
-            if filter and filter.min_score is not None or filter.max_score is not None:
-                score_subquery = select(self.model.id.label("id")).select_from(self.model) \
-                    .outerjoin(models.Review) \
-                    .outerjoin(models.Aspect) \
-                    .group_by(self.model.id) \
-                    .having(
-                    and_(
-                        game_score >= (filter.min_score if filter.min_score is not None else -float('inf')),
-                        game_score <= (filter.max_score if filter.max_score is not None else float('inf'))
-                    )
-                )
-                filters.append(self.model.id.in_(score_subquery))
-            if filter and filter.min_num_reviews is not None or filter.max_num_reviews is not None:
-                review_subquery = select(self.model.id).select_from(self.model) \
-                    .join(models.Review) \
-                    .join(models.Aspect) \
-                    .group_by(self.model.id) \
-                    .having(
-                    and_(
-                        func.count(models.Review.id.distinct()) >= (
-                            filter.min_num_reviews if filter.min_num_reviews is not None else -float('inf')),
-                        func.count(models.Review.id.distinct()) <= (
-                            filter.max_num_reviews if filter.max_num_reviews is not None else float('inf'))
-                    )
-                )
-                filters.append(self.model.id.in_(review_subquery))
+            if filter.min_score is not None:
+                filters.append(stats.score >= filter.min_score)
+            if filter.max_score is not None:
+                filters.append(stats.score <= filter.max_score)
+            if filter.min_num_reviews is not None:
+                filters.append(stats.num_reviews >= filter.min_num_reviews)
+            if filter.max_num_reviews is not None:
+                filters.append(stats.num_reviews <= filter.max_num_reviews)
 
+        sort_key, descending = None, False
         if sort:
-            if sort.num_reviews is not None:
-                if sort.num_reviews == "asc":
-                    stmt = stmt.order_by(func.count(models.Review.id.distinct()).asc())
-                else:
-                    stmt = stmt.order_by(func.count(models.Review.id.distinct()).desc())
-            elif sort.score is not None:
-                if sort.score == "asc":
-                    stmt = stmt.order_by(nullslast(game_score.asc()))
-                else:
-                    stmt = stmt.order_by(nullslast(game_score.desc()))
-            elif sort.release_date is not None:
-                if sort.release_date == "asc":
-                    stmt = stmt.order_by(nullslast(self.model.release_date.asc()))
-                else:
-                    stmt = stmt.order_by(nullslast(self.model.release_date.desc()))
-            elif sort.name is not None:
-                if sort.name == "asc":
-                    stmt = stmt.order_by(nullslast(self.model.name.asc()))
-                else:
-                    stmt = stmt.order_by(nullslast(self.model.name.desc()))
-
-        count_stmt = select(func.count(self.model.id.distinct())).select_from(self.model).join(
-            models.Review).join(
-            models.Aspect).filter(and_(True, *filters))
-        count_result = await db.execute(count_stmt)
-        total_count = count_result.scalar()
+            sort_key = next((key for key in self.SORT_KEYS if getattr(sort, key) is not None), None)
+            descending = sort_key is not None and getattr(sort, sort_key) == "desc"
+        sort_column = {"num_reviews": stats.num_reviews, "score": stats.score,
+                       "release_date": self.model.release_date, "name": self.model.name}.get(sort_key)
+        if sort_column is not None:
+            stmt = stmt.order_by(nullslast(sort_column.desc() if descending else sort_column.asc()))
+
+        async def count() -> int:
+            count_stmt = select(func.count()).select_from(self.model).join(stats, stats_join).filter(
+                and_(True, *filters))
+            return await db.scalar(count_stmt)
+
+        total_count = await total_cache.get(("games", model_id, filter.json() if filter else None), count,
+                                            first_page=offset == 0 and cursor is None)
         summary = schemas.GameListQuerySummary(total=total_count)
 
-        stmt = stmt.filter(and_(True, *filters)).order_by(self.model.id).limit(limit).offset(offset)
+        stmt = stmt.filter(and_(True, *filters)).order_by(self.model.id).limit(limit)
+        if cursor is not None:
+            *values, last_id = decode_cursor(cursor, 1 if sort_key is None else 2)
+            try:
+                last_id = int(last_id)
+                value = self.SORT_KEYS[sort_key](values[0]) if values and values[0] is not None else None
+            except (TypeError, ValueError) as e:
+                raise ValueError("Invalid cursor") from e
+            if sort_key is None:
+                stmt = stmt.filter(self.model.id > last_id)
+            else:
+                stmt = stmt.filter(after_key(sort_column, value, self.model.id, last_id, descending))
+        else:
+            stmt = stmt.offset(offset)
         result = await db.execute(stmt)
-        games = result.all()
+        rows = result.all()
         games = [schemas.GameListItem(
             id=g.id,
             name=g.name,
@@ -494,11 +604,18 @@ class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
             developers=[schemas.Developer.from_orm(d.developer) for d in g.developers],
             score=round(min(max(score, 0), 10), 1),
             num_reviews=num_reviews
-        ) for g, score, num_reviews in games]
+        ) for g, score, num_reviews in rows]
+
+        next_cursor = None
+        if len(rows) == limit:
+            last, score, num_reviews = rows[-1]
+            key = {"num_reviews": num_reviews, "score": score, "release_date": last.release_date, "name": last.name}
+            next_cursor = encode_cursor([key[sort_key], last.id] if sort_key is not None else [last.id])
 
         return schemas.GameListResponse(
             games=games,
-            query_summary=summary
+            query_summary=summary,
+            next_cursor=next_cursor
         )
 
     async def get_matches(self, db: AsyncSession, *, name: str, limit: int = 10, model_id=None) -> List[str]:
@@ -516,8 +633,8 @@ class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
         #     and_(self.model.name_tsv.bool_op("@@")(ts_query))
         # ).limit(limit)\
         #     .order_by(func.similarity(self.model.name_tsv, ts_query).desc())
-        model_filter = [models.Aspect.model_id == model_id] if model_id else []
-        stmt = select(self.model.name).select_from(self.model).join(models.Review).join(models.Aspect).where(
+        model_filter = [models.GameStats.model_id == model_id] if model_id else []
+        stmt = select(self.model.name).select_from(self.model).join(models.GameStats).where(
             and_(self.model.name_tsv.bool_op("@@")(ts_query), *model_filter)
         ).limit(limit).group_by(self.model.name)
         result = await db.execute(stmt)
@@ -532,12 +649,10 @@ class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
         :param model_id: Model id
         :return: GameListItem
         """
-        game_score = self._create_game_score_subquery()
-
-        stmt = select(self.model, game_score, func.count(models.Review.id.distinct())).select_from(self.model) \
-            .outerjoin(models.Review).where(models.Review.game_id == id) \
-            .outerjoin(models.Aspect).where(models.Aspect.model_id == model_id) \
-            .group_by(self.model.id) \
+        stats = models.GameStats
+        stmt = select(self.model, stats.score, stats.num_reviews).select_from(self.model) \
+            .outerjoin(stats, and_(stats.game_id == self.model.id, stats.model_id == model_id)) \
+            .where(self.model.id == id) \
             .options(selectinload(self.model.categories).selectinload(models.GameCategory.category),
                      selectinload(self.model.developers).selectinload(models.GameDeveloper.developer))
         result = await db.execute(stmt)
@@ -549,10 +664,11 @@ class CRUDGame(CRUDBase[models.Game, GameCreate, GameUpdate]):
             release_date=game.release_date,
             categories=[schemas.Category.from_orm(c.category) for c in game.categories],
             developers=[schemas.Developer.from_orm(d.developer) for d in game.developers],
-            score=round(min(max(score, 0), 10), 1),
-            num_reviews=num_reviews)
+            score=round(min(max(score, 0), 10), 1) if score is not None else None,
+            num_reviews=num_reviews or 0)
 
 
 crud_game = CRUDGame(models.Game)
+crud_game_stats = CRUDGameStats(models.GameStats)
 crud_category = CRUDCategory(models.Category)
 crud_game_category = CRUDGameCategory(models.GameCategory)
@@ -0,0 +1,88 @@
+"""
+Created by Frantisek Sabol
+Keyset pagination of the listing endpoints.
+A page is continued after the sort key and id of its last row, the cursor is the url-safe base64 of the JSON list
+of these values. Cost of a page does not depend on its depth, unlike OFFSET which reads all skipped rows.
+Totals of the listings are counted with the first page and reused by the next pages (TotalCache).
+"""
+import base64
+import json
+import time
+from collections import OrderedDict
+from typing import Any, List, Sequence, Hashable, Callable, Awaitable, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    :param values: sort key (if any) and id of the last row of a page
+    :return: opaque cursor of the next page
+    """
+    data = json.dumps(jsonable_encoder(list(values)), separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int) -> List[Any]:
+    """
+    :param length: number of values of the cursor
+    :return: values of the cursor (JSON types, datetimes are ISO strings)
+    :raises ValueError: if the cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError as e:
+        # binascii.Error, UnicodeDecodeError and JSONDecodeError
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def after_key(column, value, id_column, last_id: int, descending: bool = False):
+    """
+    Condition of the rows after (value, last_id) ordered by column (nulls last) and then by id_column ascending.
+    """
+    if value is None:
+        return and_(column.is_(None), id_column > last_id)
+    return or_(column < value if descending else column > value,
+               and_(column == value, id_column > last_id),
+               column.is_(None))
+
+
+class TotalCache:
+    """
+    In-process TTL cache of the totals of the listings keyed by their filters.
+    The first page counts the rows again, the next pages reuse the total if it did not expire.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 10_000):
+        """
+        :param ttl: seconds a total is reused
+        :param max_entries: max number of cached totals, least recently used are dropped
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Tuple[float, int]]" = OrderedDict()
+
+    async def get(self, key: Hashable, count: Callable[[], Awaitable[int]], first_page: bool = False) -> int:
+        """
+        :param key: filters of the listing
+        :param count: counts the rows of the listing
+        :param first_page: count the rows even if the total is cached
+        """
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry is not None and not first_page and now - entry[0] < self.ttl:
+            self.entries.move_to_end(key)
+            return entry[1]
+        total = await count()
+        self.entries[key] = (now, total)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return total
+
+
+total_cache = TotalCache()
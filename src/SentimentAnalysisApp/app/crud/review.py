@@ -2,18 +2,22 @@
 Created by Frantisek Sabol
 """
 import logging
-from typing import List, Optional, Literal, Tuple, Dict
+from datetime import datetime
+from typing import List, Optional, Literal, Tuple, Dict, Set, Iterable
 
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select, and_, or_, func, literal_column, case
+from sqlalchemy import select, and_, or_, func, literal_column, case, update, delete, literal
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.sql.expression import null, text
 
 from app.crud.reviewer import crud_reviewer
 from app.crud.base import CRUDBase
+from app.crud.pagination import encode_cursor, decode_cursor, total_cache
 from app.schemas.review import (ReviewCreate, ReviewWithAspects,
-                                ReviewsSummary, ReviewsSummaryDataPoint)
+                                ReviewsSummary, ReviewsSummaryDataPoint,
+                                ReviewDailyStatsCreate, ReviewDailyStatsUpdate)
 from app.schemas.reviewer import ReviewerCreate
 
 from app.crud.game import crud_game
@@ -26,6 +30,219 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class CRUDReviewStats(CRUDBase[models.ReviewDailyStats, ReviewDailyStatsCreate, ReviewDailyStatsUpdate]):
+    """
+    Daily rollup of the reviews (table reviewdailystats) and of their aspects (table aspectdailystats)
+    by game and source read by the summaries of the reviews and aspects of a game.
+    Weeks, months and years are re-aggregated from the days, hours can not be and are counted from the reviews.
+    The scraper counts the reviews it inserts (add_new_reviews), the analyzer updates the rollup incrementally
+    (add_processed, add_reviews, remove_reviews), refresh recomputes it from all reviews of the games
+    (backfill and repair).
+    Reviews without game, source or creation time and aspects without model, category or polarity
+    are not counted.
+    """
+    INTERVALS = ("day", "week", "month", "year")
+    REVIEW_KEYS = ("game_id", "source_id", "day")
+    REVIEW_COUNTS = ("num_reviews", "num_processed", "num_voted_up")
+    ASPECT_KEYS = ("game_id", "model_id", "day", "source_id", "category", "polarity")
+
+    @staticmethod
+    def _review_conditions():
+        return (models.Review.game_id != None, models.Review.source_id != None, models.Review.created_at != None)
+
+    def _aggregate_reviews(self, *conditions, processed_only: bool = False):
+        """ counts of the reviews matching the conditions by game, source and day """
+        day = func.date_trunc("day", models.Review.created_at).label("day")
+        processed = func.count(case((models.Review.processed_at != None, models.Review.id)))
+        if processed_only:
+            counts = (literal(0), func.count(models.Review.id), literal(0))
+        else:
+            counts = (func.count(models.Review.id), processed,
+                      func.count(case((models.Review.voted_up == True, models.Review.id))))
+        return select(models.Review.game_id, models.Review.source_id, day, *counts) \
+            .where(*self._review_conditions(), *conditions) \
+            .group_by(models.Review.game_id, models.Review.source_id, text("day"))
+
+    def _aggregate_aspects(self, *conditions, sign: int = 1):
+        """ counts of the aspects matching the conditions by the keys of aspectdailystats, multiplied by sign """
+        day = func.date_trunc("day", models.Review.created_at).label("day")
+        return select(models.Review.game_id, models.Aspect.model_id, day, models.Review.source_id,
+                      models.Aspect.category, models.Aspect.polarity, sign * func.count(models.Aspect.id)) \
+            .select_from(models.Aspect).join(models.Review, models.Review.id == models.Aspect.review_id) \
+            .where(*self._review_conditions(), models.Aspect.model_id != None, models.Aspect.category != None,
+                   models.Aspect.polarity != None, *conditions) \
+            .group_by(models.Review.game_id, models.Aspect.model_id, text("day"), models.Review.source_id,
+                      models.Aspect.category, models.Aspect.polarity)
+
+    @staticmethod
+    async def _upsert(db: AsyncSession, model, keys: Tuple[str, ...], counts: Tuple[str, ...], aggregate,
+                      increment: bool = True):
+        """ adds the counts of the aggregate to the rows of the model, replaces them if not increment """
+        stmt = insert(model).from_select([*keys, *counts], aggregate)
+        if increment:
+            values = {name: getattr(model, name) + getattr(stmt.excluded, name) for name in counts}
+        else:
+            values = {name: getattr(stmt.excluded, name) for name in counts}
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[getattr(model, name) for name in keys], set_=values))
+
+    async def add_new_reviews(self, db: AsyncSession, *, review_ids: Iterable[int]):
+        """
+        Counts newly inserted reviews in the rollup.
+        Call after the reviews are inserted (flushed), in the same transaction. Does not commit.
+        """
+        review_ids = list(review_ids)
+        if not review_ids:
+            return
+        await self._upsert(db, self.model, self.REVIEW_KEYS, self.REVIEW_COUNTS,
+                           self._aggregate_reviews(models.Review.id.in_(review_ids)))
+
+    async def add_processed(self, db: AsyncSession, *, review_ids: Iterable[int]):
+        """
+        Counts the not yet processed reviews among the reviews as processed.
+        Call before the reviews are marked as processed, in the same transaction. Does not commit.
+        """
+        review_ids = list(review_ids)
+        if not review_ids:
+            return
+        await self._upsert(db, self.model, self.REVIEW_KEYS, self.REVIEW_COUNTS,
+                           self._aggregate_reviews(models.Review.id.in_(review_ids),
+                                                   models.Review.processed_at == None, processed_only=True))
+
+    async def add_reviews(self, db: AsyncSession, *, review_ids: Iterable[int], model_id: str):
+        """
+        Adds the aspects of the reviews extracted by the model to the rollup.
+        Call after the aspects are inserted (flushed), in the same transaction. Does not commit.
+        """
+        review_ids = list(review_ids)
+        if not review_ids:
+            return
+        await self._upsert(db, models.AspectDailyStats, self.ASPECT_KEYS, ("num_aspects",),
+                           self._aggregate_aspects(models.Aspect.review_id.in_(review_ids),
+                                                   models.Aspect.model_id == model_id))
+
+    async def remove_reviews(self, db: AsyncSession, *, review_ids: Iterable[int], model_id: str):
+        """
+        Subtracts the aspects of the reviews extracted by the model from the rollup.
+        Call before the aspects are deleted, in the same transaction. Does not commit.
+        """
+        review_ids = list(review_ids)
+        if not review_ids:
+            return
+        await self._upsert(db, models.AspectDailyStats, self.ASPECT_KEYS, ("num_aspects",),
+                           self._aggregate_aspects(models.Aspect.review_id.in_(review_ids),
+                                                   models.Aspect.model_id == model_id, sign=-1))
+        await db.execute(delete(models.AspectDailyStats)
+                         .where(models.AspectDailyStats.model_id == model_id,
+                                models.AspectDailyStats.num_aspects <= 0,
+                                models.AspectDailyStats.game_id.in_(select(models.Review.game_id)
+                                                                    .where(models.Review.id.in_(review_ids))))
+                         .execution_options(synchronize_session=False))
+
+    async def refresh(self, db: AsyncSession, *, game_ids: Optional[Iterable[int]] = None):
+        """
+        Recomputes the rollup of the games from all their reviews and aspects and commits.
+        Rows of the games are locked and overwritten, a batch stored by the analyzer meanwhile waits for the locks
+        and adds its counts to the recomputed rows. Rows without reviews or aspects left are deleted.
+        :param game_ids: ids of the games, all games if None
+        """
+        review_conditions = []
+        if game_ids is not None:
+            game_ids = list(game_ids)
+            review_conditions.append(models.Review.game_id.in_(game_ids))
+        stats = {model: [model.game_id.in_(game_ids)] if game_ids is not None else []
+                 for model in (self.model, models.AspectDailyStats)}
+        for model, conditions in stats.items():
+            await db.execute(select(model.game_id).where(*conditions).with_for_update())
+        await self._upsert(db, self.model, self.REVIEW_KEYS, self.REVIEW_COUNTS,
+                           self._aggregate_reviews(*review_conditions), increment=False)
+        await self._upsert(db, models.AspectDailyStats, self.ASPECT_KEYS, ("num_aspects",),
+                           self._aggregate_aspects(*review_conditions), increment=False)
+
+        day = func.date_trunc("day", models.Review.created_at)
+        has_reviews = select(models.Review.id) \
+            .where(models.Review.game_id == self.model.game_id, models.Review.source_id == self.model.source_id,
+                   day == self.model.day) \
+            .correlate(self.model).exists()
+        await db.execute(delete(self.model)
+                         .where(*stats[self.model], ~has_reviews)
+                         .execution_options(synchronize_session=False))
+        aspect_stats = models.AspectDailyStats
+        has_aspects = select(models.Aspect.id) \
+            .join(models.Review, models.Review.id == models.Aspect.review_id) \
+            .where(models.Review.game_id == aspect_stats.game_id, models.Aspect.model_id == aspect_stats.model_id,
+                   day == aspect_stats.day, models.Review.source_id == aspect_stats.source_id,
+                   models.Aspect.category == aspect_stats.category, models.Aspect.polarity == aspect_stats.polarity) \
+            .correlate(aspect_stats).exists()
+        await db.execute(delete(aspect_stats)
+                         .where(*stats[aspect_stats], ~has_aspects)
+                         .execution_options(synchronize_session=False))
+        await db.commit()
+
+    async def get_review_counts(self, db: AsyncSession, *, game_id: Optional[int] = None,
+                                time_interval: str = "day") -> List[Tuple[datetime, int, int, int, int]]:
+        """
+        Count reviews per source by time_interval
+        :param game_id: reviews of the game, of all games if None
+        :return: (date, source_id, total, processed, voted_up) rows ordered by date and source
+        """
+        if time_interval in self.INTERVALS:
+            query = select(
+                func.date_trunc(time_interval, self.model.day).label("date"),
+                self.model.source_id,
+                func.sum(self.model.num_reviews),
+                func.sum(self.model.num_processed),
+                func.sum(self.model.num_voted_up)
+            ).group_by(text("date"), self.model.source_id)
+            if game_id is not None:
+                query = query.where(self.model.game_id == game_id)
+        else:
+            query = select(
+                func.date_trunc(time_interval, models.Review.created_at).label("date"),
+                models.Review.source_id,
+                func.count(models.Review.id),
+                func.count(case((models.Review.processed_at != None, models.Review.id))),
+                func.count(case((models.Review.voted_up == True, models.Review.id)))
+            ).where(*self._review_conditions()).group_by(text("date"), models.Review.source_id)
+            if game_id is not None:
+                query = query.where(models.Review.game_id == game_id)
+        result = await db.execute(query.order_by(text("date"), text("source_id")))
+        return result.all()
+
+    async def get_aspect_counts(self, db: AsyncSession, *, game_id: Optional[int], model_id: str,
+                                time_interval: Optional[str] = "day"
+                                ) -> List[Tuple[Optional[datetime], int, str, str, int]]:
+        """
+        Count aspects extracted by the model per source, category and polarity by time_interval
+        :param game_id: aspects of the game, of all games if None
+        :param time_interval: not grouped by date if None
+        :return: (date, source_id, category, polarity, count) rows, date is None if time_interval is None
+        """
+        if time_interval is None or time_interval in self.INTERVALS:
+            stats = models.AspectDailyStats
+            date = func.date_trunc(time_interval, stats.day) if time_interval is not None else null()
+            query = select(date.label("date"), stats.source_id, stats.category, stats.polarity,
+                           func.sum(stats.num_aspects)) \
+                .where(stats.model_id == model_id) \
+                .group_by(stats.source_id, stats.category, stats.polarity)
+            if game_id is not None:
+                query = query.where(stats.game_id == game_id)
+        else:
+            query = select(func.date_trunc(time_interval, models.Review.created_at).label("date"),
+                           models.Review.source_id, models.Aspect.category, models.Aspect.polarity,
+                           func.count(models.Aspect.id)) \
+                .select_from(models.Aspect).join(models.Review, models.Review.id == models.Aspect.review_id) \
+                .where(*self._review_conditions(), models.Aspect.category != None, models.Aspect.polarity != None,
+                       models.Aspect.model_id == model_id) \
+                .group_by(models.Review.source_id, models.Aspect.category, models.Aspect.polarity)
+            if game_id is not None:
+                query = query.where(models.Review.game_id == game_id)
+        if time_interval is not None:
+            query = query.group_by(text("date")).order_by(text("date"))
+        result = await db.execute(query)
+        return result.all()
+
+
 class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
     async def get_with_good_and_bad_by_language_multi(self, db: AsyncSession, *, language: str) -> List[models.Review]:
         result = await db.execute(
@@ -77,41 +294,62 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
                                      game_id: int = None,
                                      polarities: List[str] = None,
                                      limit: int = 100,
-                                     offset: int = 0) -> schemas.ReviewListResponse:
-        count = select(func.count(self.model.id)).filter(self.model.processed_at != None)
-        query = select(self.model).filter(self.model.processed_at != None)
-
-        # Join the models.Aspect table and filter by aspects
-        query = query.join(models.Aspect, models.Aspect.review_id == self.model.id)
-        count = count.join(models.Aspect, models.Aspect.review_id == self.model.id)
-
+                                     offset: int = 0,
+                                     cursor: Optional[str] = None) -> schemas.ReviewListResponse:
+        """
+        Get processed reviews having an aspect matching the filters, ordered by id.
+        The list is paginated by offset or by cursor (next_cursor of the previous page, offset is ignored),
+        the total number of reviews is counted with the first page and reused by the next pages (total_cache).
+        :raises ValueError: if the cursor is malformed
+        """
+        aspect_conditions = [models.Aspect.review_id == self.model.id]
         if model_ids is not None:
-            query = query.filter(models.Aspect.model_id.in_(model_ids))
-            count = count.filter(models.Aspect.model_id.in_(model_ids))
-
+            aspect_conditions.append(models.Aspect.model_id.in_(model_ids))
         if aspects is not None:
-            query = query.filter(models.Aspect.category.in_(aspects))
-            count = count.filter(models.Aspect.category.in_(aspects))
-
+            aspect_conditions.append(models.Aspect.category.in_(aspects))
         # Filter by polarities if provided
         if polarities is not None:
-            query = query.filter(models.Aspect.polarity.in_(polarities))
-            count = count.filter(models.Aspect.polarity.in_(polarities))
+            aspect_conditions.append(models.Aspect.polarity.in_(polarities))
 
+        conditions = [self.model.processed_at != None, select(models.Aspect.id).where(*aspect_conditions).exists()]
         if game_id is not None:
-            query = query.filter(self.model.game_id == game_id)
-            count = count.filter(self.model.game_id == game_id)
-
-        result = await db.execute(
-            query.group_by(self.model.id).order_by(self.model.id)
-            .options(
-                selectinload(self.model.aspects)
-            ).limit(limit).offset(offset)
-        )
+            conditions.append(self.model.game_id == game_id)
+
+        query = select(self.model).where(*conditions) \
+            .order_by(self.model.id) \
+            .options(selectinload(self.model.aspects)) \
+            .limit(limit)
+        if cursor is not None:
+            last_id, = decode_cursor(cursor, 1)
+            try:
+                query = query.where(self.model.id > int(last_id))
+            except (TypeError, ValueError) as e:
+                raise ValueError("Invalid cursor") from e
+        else:
+            query = query.offset(offset)
+        result = await db.execute(query)
         reviews = result.scalars().all()
-        result = await db.execute(count.group_by(self.model.id))
-        total = result.scalar() or 0
-        return schemas.ReviewListResponse(reviews=reviews, total=total)
+
+        key = ("reviews", game_id, *(tuple(values) if values is not None else None
+                                     for values in (aspects, model_ids, polarities)))
+        total = await total_cache.get(key, lambda: db.scalar(select(func.count(self.model.id)).where(*conditions)),
+                                      first_page=offset == 0 and cursor is None)
+        next_cursor = encode_cursor([reviews[-1].id]) if len(reviews) == limit else None
+        return schemas.ReviewListResponse(reviews=reviews, total=total, next_cursor=next_cursor)
+
+    async def mark_processed(self, db: AsyncSession, *, review_ids: List[int],
+                             processed_at: Optional[datetime] = None) -> None:
+        """
+        Marks the reviews as processed and counts them in the daily rollup (crud.review_stats). Does not commit.
+        Review objects loaded in the session are not updated.
+        """
+        if not review_ids:
+            return
+        await crud_review_stats.add_processed(db, review_ids=review_ids)
+        await db.execute(update(self.model)
+                         .where(self.model.id.in_(review_ids))
+                         .values(processed_at=processed_at or datetime.now())
+                         .execution_options(synchronize_session=False))
 
     async def get_summary(self, db: AsyncSession, *,
                           game_id: Optional[int] = None,
@@ -121,29 +359,15 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
         Count total reviews, count processed and not processed reviews per game and source by time_interval
         """
         summary = ReviewsSummary()
-        query = select(
-            func.array_agg(self.model.id).label('ids'),
-            func.array_agg(case(
-                [(self.model.voted_up == True, self.model.id)])).label("positive"),
-            func.array_agg(case(
-                [(self.model.processed_at != None, self.model.id)])).label("processed"),
-            func.date_trunc(time_interval, self.model.created_at).label('date'),
-            self.model.source_id
-        ) \
-            .group_by('date', self.model.source_id) \
-            .order_by(text('date desc'))
-
         if game_id is not None:
-            query = query.filter(self.model.game_id == game_id)
             summary.game_id = game_id
 
-        result = await db.execute(query)
-        data = result.all()
+        rows = await crud_review_stats.get_review_counts(db, game_id=game_id, time_interval=time_interval)
         data_points = []
-        for all_ids, positive_ids, processed_ids, date, source_id in data:
-            data_point = ReviewsSummaryDataPoint(total=len(all_ids),
-                                                 processed=len([i for i in processed_ids if i is not None]),
-                                                 positive=len([i for i in positive_ids if i is not None]),
+        for date, source_id, total, processed, positive in reversed(rows):
+            data_point = ReviewsSummaryDataPoint(total=total,
+                                                 processed=processed,
+                                                 positive=positive,
                                                  date=date,
                                                  source_id=source_id)
             data_points.append(data_point)
@@ -158,28 +382,16 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
         """
         Count total reviews, count processed and not processed reviews per game and source by time_interval
         """
-        query = select(
-            func.date_trunc(time_interval, models.Review.created_at).label('date'),
-            models.Review.source_id,
-            func.count(func.distinct(models.Review.id)).label("total"),
-            func.count(func.distinct(case((models.Review.processed_at == None, models.Review.id)))).label(
-                "not_processed"),
-            func.count(func.distinct(case((models.Review.processed_at != None, models.Review.id)))).label(
-                "processed"),
-            func.sum(case((models.Aspect.polarity == "positive", 1), else_=0)).label("positive"),
-            func.sum(case((models.Aspect.polarity == "negative", 1), else_=0)).label("negative"),
-            func.sum(case((models.Aspect.polarity == "neutral", 1), else_=0)).label("neutral")
-        )
-        if game_id is not None:
-            query = query.filter(models.Review.game_id == game_id)
-
-        result = await db.execute(
-            query.outerjoin(models.Aspect, models.Review.id == models.Aspect.review_id)
-            .filter((models.Aspect.model_id == model) | (models.Aspect.id == None)
-                    )
-            .group_by(text("date"), models.Review.source_id)
-            .order_by(text("date"), models.Review.source_id)
-        )
+        # [total, processed, positive, negative, neutral] by (date, source_id)
+        counts: Dict[Tuple[datetime, int], List[int]] = {}
+        for date, source_id, total, processed, _ in await crud_review_stats.get_review_counts(
+                db, game_id=game_id, time_interval=time_interval):
+            counts[date, source_id] = [total, processed, 0, 0, 0]
+        polarity_index = {"positive": 2, "negative": 3, "neutral": 4}
+        for date, source_id, _, polarity, count in await crud_review_stats.get_aspect_counts(
+                db, game_id=game_id, model_id=model, time_interval=time_interval):
+            if polarity in polarity_index:
+                counts.setdefault((date, source_id), [0, 0, 0, 0, 0])[polarity_index[polarity]] += count
 
         summary = schemas.ReviewsSummaryV2(
             total=0,
@@ -193,8 +405,8 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
         current_date = None
         current_date_summary = None
 
-        for row in result.all():
-            date, source_id, total, not_processed, processed, positive, negative, neutral = row
+        for (date, source_id), (total, processed, positive, negative, neutral) in sorted(counts.items()):
+            not_processed = total - processed
             summary.total += total
             summary.not_processed += not_processed
             summary.processed += processed
@@ -340,6 +552,8 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
             db_objs.append(db_obj)
 
         db.add_all(db_objs)
+        await db.flush()
+        await crud_review_stats.add_new_reviews(db, review_ids=[db_obj.id for db_obj in db_objs])
         await db.commit()
 
     async def create_with_reviewer_multi(
@@ -393,6 +607,16 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
             .where(and_(self.model.source_id == source_id, self.model.source_review_id.in_(source_review_ids))))
         return dict(result.all())
 
+    async def get_source_review_ids_by_game_since(self, db: AsyncSession, *, source_id: int, game_id: int,
+                                                  since: datetime) -> Set[str]:
+        """Returns source_review_ids of the reviews of the game from the source created at or after since."""
+        result = await db.scalars(
+            select(self.model.source_review_id)
+            .where(and_(self.model.source_id == source_id,
+                        self.model.game_id == game_id,
+                        self.model.created_at >= since)))
+        return set(result.all())
+
     async def get_ids_and_text(self, db: AsyncSession, *, source_id: int, offset: int = 0, limit: int = 100) -> List[
         Tuple[int, str]]:
         result = await db.scalars(
@@ -404,27 +628,7 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
     async def get_aspect_summary_by_category_and_sources(
             self, db: AsyncSession, *, game_id: int = None, model: str = "mt5-acos-1.0"
     ) -> schemas.AspectsSummary:
-        query = select(
-            models.Review.source_id,
-            models.Aspect.category,
-            models.Aspect.polarity,
-            func.count(models.Aspect.id).label("count")
-        ).outerjoin(
-            models.Aspect, models.Review.id == models.Aspect.review_id
-        ).filter(
-            models.Aspect.model_id == model
-        )
-
-        if game_id is not None:
-            query = query.filter(models.Review.game_id == game_id)
-
-        query = query.group_by(
-            models.Review.source_id,
-            models.Aspect.category,
-            models.Aspect.polarity
-        )
-
-        result = await db.execute(query)
+        rows = await crud_review_stats.get_aspect_counts(db, game_id=game_id, model_id=model, time_interval=None)
 
         summary = schemas.AspectsSummary(
             total=schemas.PolarityCounts(positive=0, negative=0, neutral=0),
@@ -432,8 +636,7 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
             dates={}
         )
 
-        for row in result.all():
-            source_id, category, polarity, count = row
+        for _, source_id, category, polarity, count in rows:
             if source_id not in summary.sources:
                 summary.sources[source_id] = schemas.CategoryPolarityCounts(
                     total=schemas.PolarityCounts(positive=0, negative=0, neutral=0),
@@ -455,25 +658,8 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
     async def get_aspects_summary_by_date_and_categories(
             self, db: AsyncSession, *, game_id: int, time_interval: str = "day", model: str = "mt5-acos-1.0"
     ) -> schemas.AspectsSummary:
-        query = select(
-            func.date_trunc(time_interval, models.Review.created_at).label("date"),
-            models.Aspect.category,
-            models.Aspect.polarity,
-            func.count(models.Aspect.id).label("count")
-        ).outerjoin(
-            models.Aspect, models.Review.id == models.Aspect.review_id
-        ).filter(
-            models.Review.game_id == game_id,
-            models.Aspect.model_id == model
-        ).group_by(
-            "date",
-            models.Aspect.category,
-            models.Aspect.polarity
-        ).order_by(
-            "date"
-        )
-
-        result = await db.execute(query)
+        rows = await crud_review_stats.get_aspect_counts(db, game_id=game_id, model_id=model,
+                                                         time_interval=time_interval)
 
         summary = schemas.AspectsSummary(
             total=schemas.PolarityCounts(positive=0, negative=0, neutral=0),
@@ -481,9 +667,7 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
             dates={}
         )
 
-        for row in result.all():
-            date, category, polarity, count = row
-
+        for date, _, category, polarity, count in rows:
             if date not in summary.dates:
                 summary.dates[date] = schemas.CategoryPolarityCounts(
                     total=schemas.PolarityCounts(positive=0, negative=0, neutral=0),
@@ -502,4 +686,5 @@ class CRUDReview(CRUDBase[models.Review, ReviewCreate, ReviewCreate]):
         return summary
 
 
+crud_review_stats = CRUDReviewStats(models.ReviewDailyStats)
 crud_review = CRUDReview(models.Review)
@@ -2,12 +2,18 @@
 Created by Frantisek Sabol
 """
 import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Iterable
+
+from sqlalchemy import select, and_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import models, schemas
+from .base import CRUDBase
 from .game import crud_game
 from .game import crud_category
 from .developer import crud_developer
-from .review import crud_review
+from .review import crud_review, crud_review_stats
 from .reviewer import crud_reviewer
 from .source import crud_source
 
@@ -102,8 +108,153 @@ class CRUDScraper:
             game = await self.store_game_with_additional_objects(db, scraped_obj=scraped_obj.game)
             review.game_id = game.id
 
+        await db.flush()
+        await crud_review_stats.add_new_reviews(db, review_ids=[review.id])
         await db.commit()
         return review
 
+    async def store_reviews_bulk(self, db: AsyncSession, *, source_id: int,
+                                 scraped_objs: List[schemas.ScrapedReview]) -> Dict[str, int]:
+        """
+        Stores a page of reviews with their reviewers using set based statements.
+        Reviews and reviewers are de-duplicated in memory and then written with one
+        INSERT ... ON CONFLICT statement per table inside a single transaction.
+        Reviews have to have game_id already resolved.
+        :return: mapping of source_review_id to review id for every review of the page
+        """
+        reviews = {}
+        reviewers = {}
+        for scraped_obj in scraped_objs:
+            if scraped_obj.game_id is None:
+                raise ValueError(f"Review {scraped_obj.source_review_id} has no game_id set")
+            reviews[scraped_obj.source_review_id] = scraped_obj
+            if scraped_obj.reviewer and scraped_obj.reviewer.source_reviewer_id is not None:
+                reviewers[scraped_obj.reviewer.source_reviewer_id] = scraped_obj.reviewer
+        if not reviews:
+            return {}
+
+        reviewer_ids = {}
+        if reviewers:
+            reviewer_rows = [
+                {
+                    "name": reviewer.name,
+                    "source_id": source_id,
+                    "source_reviewer_id": source_reviewer_id,
+                    "num_games_owned": reviewer.num_games_owned,
+                    "num_reviews": reviewer.num_reviews,
+                } for source_reviewer_id, reviewer in reviewers.items()
+            ]
+            stmt = insert(models.Reviewer).values(reviewer_rows)
+            # reviewer stats change between scrapes, keep the newest ones
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[models.Reviewer.source_reviewer_id, models.Reviewer.source_id],
+                set_={
+                    "name": stmt.excluded.name,
+                    "num_games_owned": stmt.excluded.num_games_owned,
+                    "num_reviews": stmt.excluded.num_reviews,
+                }
+            ).returning(models.Reviewer.source_reviewer_id, models.Reviewer.id)
+            result = await db.execute(stmt)
+            reviewer_ids = dict(result.all())
+
+        review_rows = []
+        for source_review_id, scraped_obj in reviews.items():
+            row = schemas.ReviewCreate(**scraped_obj.dict()).dict()
+            row["source_id"] = source_id
+            if scraped_obj.reviewer:
+                row["source_reviewer_id"] = scraped_obj.reviewer.source_reviewer_id
+                row["reviewer_id"] = reviewer_ids.get(scraped_obj.reviewer.source_reviewer_id)
+            review_rows.append(row)
+
+        stmt = insert(models.Review).values(review_rows).on_conflict_do_nothing(
+            index_elements=[models.Review.source_review_id, models.Review.source_id]
+        ).returning(models.Review.source_review_id, models.Review.id)
+        result = await db.execute(stmt)
+        review_ids = dict(result.all())
+        # only the inserted reviews are returned, they are counted in the daily rollup
+        await crud_review_stats.add_new_reviews(db, review_ids=review_ids.values())
+
+        # reviews skipped by ON CONFLICT are not returned, fetch their ids
+        missing = [source_review_id for source_review_id in reviews if source_review_id not in review_ids]
+        if missing:
+            result = await db.execute(
+                select(models.Review.source_review_id, models.Review.id)
+                .where(and_(models.Review.source_id == source_id,
+                            models.Review.source_review_id.in_(missing))))
+            review_ids.update(dict(result.all()))
+
+        await db.commit()
+        logger.debug(f"store_reviews_bulk: stored {len(review_rows)} reviews and {len(reviewer_ids)} reviewers")
+        return review_ids
+
+
+
+class CRUDScrapingJob(CRUDBase[models.ScrapingJob, schemas.ScrapingJobCreate, schemas.ScrapingJobUpdate]):
+    async def get_by_name(self, db: AsyncSession, *, name: str) -> Optional[models.ScrapingJob]:
+        return await db.scalar(select(self.model).where(self.model.name == name))
+
+    async def start(self, db: AsyncSession, *, name: str, source_id: int, game_id: Optional[int] = None
+                    ) -> models.ScrapingJob:
+        """
+        Returns the running job with the name so it can be resumed from its checkpoint.
+        Finished jobs are restarted from the beginning, failed urls are kept for the retry pass.
+        """
+        db_obj = await self.get_by_name(db, name=name)
+        if db_obj is None:
+            db_obj = self.model(name=name, source_id=source_id, game_id=game_id, done_pages=[], failed_urls=[])
+            db.add(db_obj)
+        elif db_obj.status != "running":
+            db_obj.status = "running"
+            db_obj.cursor = None
+            db_obj.pages_done = 0
+            db_obj.done_pages = []
+            db_obj.reviews_done = 0
+            db_obj.reviews_updated_until = None
+            db_obj.started_at = datetime.now()
+            db_obj.finished_at = None
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def checkpoint(self, db: AsyncSession, *,
+                         db_obj: models.ScrapingJob,
+                         cursor: Optional[str] = None,
+                         page: Optional[str] = None,
+                         num_reviews: int = 0,
+                         reviews_updated_until: Optional[datetime] = None,
+                         failed_urls: Optional[Iterable[str]] = None) -> models.ScrapingJob:
+        """
+        Records a page which was stored in the db. Must be called after the page is committed.
+        :param cursor: cursor of the next page (cursor based sources)
+        :param page: key of the stored page (sources with numbered pages)
+        """
+        db_obj.pages_done = (db_obj.pages_done or 0) + 1
+        if page is not None:
+            db_obj.done_pages = [*(db_obj.done_pages or []), page]
+        db_obj.reviews_done = (db_obj.reviews_done or 0) + num_reviews
+        if cursor is not None:
+            db_obj.cursor = cursor
+        if reviews_updated_until is not None and (
+                db_obj.reviews_updated_until is None or reviews_updated_until > db_obj.reviews_updated_until):
+            db_obj.reviews_updated_until = reviews_updated_until
+        if failed_urls:
+            db_obj.failed_urls = list(dict.fromkeys([*(db_obj.failed_urls or []), *failed_urls]))
+        await db.commit()
+        return db_obj
+
+    async def set_failed_urls(self, db: AsyncSession, *, db_obj: models.ScrapingJob, failed_urls: List[str]
+                              ) -> models.ScrapingJob:
+        db_obj.failed_urls = list(dict.fromkeys(failed_urls))
+        await db.commit()
+        return db_obj
+
+    async def finish(self, db: AsyncSession, *, db_obj: models.ScrapingJob) -> models.ScrapingJob:
+        db_obj.status = "finished"
+        db_obj.cursor = None
+        db_obj.finished_at = datetime.now()
+        await db.commit()
+        return db_obj
+
 
 crud_scraper = CRUDScraper()
+crud_scraping_job = CRUDScrapingJob(models.ScrapingJob)
@@ -2,9 +2,10 @@
 # imported by Alembic
 from app.db.base_class import Base  # noqa
 from app.models.user import User # noqa
-from app.models.game import Game, Category, GameCategory  # noqa
+from app.models.game import Game, Category, GameCategory, GameStats  # noqa
 from app.models.aspect import Aspect  # noqa
-from app.models.review import Review  # noqa
+from app.models.review import Review, ReviewDailyStats, AspectDailyStats  # noqa
 from app.models.reviewer import Reviewer  # noqa
 from app.models.source import Source, GameSource  # noqa
-from app.models.analyzer import AnalyzedReview, AnalyzedReviewSentence  # noqa
\ No newline at end of file
+from app.models.analyzer import AnalyzedReview, AnalyzedReviewSentence  # noqa
+from app.models.scraper import ScrapingJob  # noqa
@@ -2,7 +2,7 @@
 Created by Frantisek Sabol
 """
 from app.db.base_class import Base
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, func, ForeignKey, Computed, Index
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, func, ForeignKey, Computed, Index, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy_utils.types.ts_vector import TSVectorType
 
@@ -26,6 +26,7 @@ class Game(Base):
     sources = relationship("GameSource", back_populates="game", cascade="all, delete")
     categories = relationship("GameCategory", back_populates="game", cascade="all, delete")
     developers = relationship("GameDeveloper", back_populates="game", cascade="all, delete")
+    stats = relationship("GameStats", back_populates="game", cascade="all, delete")
 
     __table_args__ = (
         Index("idx_game_name_tsv", name_tsv, postgresql_using="gin"),
@@ -57,3 +58,27 @@ class GameDeveloper(Base):
 
     game = relationship("Game", back_populates="developers")
     developer = relationship("Developer", back_populates="games")
+
+
+# rollup of the aspects of a game extracted by a model, read by the game list instead of aggregating the aspects
+# kept up to date by crud.game_stats
+class GameStats(Base):
+    game_id = Column(Integer, ForeignKey('game.id', ondelete="CASCADE"), primary_key=True)
+    model_id = Column(String, primary_key=True)
+
+    # see CRUDGameStats.score_expression
+    score = Column(Float)
+    # reviews with at least one aspect
+    num_reviews = Column(Integer, default=0)
+    num_aspects = Column(Integer, default=0)
+    num_positive = Column(Integer, default=0)
+    num_negative = Column(Integer, default=0)
+    num_neutral = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+
+    game = relationship("Game", back_populates="stats")
+
+    __table_args__ = (
+        Index("idx_gamestats_model_score", model_id, score),
+        Index("idx_gamestats_model_num_reviews", model_id, num_reviews),
+    )
@@ -66,4 +66,33 @@ class Review(Base):
 
     __table_args__ = (
         Index("idx_review_text_tsv", text_tsv, postgresql_using="gin"),
+        # unprocessed reviews claimed by the analyzer workers
+        Index("idx_review_unprocessed", game_id, id, postgresql_where=processed_at.is_(None)),
     )
+
+
+# daily rollup of the reviews of a game by source, read by the summaries instead of scanning the reviews
+# kept up to date by crud.review_stats
+class ReviewDailyStats(Base):
+    game_id = Column(Integer, ForeignKey('game.id', ondelete="CASCADE"), primary_key=True)
+    source_id = Column(Integer, ForeignKey('source.id', ondelete="CASCADE"), primary_key=True)
+    # date_trunc('day', review.created_at)
+    day = Column(DateTime(timezone=True), primary_key=True)
+
+    num_reviews = Column(Integer, default=0)
+    num_processed = Column(Integer, default=0)
+    num_voted_up = Column(Integer, default=0)
+
+
+# daily rollup of the aspects of the reviews of a game by source, model, category and polarity
+# kept up to date by crud.review_stats
+class AspectDailyStats(Base):
+    game_id = Column(Integer, ForeignKey('game.id', ondelete="CASCADE"), primary_key=True)
+    model_id = Column(String, primary_key=True)
+    # date_trunc('day', review.created_at)
+    day = Column(DateTime(timezone=True), primary_key=True)
+    source_id = Column(Integer, ForeignKey('source.id', ondelete="CASCADE"), primary_key=True)
+    category = Column(String, primary_key=True)
+    polarity = Column(String, primary_key=True)
+
+    num_aspects = Column(Integer, default=0)
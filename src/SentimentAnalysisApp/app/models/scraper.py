@@ -0,0 +1,30 @@
+"""
+Created by Frantisek Sabol
+"""
+from app.db.base_class import Base
+from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey
+from sqlalchemy.dialects.postgresql import ARRAY
+
+
+# checkpoint of a long running scraping job, the job resumes from it after restart
+class ScrapingJob(Base):
+    id = Column(Integer, primary_key=True, index=True)
+    # identification of the job, e.g. reviews:<source_id>:<game_id>
+    name = Column(String, index=True, unique=True)
+    source_id = Column(Integer, ForeignKey('source.id'))
+    game_id = Column(Integer, ForeignKey('game.id'), default=None)
+
+    status = Column(String, default="running")
+    # cursor of the next page to scrape
+    cursor = Column(String, default=None)
+    pages_done = Column(Integer, default=0)
+    # keys of the scraped pages of sources with numbered pages (page number or offset)
+    done_pages = Column(ARRAY(String), default=list)
+    reviews_done = Column(Integer, default=0)
+    # newest timestamp_updated of the reviews scraped by the job
+    reviews_updated_until = Column(DateTime(timezone=True), default=None)
+    failed_urls = Column(ARRAY(String), default=list)
+
+    started_at = Column(DateTime(timezone=True), default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), default=None)
@@ -42,6 +42,8 @@ class GameSource(Base):
 
     reviews_scraped_at = Column(DateTime(timezone=True), default=None)
     num_reviews = Column(Integer, default=0)
+    # high water mark of review scraping: newest timestamp_updated of scraped reviews
+    reviews_updated_until = Column(DateTime(timezone=True), default=None)
 
     game = relationship("Game", back_populates="sources")
     source = relationship("Source", back_populates="games")
@@ -2,6 +2,7 @@ from .user import User, UserCreate, UserDB, UserUpdate
 from .game import Game, GameBase, GameCreate, GameUpdate, GameInDB, GameInDBBase
 from .game import Category, CategoryBase, CategoryUpdate, CategoryCreate
 from .game import GameListResponse, GameListItem, GameListQuerySummary, GameListFilter, GameListSort
+from .game import GameStats, GameStatsCreate, GameStatsUpdate
 from .review import (Review, ReviewBase,
                      ReviewCreate,
                      ReviewUpdate, ReviewInDB, ReviewInDBBase,
@@ -18,12 +19,14 @@ from .source import Source, SourceBase, SourceCreate, SourceUpdate, SourceInDBBa
 from .source import GameSource, GameSourceUpdate, GameSourceCreate
 from .developer import Developer, DeveloperCreate, DeveloperUpdate, DeveloperInDBBase
 from .scraper import ScrapedGame, ScrapedReview, ScrapedReviewer
+from .scraper import ScrapingJob, ScrapingJobCreate, ScrapingJobUpdate
 from .analyzer import AnalyzedReview, AnalyzedReviewCreate, AnalyzedReviewUpdate
 from .analyzer import AnalyzedReviewSentence, AnalyzedReviewSentenceCreate, AnalyzedReviewSentenceUpdate
 from .analyzer import AnalyzerSearchFilter, AnalyzedReviewListResponse
 from .review import ReviewsSummaryV2, ReviewsSummaryBaseDataPoint, ReviewsSummaryByDate
 from .review import AspectsSummary, PolarityCounts, CategoryPolarityCounts
 from .review import ReviewListResponse
+from .review import ReviewDailyStats, ReviewDailyStatsCreate, ReviewDailyStatsUpdate
 
 Reviewer.update_forward_refs(Review=Review, Source=Source)
 Game.update_forward_refs(Review=Review, Source=Source)
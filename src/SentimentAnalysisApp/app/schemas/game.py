@@ -92,6 +92,32 @@ class GameCategoryUpdate(GameCategoryBase):
     category_id: int
 
 
+class GameStatsBase(BaseModel):
+    game_id: int
+    model_id: str
+    score: Optional[float] = None
+    num_reviews: int = 0
+    num_aspects: int = 0
+    num_positive: int = 0
+    num_negative: int = 0
+    num_neutral: int = 0
+
+
+class GameStatsCreate(GameStatsBase):
+    pass
+
+
+class GameStatsUpdate(GameStatsBase):
+    pass
+
+
+class GameStats(GameStatsBase):
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
 class GameListQuerySummary(BaseModel):
     total: int
     processed: Optional[int] = None
@@ -124,6 +150,8 @@ class GameListItem(BaseModel):
 class GameListResponse(BaseModel):
     query_summary: Optional[GameListQuerySummary] = None
     games: List[GameListItem]
+    # cursor of the next page, None on the last page
+    next_cursor: Optional[str] = None
 
 
 class GameListFilter(BaseModel):
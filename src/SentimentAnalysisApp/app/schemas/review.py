@@ -81,6 +81,8 @@ class ReviewWithAspects(ReviewInDBBase):
 class ReviewListResponse(BaseModel):
     reviews: List[ReviewWithAspects]
     total: int
+    # cursor of the next page, None on the last page
+    next_cursor: Optional[str] = None
 
 
 class ReviewsSummaryDataPoint(BaseModel):
@@ -153,3 +155,25 @@ class AspectsSummary(BaseModel):
 # Additional properties stored in DB
 class ReviewInDB(ReviewInDBBase):
     pass
+
+
+class ReviewDailyStatsBase(BaseModel):
+    game_id: int
+    source_id: int
+    day: datetime
+    num_reviews: int = 0
+    num_processed: int = 0
+    num_voted_up: int = 0
+
+
+class ReviewDailyStatsCreate(ReviewDailyStatsBase):
+    pass
+
+
+class ReviewDailyStatsUpdate(ReviewDailyStatsBase):
+    pass
+
+
+class ReviewDailyStats(ReviewDailyStatsBase):
+    class Config:
+        orm_mode = True
@@ -67,4 +67,45 @@ class ScrapedReview(BaseModel):
     def check_game_id(cls, v, values):
         if v is None and values.get("game") is None:
             raise ValueError("Either game_id or game must be set")
-        return v
\ No newline at end of file
+        return v
+
+class ScrapingJobBase(BaseModel):
+    name: str
+    source_id: int
+    game_id: Optional[int] = None
+    status: str = "running"
+    cursor: Optional[str] = None
+    pages_done: int = 0
+    done_pages: List[str] = []
+    reviews_done: int = 0
+    reviews_updated_until: Optional[datetime] = None
+    failed_urls: List[str] = []
+
+
+class ScrapingJobCreate(ScrapingJobBase):
+    pass
+
+
+class ScrapingJobUpdate(ScrapingJobBase):
+    name: Optional[str] = None
+    source_id: Optional[int] = None
+    status: Optional[str] = None
+    pages_done: Optional[int] = None
+    done_pages: Optional[List[str]] = None
+    reviews_done: Optional[int] = None
+    failed_urls: Optional[List[str]] = None
+    finished_at: Optional[datetime] = None
+
+
+class ScrapingJobInDBBase(ScrapingJobBase):
+    id: int
+    started_at: datetime
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
+class ScrapingJob(ScrapingJobInDBBase):
+    pass
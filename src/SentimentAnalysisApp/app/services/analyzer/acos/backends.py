@@ -0,0 +1,120 @@
+"""
+Created by Frantisek Sabol
+Inference backends of the seq2seq ACOS models. All backends return a model with generate() of transformers models:
+- pytorch: full precision PyTorch model on the device of autocuda (default, the only backend for training)
+- pytorch-int8: PyTorch model with dynamic int8 quantization of the linear layers (CPU)
+- onnx: ONNX Runtime export of the encoder and of the decoder with KV cache (decoder_with_past), CPU
+- onnx-int8: the ONNX export with dynamic int8 quantization of the weights, CPU
+The backend of a checkpoint is the "inference_backend" attribute of its config (pytorch if missing),
+set it with `python -m app.services.analyzer.acos.backends --checkpoint <dir> --backend onnx-int8 --set-default`.
+ONNX exports are stored in the "onnx" directory of the checkpoint and reused, the export runs once per checkpoint.
+ONNX backends require optimum[onnxruntime].
+"""
+import argparse
+import logging
+import os
+
+import torch
+from transformers import AutoConfig, AutoModelForSeq2SeqLM
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("pytorch", "pytorch-int8", "onnx", "onnx-int8")
+DEFAULT_BACKEND = "pytorch"
+ONNX_DIR = "onnx"
+ONNX_FILES = ("encoder_model.onnx", "decoder_model.onnx", "decoder_with_past_model.onnx")
+QUANTIZED_SUFFIX = "quantized"
+
+
+def get_backend(checkpoint, backend=None):
+    """Backend of the checkpoint, backend overrides the backend of the config if not None."""
+    if backend is None:
+        backend = getattr(AutoConfig.from_pretrained(checkpoint), "inference_backend", DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend {backend} not supported, use one of {BACKENDS}")
+    return backend
+
+
+def quantized_file_name(file_name):
+    return file_name.replace(".onnx", f"_{QUANTIZED_SUFFIX}.onnx")
+
+
+def export_onnx(checkpoint, quantize=False):
+    """
+    Exports the checkpoint to ONNX (encoder, decoder and decoder with KV cache) into the onnx directory
+    of the checkpoint, skipped if already exported.
+    :param quantize: also quantize the exported models (dynamic int8 quantization of the weights)
+    :return: path of the onnx directory
+    """
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    onnx_dir = os.path.join(checkpoint, ONNX_DIR)
+    if not all(os.path.isfile(os.path.join(onnx_dir, file_name)) for file_name in ONNX_FILES):
+        logger.info(f"Exporting {checkpoint} to ONNX")
+        model = ORTModelForSeq2SeqLM.from_pretrained(checkpoint, export=True, use_cache=True)
+        model.save_pretrained(onnx_dir)
+
+    if quantize:
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        quantization_config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        for file_name in ONNX_FILES:
+            if os.path.isfile(os.path.join(onnx_dir, quantized_file_name(file_name))):
+                continue
+            logger.info(f"Quantizing {file_name} of {checkpoint}")
+            quantizer = ORTQuantizer.from_pretrained(onnx_dir, file_name=file_name)
+            quantizer.quantize(save_dir=onnx_dir, quantization_config=quantization_config)
+    return onnx_dir
+
+
+def load_seq2seq_model(checkpoint, backend=DEFAULT_BACKEND, device=None):
+    """
+    Loads the model of the checkpoint for the backend.
+    :param device: device of the pytorch backend, the other backends run on the CPU
+    :return: model and its device
+    """
+    if backend == "pytorch":
+        model = AutoModelForSeq2SeqLM.from_pretrained(checkpoint)
+        model.to(device)
+        return model, device
+
+    device = torch.device("cpu")
+    if backend == "pytorch-int8":
+        model = AutoModelForSeq2SeqLM.from_pretrained(checkpoint)
+        model.eval()
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8), device
+
+    if backend in ("onnx", "onnx-int8"):
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        quantize = backend == "onnx-int8"
+        onnx_dir = export_onnx(checkpoint, quantize=quantize)
+        encoder, decoder, decoder_with_past = [quantized_file_name(f) if quantize else f for f in ONNX_FILES]
+        model = ORTModelForSeq2SeqLM.from_pretrained(onnx_dir,
+                                                     encoder_file_name=encoder,
+                                                     decoder_file_name=decoder,
+                                                     decoder_with_past_file_name=decoder_with_past,
+                                                     use_cache=True)
+        return model, device
+    raise ValueError(f"Backend {backend} not supported, use one of {BACKENDS}")
+
+
+def set_default_backend(checkpoint, backend):
+    """Stores the backend in the config of the checkpoint."""
+    config = AutoConfig.from_pretrained(checkpoint)
+    config.inference_backend = get_backend(checkpoint, backend)
+    config.save_pretrained(checkpoint)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checkpoint", type=str, required=True, help="Directory of the model")
+    parser.add_argument("--backend", type=str, default="onnx-int8", choices=BACKENDS)
+    parser.add_argument("--set-default", action="store_true", help="Use the backend when loading the checkpoint")
+    args = parser.parse_args()
+
+    if args.backend.startswith("onnx"):
+        export_onnx(args.checkpoint, quantize=args.backend == "onnx-int8")
+    if args.set_default:
+        set_default_backend(args.checkpoint, args.backend)
@@ -21,7 +21,8 @@ from app.services.analyzer.acos.instruction import (
     APCInstruction,
     JointAspectCategorySentimentInstruction,
     JointAspectSentimentInstruction,
-    JointACOSInstruction
+    JointACOSInstruction,
+    PromptFreeInstruction
 )
 
 
@@ -42,9 +43,10 @@ class InstructDatasetLoader:
             self.train_df_ood = train_df_ood
         self.test_df_ood = test_df_ood
 
-    def prepare_instruction_dataloader(self, df, task="ate"):
+    def prepare_instruction_dataloader(self, df, task="ate", prompt_free=False):
         """
         Prepare the data in the input format required.
+        prompt_free: inputs of the joint tasks without the few-shot instruction (PromptFreeInstruction)
         """
         ate_instructor = ATEInstruction()
         apc_instructor = APCInstruction()
@@ -53,6 +55,10 @@ class InstructDatasetLoader:
         aspect_category_sentiment_instructor = JointAspectCategorySentimentInstruction()
         aspect_sentiment_instructor = JointAspectSentimentInstruction()
         jointACOS_instructor = JointACOSInstruction()
+        if prompt_free:
+            aspect_category_sentiment_instructor = PromptFreeInstruction(task)
+            aspect_sentiment_instructor = PromptFreeInstruction(task)
+            jointACOS_instructor = PromptFreeInstruction(task)
 
         alldata = []
         for i, data in df.iterrows():
@@ -248,4 +254,27 @@ def create_task_output_string(task, *, outputs):
         return "|".join([f"{output['aspect']}:{output['polarity']}" for output in outputs])
     elif task == "joint-acos":
         return "|".join(
-            [f"{output['aspect']}:{output['category']}:{output['opinion']}:{output['polarity']}" for output in outputs])
\ No newline at end of file
+            [f"{output['aspect']}:{output['category']}:{output['opinion']}:{output['polarity']}" for output in outputs])
+
+
+def parse_task_output_string(task, *, output):
+    """
+    Parse the string representation of the task output (inverse of create_task_output_string)
+    :param task: task name
+    :param output: string representation of the task output
+    :return: task outputs, elements with a wrong number of fields are skipped
+    """
+    keys = {
+        "joint-aspect-category-sentiment": ("aspect", "category", "polarity"),
+        "joint-aspect-category": ("aspect", "category"),
+        "joint-aspect-sentiment": ("aspect", "polarity"),
+        "joint-acos": ("aspect", "category", "opinion", "polarity"),
+    }.get(task)
+    if keys is None or not output:
+        return []
+    outputs = []
+    for element in output.split("|"):
+        values = element.split(":")
+        if len(values) == len(keys):
+            outputs.append(dict(zip(keys, values)))
+    return outputs
@@ -0,0 +1,103 @@
+"""
+Created by Frantisek Sabol
+Distillation of a few-shot instructed ACOS checkpoint into a prompt-free checkpoint. [dev]
+The teacher (checkpoint trained with the few-shot instruction) labels unlabelled reviews, the student
+(initialized from the teacher) is fine-tuned on the teacher labels and the gold labels with PromptFreeInstruction
+inputs, so the encoder processes the review and a short task tag instead of the ~200 tokens of the instruction.
+The saved config has prompt_free=True, ABSAGenerator (and db_analyzer) use the prompt-free inputs automatically.
+The encoder is bidirectional, the hidden states of the instruction depend on the review and can not be cached,
+dropping the instruction is the only way to save its encoder FLOPs.
+Usage (cwd: app/services/analyzer/acos):
+    python distill.py --teacher models/mt5-acos-1.0 --reviews reviews.txt --output models/mt5-acos-1.0-prompt-free
+"""
+import argparse
+import os
+
+import pandas as pd
+import tqdm
+
+import data_utils
+import model
+
+TASK = "joint-acos"
+
+
+def read_reviews(path):
+    """One review per line."""
+    with open(path, "r", encoding="utf8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def label_reviews(teacher, reviews, task=TASK, batch_size=32, max_batch_tokens=None):
+    """
+    Labels the reviews with the teacher.
+    :return: list of {"text", "labels"} rows, labels are the quadruples of the teacher
+    """
+    rows = []
+    for i in tqdm.tqdm(range(0, len(reviews), batch_size), desc="Labeling reviews"):
+        results = teacher.batch_predict(batch=reviews[i:i + batch_size], task=task, max_length=128,
+                                        max_batch_tokens=max_batch_tokens)
+        rows.extend({"text": result["text"], "labels": result["Quadruples"]} for result in results)
+    return rows
+
+
+def distill(teacher_checkpoint, reviews, output_dir, task=TASK, gold_dataset=None, test_size=0.1,
+            batch_size=32, max_batch_tokens=None, **training_args):
+    """
+    :param teacher_checkpoint: checkpoint of the few-shot instructed model
+    :param reviews: unlabelled reviews labelled by the teacher
+    :param output_dir: output directory of the student
+    :param gold_dataset: path of a dataset in the format of train.py (train/test jsonl files), added to the labels
+    :param test_size: fraction of the teacher labelled reviews used for evaluation
+    :param training_args: overrides of the Seq2SeqTrainingArguments
+    """
+    student = model.ABSAGenerator(teacher_checkpoint, prompt_free=False, backend="pytorch")
+    train_df = pd.DataFrame(label_reviews(student, reviews, task, batch_size, max_batch_tokens))
+    test_df = train_df.sample(frac=test_size, random_state=1999)
+    train_df = train_df.drop(test_df.index)
+    if gold_dataset is not None:
+        train_df = pd.concat([train_df, pd.DataFrame(data_utils.read_json(gold_dataset, "train"))])
+        test_df = pd.concat([test_df, pd.DataFrame(data_utils.read_json(gold_dataset, "test"))])
+
+    loader = data_utils.InstructDatasetLoader(train_df, test_df)
+    loader.train_df_id = loader.prepare_instruction_dataloader(loader.train_df_id, task=task, prompt_free=True)
+    loader.test_df_id = loader.prepare_instruction_dataloader(loader.test_df_id, task=task, prompt_free=True)
+    _, tokenized_ds, _, _ = loader.create_datasets(student.tokenize_function_inputs)
+
+    student.model.config.prompt_free = True
+    student.prompt_free = True
+    student.train(tokenized_ds, **{
+        "output_dir": os.path.join(output_dir, "checkpoints"),
+        "evaluation_strategy": "epoch",
+        "save_strategy": "epoch",
+        "learning_rate": 5e-5,
+        "per_device_train_batch_size": 12,
+        "per_device_eval_batch_size": 16,
+        "num_train_epochs": 5,
+        "weight_decay": 0.01,
+        "warmup_ratio": 0.1,
+        "load_best_model_at_end": True,
+        "push_to_hub": False,
+        "predict_with_generate": True,
+        **training_args
+    })
+    student.model.save_pretrained(output_dir)
+    student.tokenizer.save_pretrained(output_dir)
+    return student
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--teacher", type=str, required=True, help="Checkpoint of the few-shot instructed model")
+    parser.add_argument("--reviews", type=str, required=True, help="File with unlabelled reviews, one per line")
+    parser.add_argument("--output", type=str, required=True, help="Output directory of the prompt-free model")
+    parser.add_argument("--task", type=str, default=TASK)
+    parser.add_argument("--gold_dataset", type=str, default=None,
+                        help="Dataset with gold labels (train/test jsonl files) added to the teacher labels")
+    parser.add_argument("--batch_size", type=int, default=32, help="Batch size of the teacher")
+    parser.add_argument("--max_batch_tokens", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=5)
+    args = parser.parse_args()
+
+    distill(args.teacher, read_reviews(args.reviews), args.output, task=args.task, gold_dataset=args.gold_dataset,
+            batch_size=args.batch_size, max_batch_tokens=args.max_batch_tokens, num_train_epochs=args.epochs)
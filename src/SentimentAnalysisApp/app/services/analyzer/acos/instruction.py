@@ -254,6 +254,26 @@ input: """
                 + self.eos_instruction
         )
 
+
+class PromptFreeInstruction(Instruction):
+    """
+    Input of distilled checkpoints (see distill.py), the few-shot examples are replaced by a short task tag,
+    so the encoder processes the review and a few tokens of the tag instead of the whole instruction.
+    """
+    def __init__(self, task="joint-acos", bos_instruction=None, eos_instruction=None):
+        super().__init__(bos_instruction, eos_instruction)
+        if self.bos_instruction is None:
+            self.bos_instruction = f"{task}: "
+        if self.eos_instruction is None:
+            self.eos_instruction = ""
+
+    def prepare_input(self, input_text, aspects=None, **kwargs):
+        return (
+                self.bos_instruction
+                + input_text
+                + self.eos_instruction
+        )
+
 #example 1-
 # input: Příběh je velmi zajímavý ale multiplayerová část hry je plná cheaterů.
 # output: Příběh:gameplay:velmi zajímavý:positive|multiplayerová část hry:gameplay:plná cheaterů:negative|cheaterů:community:plná:negative
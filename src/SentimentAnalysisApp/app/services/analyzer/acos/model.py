@@ -1,5 +1,8 @@
 # modified by Frantisek Sabol for joint task training
 # pyabsa 2.2.0 file
+import time
+from typing import NamedTuple
+
 import autocuda
 import sklearn
 import torch
@@ -18,6 +21,7 @@ from transformers import (
     Seq2SeqTrainer,
 )
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from app.services.analyzer.acos.backends import get_backend, load_seq2seq_model
 from app.services.analyzer.acos.instruction import (
     ATEInstruction,
     APCInstruction,
@@ -25,23 +29,26 @@ from app.services.analyzer.acos.instruction import (
     CategoryInstruction,
     JointAspectCategorySentimentInstruction,
     JointAspectSentimentInstruction,
-    JointACOSInstruction
+    JointACOSInstruction,
+    PromptFreeInstruction
 )
 
 
 class T5Generator:
-    def __init__(self, checkpoint):
+    def __init__(self, checkpoint, backend="pytorch"):
+        """
+        :param backend: inference backend (see backends.py), None for the backend of the checkpoint config
+        """
         try:
             checkpoint = CheckpointManager().parse_checkpoint(checkpoint, "ACOS")
         except Exception as e:
             print(e)
 
         self.tokenizer = AutoTokenizer.from_pretrained(checkpoint)
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(checkpoint)
+        self.backend = get_backend(checkpoint, backend)
+        self.model, self.device = load_seq2seq_model(checkpoint, self.backend, autocuda.auto_cuda())
         self.model.config.max_length = 128
         self.data_collator = DataCollatorForSeq2Seq(self.tokenizer)
-        self.device = autocuda.auto_cuda()
-        self.model.to(self.device)
 
     def tokenize_function_inputs(self, sample):
         """
@@ -336,8 +343,31 @@ class T5Classifier:
 
 # modified code
 class ABSAGenerator(T5Generator):
-    def __init__(self, model_checkpoint):
-        super().__init__(model_checkpoint)
+    def __init__(self, model_checkpoint, prompt_free=None, cache_prefix=False, backend=None, num_threads=None,
+                 profile_hook=None):
+        """
+        :param prompt_free: the checkpoint was distilled without the few-shot instruction (see distill.py),
+            read from the "prompt_free" attribute of the model config if None
+        :param cache_prefix: tokenize the instruction once and only the texts of the batches
+        :param backend: inference backend (see backends.py), None for the backend of the checkpoint config
+        :param num_threads: number of CPU threads of torch, torch default if None
+        :param profile_hook: called after every batch_predict with the BatchProfile of the batch
+        """
+        super().__init__(model_checkpoint, backend=backend)
+        if prompt_free is None:
+            prompt_free = getattr(self.model.config, "prompt_free", False)
+        self.prompt_free = prompt_free
+        self.cache_prefix = cache_prefix
+        self._instruction_ids = {}
+        self.profile_hook = profile_hook
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+    def warmup(self, task="joint-acos"):
+        """
+        Runs a short input through the model, the first generate call initializes the kernels and allocators.
+        """
+        self.batch_predict(batch=["warmup"], task=task, max_length=8)
 
     def decode_quadruple_from_output(self, output, task):
         """
@@ -345,7 +375,8 @@ class ABSAGenerator(T5Generator):
         """
         quads = []
         aspect, category, opinion, polarity = ["NULL", "NULL", "NULL", "NULL"]
-        aspects = set(output.split("|"))
+        # unique outputs in the order of generation
+        aspects = dict.fromkeys(output.split("|"))
         for asp in aspects:
             n_gram = asp.split(":")
             n = len(n_gram)
@@ -378,7 +409,9 @@ class ABSAGenerator(T5Generator):
         """
         Get the instructor for the task.
         """
-        if task == "ate":
+        if self.prompt_free and task.startswith("joint-"):
+            instructor = PromptFreeInstruction(task)
+        elif task == "ate":
             instructor = ATEInstruction()
         elif task == "joint-aspect-sentiment":
             instructor = JointAspectSentimentInstruction()
@@ -419,34 +452,123 @@ class ABSAGenerator(T5Generator):
         return ensemble_result
 
 
-    def batch_predict(self, *, batch, **kwargs):
+    def batch_predict(self, *, batch, max_batch_tokens=None, **kwargs):
         """
         Predict the outputs from the model for the texts in parallel.
+        With max_batch_tokens the inputs are sorted by tokenized length and split into buckets of similar length,
+        each bucket padded to max_batch_tokens tokens at most (longest input * number of inputs),
+        results are returned in the order of the batch.
+        Inputs are moved to the device once per bucket, generation runs in inference mode and the generated ids
+        of all buckets are decoded at once. Memory of the device is kept for the next batch.
         """
         task = kwargs.pop("task", "acos")
         instructor = self._get_instructor(task)
-        # inference
-        inputs = self.tokenizer(
-            [instructor.prepare_input(i, []) for i in batch], padding=True, truncation=True, return_tensors="pt"
-        ).to(self.device)
+        start = time.perf_counter()
 
-        inputs = inputs.to(self.device)
+        encoded = self.encode_inputs(batch, instructor)
+        if max_batch_tokens is None:
+            buckets = [list(range(len(batch)))]
+            inputs = [self.tokenizer.pad(encoded, return_tensors="pt")]
+        else:
+            buckets = bucket_by_length([len(input_ids) for input_ids in encoded["input_ids"]], max_batch_tokens)
+            inputs = [self.tokenizer.pad({key: [encoded[key][i] for i in bucket] for key in encoded.keys()},
+                                         return_tensors="pt") for bucket in buckets]
+        tokenized = time.perf_counter()
+
+        output_ids = [None] * len(batch)
+        with torch.inference_mode():
+            for bucket, bucket_inputs in zip(buckets, inputs):
+                # ids are copied to the host per bucket, the copy waits for the generation
+                generated_ids = self.model.generate(**bucket_inputs.to(self.device), **kwargs).cpu().tolist()
+                for i, ids in zip(bucket, generated_ids):
+                    output_ids[i] = ids
+        generated = time.perf_counter()
+
+        outputs = self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+        results = [
+            {
+                "text": text,
+                "Quadruples": self.decode_quadruple_from_output(output, task)
+            }
+            for text, output in zip(batch, outputs)
+        ]
 
-        outputs = self.model.generate(**inputs, **kwargs)
-        outputs = self.tokenizer.batch_decode(
-            outputs, skip_special_tokens=True
-        )
-        results = []
-        for text, output in zip(batch, outputs):
-            quads = self.decode_quadruple_from_output(output, task)
+        if self.profile_hook is not None:
+            self.profile_hook(BatchProfile(
+                batch_size=len(batch),
+                buckets=len(buckets),
+                tokens=sum(len(input_ids) for input_ids in encoded["input_ids"]),
+                tokenize=tokenized - start,
+                generate=generated - tokenized,
+                decode=time.perf_counter() - generated))
+        return results
 
-            results.append({
-                "text": text,
-                "Quadruples": quads
-            })
+    def encode_inputs(self, batch, instructor):
+        """
+        Tokenizes the texts with the instruction of the instructor (not padded).
+        With cache_prefix the instruction is tokenized once per instructor and only the texts are tokenized,
+        the instruction ids are joined with the ids of each text. The ids are the same as of the whole input
+        (sentencepiece normalizes the whitespace at the joins), except for inputs longer than model_max_length,
+        the texts are truncated instead of the end of the instruction.
+        """
+        if not self.cache_prefix:
+            return self.tokenizer([instructor.prepare_input(i, []) for i in batch], truncation=True)
 
-        del inputs
-        del outputs
-        torch.cuda.empty_cache()
+        prefix_ids, suffix_ids = self._get_instruction_ids(instructor)
+        max_text_length = self.tokenizer.model_max_length - len(prefix_ids) - len(suffix_ids)
+        text_ids = self.tokenizer(list(batch), add_special_tokens=False)["input_ids"]
+        input_ids = [prefix_ids + ids[:max(max_text_length, 0)] + suffix_ids for ids in text_ids]
+        return {
+            "input_ids": input_ids,
+            "attention_mask": [[1] * len(ids) for ids in input_ids]
+        }
 
-        return results
+    def _get_instruction_ids(self, instructor):
+        """
+        Token ids of the instruction before and after the text (with the eos token), cached per instruction.
+        """
+        key = (instructor.bos_instruction, instructor.eos_instruction)
+        if key not in self._instruction_ids:
+            prefix_ids = self.tokenizer(instructor.bos_instruction, add_special_tokens=False)["input_ids"]
+            suffix_ids = self.tokenizer(instructor.eos_instruction, add_special_tokens=False)["input_ids"]
+            self._instruction_ids[key] = (prefix_ids, suffix_ids + [self.tokenizer.eos_token_id])
+        return self._instruction_ids[key]
+
+
+class BatchProfile(NamedTuple):
+    """
+    Timing of a batch_predict call in seconds.
+    """
+    batch_size: int
+    buckets: int
+    tokens: int
+    tokenize: float
+    generate: float
+    decode: float
+
+    def __str__(self):
+        total = self.tokenize + self.generate + self.decode
+        return (f"{self.batch_size} texts ({self.tokens} tokens, {self.buckets} buckets) in {total:.3f}s: "
+                f"tokenize {self.tokenize:.3f}s, generate {self.generate:.3f}s, decode {self.decode:.3f}s")
+
+
+def bucket_by_length(lengths, max_batch_tokens):
+    """
+    Splits indices of the inputs into buckets of inputs of similar length (sorted by length).
+    A bucket is closed when its padded size (longest input * number of inputs) would exceed max_batch_tokens,
+    inputs longer than max_batch_tokens get a bucket of their own.
+    :param lengths: tokenized lengths of the inputs
+    :param max_batch_tokens: max number of tokens of a padded bucket
+    :return: list of buckets of indices into lengths
+    """
+    buckets = []
+    bucket = []
+    for i in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        # sorted ascending, the current input is the longest of the bucket
+        if bucket and lengths[i] * (len(bucket) + 1) > max_batch_tokens:
+            buckets.append(bucket)
+            bucket = []
+        bucket.append(i)
+    if bucket:
+        buckets.append(bucket)
+    return buckets
@@ -1,12 +1,14 @@
 import asyncio
 import os
 import re
+from functools import partial
 from typing import List
 
 import findfile
 
 from .utils import clean
-from nltk import sent_tokenize
+from .prediction_cache import cached_predict
+from .segmentation import sentence_segmenter
 
 
 def get_extractor(task="atepc", model_name="mt5-acos-1.0"):
@@ -16,16 +18,22 @@ def get_extractor(task="atepc", model_name="mt5-acos-1.0"):
         raise ValueError("checkpoint_name and task is None")
 
     if task == "atepc":
-        return ATEPC.AspectExtractor(
-            checkpoint=f"{os.path.realpath(os.path.dirname(__file__))}/checkpoints/{checkpoint_name}",
+        model_file = f"{os.path.realpath(os.path.dirname(__file__))}/checkpoints/{model_name}"
+        extractor = ATEPC.AspectExtractor(
+            checkpoint=model_file,
             device="gpu")
     elif task == "joint-acos":
         model_file = findfile.find_dir(f"acos/models/{model_name}")
         if not model_file:
             raise ValueError(f"Model {model_name} not found")
-        return model.ABSAGenerator(
+        extractor = model.ABSAGenerator(
             model_file
         )
+    else:
+        return None
+    # name of the loaded checkpoint, cached predictions of the extractor are keyed by it
+    extractor.model_name = os.path.basename(os.path.normpath(model_file))
+    return extractor
 
 
 
@@ -36,14 +44,18 @@ def get_apc():
     return APC.SentimentClassifier(checkpoint="multilingual", device="cpu")
 
 
-def extract_aspects(text: str, language: str = "english", extractor=None) -> List[str]:
+def extract_aspects(text: str, language: str = "english", extractor=None, cache=None, model_name: str = None,
+                    task: str = "atepc") -> List[str]:
+    """
+    :param cache: PredictionCache, sentences with a cached prediction of the model are not sent to the extractor
+    """
     if extractor is None:
         raise ValueError("extractor is None")
     clean_text = clean(text)
     print(f"clean_text {clean_text}")
     sentences = []
     if len(clean_text) >= 256:
-        _sentences = sent_tokenize(clean_text, language=language)
+        _sentences = sentence_segmenter.split(clean_text, language)
         _sentence = ""
 
         for sentence in _sentences:
@@ -57,7 +69,9 @@ def extract_aspects(text: str, language: str = "english", extractor=None) -> Lis
     else:
         sentences.append(clean_text)
     print(f"sentences {sentences}")
-    results = extractor.batch_predict(sentences, pred_sentiment=True, print_result=True, save_to_file=False)
+    results = cached_predict(
+        cache, partial(extractor.batch_predict, pred_sentiment=True, print_result=True, save_to_file=False),
+        sentences, model_name, task)
     return results
 
 
@@ -0,0 +1,65 @@
+"""
+Created by Frantisek Sabol
+Throughput benchmark of the inference backends of the ACOS model (see acos/backends.py) on the reviews
+of data/validation, reports reviews per second and the agreement of the outputs with the pytorch backend.
+Usage (cwd: app/):
+    python -m app.services.analyzer.benchmark_acos_backends --model mt5-acos-1.0 --backends pytorch onnx onnx-int8
+"""
+import argparse
+import pathlib
+import time
+from typing import List
+
+import torch
+
+from .db_analyzer import load_model
+
+VALIDATION_DIR = pathlib.Path(__file__).resolve().parents[5] / "data" / "validation"
+
+
+def read_validation_texts(limit: int = None) -> List[str]:
+    """Inputs of the validation files ("Input: <review>" lines)."""
+    texts = []
+    for path in sorted(VALIDATION_DIR.glob("*.txt")):
+        with open(path, "r", encoding="utf8") as f:
+            texts.extend(line.split(":", 1)[1].strip() for line in f if line.lower().startswith("input:"))
+    return texts[:limit]
+
+
+def run(model, texts: List[str], batch_size: int, task: str) -> List[dict]:
+    results = []
+    for i in range(0, len(texts), batch_size):
+        results.extend(model.batch_predict(batch=texts[i:i + batch_size], task=task, max_length=128))
+    return results
+
+
+def main(args):
+    torch.set_num_threads(args.threads)
+    texts = read_validation_texts(args.limit)
+    print(f"{len(texts)} reviews, batch size {args.batch_size}, {args.threads} threads")
+    reference = None
+    for backend in args.backends:
+        model, _ = load_model(args.task, args.model, backend=backend)
+        # warm up, the first batches include the graph and allocator setup
+        run(model, texts[:args.batch_size], args.batch_size, args.task)
+        start = time.perf_counter()
+        results = run(model, texts, args.batch_size, args.task)
+        elapsed = time.perf_counter() - start
+        outputs = [result["Quadruples"] for result in results]
+        if reference is None:
+            reference = outputs
+        agreement = sum(a == b for a, b in zip(reference, outputs)) / len(outputs)
+        print(f"{backend:>14}: {len(texts) / elapsed:8.2f} reviews/s, "
+              f"{agreement:.1%} outputs equal to {args.backends[0]}")
+        del model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="mt5-acos-1.0")
+    parser.add_argument("--task", type=str, default="joint-acos")
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "pytorch-int8", "onnx", "onnx-int8"])
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=None, help="Number of validation reviews")
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    main(parser.parse_args())
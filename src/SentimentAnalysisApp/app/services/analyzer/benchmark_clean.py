@@ -0,0 +1,66 @@
+"""
+Created by Frantisek Sabol
+Benchmark of the text cleaning (utils.clean and utils.clean_many) on the reviews of data/appid_730_czech.json,
+reports reviews per second and checks the results against the previous implementation of clean (legacy_clean).
+Usage (cwd: app/):
+    python -m app.services.analyzer.benchmark_clean --repeat 20 --batch_size 32
+"""
+import argparse
+import json
+import pathlib
+import re
+import time
+from typing import List, Callable
+
+import emoji
+
+from .utils import clean, clean_many
+
+DATA_PATH = pathlib.Path(__file__).resolve().parents[5] / "data" / "appid_730_czech.json"
+
+
+def legacy_clean(text):
+    """clean before the patterns were precompiled, the reference of the results"""
+    text = re.sub(r'(.)\1{2,}', r'\1', text)
+    text = emoji.replace_emoji(text)
+    emoticon_string = r"(?:[<>]?[:x;=8][\-o\*\']?[\)\]\(\[dDpP\/\:\}\{@\|\\]|[\)\]\(\[dDpP\/\:\}\{@\|\\][\-o\*\']?[:;=8][<>]?|<3)"
+    text = re.sub(emoticon_string, '', text)
+    text = re.sub(r'https?\S+', '', text)
+    text = re.sub(r'\[[^]]*?]', '', text)
+    text = re.sub(r'[^\w\d ().,?!-;\']', '', text)
+    return text
+
+
+def read_reviews(path: pathlib.Path = DATA_PATH) -> List[str]:
+    with open(path, "r", encoding="utf8") as f:
+        return json.load(f)
+
+
+def measure(name: str, clean_batch: Callable[[List[str]], List[str]], texts: List[str], batch_size: int,
+            repeat: int, reference: List[str]):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = []
+        for i in range(0, len(texts), batch_size):
+            results.extend(clean_batch(texts[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+    mismatches = sum(a != b for a, b in zip(results, reference))
+    print(f"{name:>12}: {len(texts) * repeat / elapsed:10.0f} reviews/s, {mismatches} results differ from legacy_clean")
+
+
+def main(args):
+    texts = read_reviews(pathlib.Path(args.data))
+    print(f"{len(texts)} reviews, {args.repeat} repeats, batch size {args.batch_size}")
+    reference = [legacy_clean(text) for text in texts]
+    measure("legacy_clean", lambda batch: [legacy_clean(text) for text in batch], texts, args.batch_size,
+            args.repeat, reference)
+    measure("clean", lambda batch: [clean(text) for text in batch], texts, args.batch_size, args.repeat, reference)
+    measure("clean_many", clean_many, texts, args.batch_size, args.repeat, reference)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, default=str(DATA_PATH), help="JSON list of reviews")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--batch_size", type=int, default=32)
+    main(parser.parse_args())
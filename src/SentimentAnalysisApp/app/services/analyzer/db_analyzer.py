@@ -3,23 +3,29 @@ Created by Frantisek Sabol
 DB connector for analyzer module.
 """
 import asyncio
+import multiprocessing
+import os
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List
+from functools import partial
+from typing import List, NamedTuple, Dict, Optional, Tuple
 import pickle
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .utils import clean
+from .utils import clean_many
+from .segmentation import sentence_segmenter
+from .prediction_cache import PredictionCache, cached_predict, DEFAULT_MAX_ENTRIES
 from app import crud, schemas, models
-from app.db.session import async_session
+from app.db.session import async_session, async_engine
+from app.services.api_cache import invalidate_games
 import tqdm
 import findfile
 from .acos import data_utils
 import argparse
 import pathlib
 import logging
-from nltk import sent_tokenize
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -45,6 +51,213 @@ async def dump_all_analyzed_reviews_to_file(db: AsyncSession):
             f.write(f"{review.id}\t{review.text}\t{aspect_string}")
 
 
+ASPECT_CATEGORIES = ("gameplay", "overall", "other", "audio_visuals", "performance_bugs", "community")
+ASPECT_POLARITIES = ("positive", "negative", "neutral")
+# reviews with longer cleaned text are split into sentences which are analyzed separately
+LONG_REVIEW_LENGTH = 200
+
+
+class ReviewInput(NamedTuple):
+    """Plain copy of the review fields used by the analysis, safe to pass between pipeline stages."""
+    id: int
+    text: str
+    language: str
+    game_id: Optional[int] = None
+
+
+class PreparedBatch(NamedTuple):
+    review_ids: List[int]
+    # review id of every text passed to the model
+    text_review_ids: List[int]
+    texts: List[str]
+    long_reviews_output: Dict[int, schemas.AnalyzedReviewCreate]
+    # sentences of the long reviews in the order of the review
+    sentences: Dict[int, List[str]]
+    # predictions of unchanged sentences of long reviews analyzed before, not passed to the model
+    reused_predictions: Dict[int, Dict[str, str]]
+    # reviews analyzed before by the model, their previous analysis is replaced
+    replaced_review_ids: List[int]
+    # games of the reviews, their cached API responses are invalidated after the batch is stored
+    game_ids: List[int]
+
+
+def load_model(task: str = "joint-acos", model_name: Optional[str] = "mt5-acos-1.0", cache_prefix: bool = False,
+               backend: Optional[str] = None, num_threads: Optional[int] = None, profile: bool = False):
+    """
+    Loads the model of the task.
+    Prompt-free (distilled) checkpoints are recognized from their config (see acos/distill.py).
+    :param cache_prefix: tokenize the instruction once (see ABSAGenerator.encode_inputs)
+    :param backend: inference backend (see acos/backends.py), None for the backend of the model config
+    :param num_threads: number of CPU threads of the model, torch default if None
+    :param profile: log the tokenize/generate/decode times of every batch
+    :return: model and name of the model
+    """
+    if task in ("joint-acos", "joint-aspect-category-sentiment"):
+        from .acos import model as acos_model
+        if model_name is None:
+            model_dir = findfile.find_dir(f"{pathlib.Path(__file__).parent.resolve()}/acos/models", key=["mt5"])
+            model_name = model_dir.rsplit("/", 1)[-1]
+        else:
+            model_dir = findfile.find_dir(f"{pathlib.Path(__file__).parent.resolve()}/acos/models", key=[model_name])
+        if not model_dir:
+            raise ValueError(f"Model {model_name} not found")
+        model = acos_model.ABSAGenerator(model_dir, cache_prefix=cache_prefix, backend=backend,
+                                         num_threads=num_threads, profile_hook=log_batch_profile if profile else None)
+        model.warmup(task)
+        return model, model_name
+    raise ValueError(f"Task {task} not supported")
+
+
+def log_batch_profile(profile):
+    logger.info(f"Batch profile: {profile}")
+
+
+def prepare_batch(reviews: List[ReviewInput], model_name: str, task: str,
+                  previous: Optional[Dict[int, Dict[str, str]]] = None) -> PreparedBatch:
+    """
+    Cleans the texts of the reviews and splits long reviews into sentences.
+    Sentences of long reviews with a prediction in previous are not passed to the model again.
+    :param previous: sentence predictions of reviews analyzed before by the model (see get_previous_analysis)
+    """
+    previous = previous or {}
+    texts = []
+    text_review_ids = []
+    long_reviews_output = {}
+    reused_predictions = {}
+    cleaned_texts = clean_many([review.text for review in reviews])
+    long_reviews = [(review, text) for review, text in zip(reviews, cleaned_texts) if len(text) > LONG_REVIEW_LENGTH]
+    sentences = dict(zip([review.id for review, _ in long_reviews],
+                         sentence_segmenter.split_many([text for _, text in long_reviews],
+                                                       [review.language for review, _ in long_reviews])))
+    for review, text in zip(reviews, cleaned_texts):
+        if review.id in sentences:
+            # create a new AnalyzedReview for the long review, predictions of its sentences are joined later
+            long_reviews_output[review.id] = schemas.AnalyzedReviewCreate(
+                cleaned_text=text,
+                review_id=review.id,
+                model=model_name,
+                task=task,
+                prediction="",
+                created_at=datetime.now()
+            )
+            known = previous.get(review.id, {})
+            reused_predictions[review.id] = {}
+            for sentence in dict.fromkeys(sentences[review.id]):
+                if sentence in known:
+                    reused_predictions[review.id][sentence] = known[sentence]
+                else:
+                    text_review_ids.append(review.id)
+                    texts.append(sentence)
+        else:
+            text_review_ids.append(review.id)
+            texts.append(text)
+    return PreparedBatch([review.id for review in reviews], text_review_ids, texts, long_reviews_output,
+                         sentences, reused_predictions, list(previous.keys()),
+                         sorted({review.game_id for review in reviews if review.game_id is not None}))
+
+
+def add_aspects(aspects_in: List[schemas.AspectCreate], review_id: int, quadruples: List[dict], model_name: str):
+    for aspect in quadruples:
+        if aspect["category"] not in ASPECT_CATEGORIES or aspect["polarity"] not in ASPECT_POLARITIES:
+            continue
+        aspects_in.append(schemas.AspectCreate(
+            review_id=review_id,
+            term=aspect["aspect"],
+            category=aspect["category"],
+            polarity=aspect["polarity"],
+            opinion=aspect["opinion"],
+            model_id=model_name))
+
+
+def build_results(batch: PreparedBatch, results: List[dict], model_name: str, task: str
+                  ) -> Tuple[List[schemas.AnalyzedReviewCreate], List[schemas.AspectCreate],
+                             Dict[int, List[Tuple[str, str]]]]:
+    """
+    Creates analyzed reviews, aspects and sentences of long reviews from the predictions of the model.
+    Predictions of the sentences of a long review are merged in one pass, in the order of the sentences.
+    :return: analyzed reviews, aspects and (sentence, prediction) pairs of the long reviews by review id
+    """
+    analyzed_reviews_in = []
+    aspects_in = []
+    sentence_predictions = {review_id: dict(reused) for review_id, reused in batch.reused_predictions.items()}
+    for review_id, text, result in zip(batch.text_review_ids, batch.texts, results):
+        add_aspects(aspects_in, review_id, result["Quadruples"], model_name)
+        prediction = data_utils.create_task_output_string(task, outputs=result["Quadruples"])
+        if review_id in batch.long_reviews_output:
+            sentence_predictions[review_id][text] = prediction
+            continue
+
+        analyzed_reviews_in.append(schemas.AnalyzedReviewCreate(
+            cleaned_text=result["text"],
+            review_id=review_id,
+            model=model_name,
+            task=task,
+            prediction=prediction,
+            created_at=datetime.now()
+        ))
+
+    # aspects of the reused sentence predictions
+    for review_id, reused in batch.reused_predictions.items():
+        for prediction in reused.values():
+            add_aspects(aspects_in, review_id, data_utils.parse_task_output_string(task, output=prediction),
+                        model_name)
+
+    # add long reviews
+    sentences_in = {}
+    for review_id, long_review_output in batch.long_reviews_output.items():
+        predictions = sentence_predictions[review_id]
+        sentences_in[review_id] = [(sentence, predictions[sentence]) for sentence in batch.sentences[review_id]]
+        long_review_output.prediction = "|".join(prediction for _, prediction in sentences_in[review_id])
+        analyzed_reviews_in.append(long_review_output)
+    return analyzed_reviews_in, aspects_in, sentences_in
+
+
+def dump_results(dump_dir: pathlib.Path, analyzed_reviews_in: List[schemas.AnalyzedReviewCreate],
+                 aspects_in: List[schemas.AspectCreate]):
+    file = dump_dir / f"dumped_analysis_results_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S.%f')}.insert.pkl"
+    with file.open("wb") as f:
+        map = {
+            "analyzed_reviews": analyzed_reviews_in,
+            "aspects": aspects_in
+        }
+        pickle.dump(map, f)
+
+
+def predict_batch(model, batch: PreparedBatch, model_name: str, task: str, max_batch_tokens: int = None,
+                  cache: Optional[PredictionCache] = None) -> List[dict]:
+    """
+    Predicts the texts of the batch, texts with a prediction in the cache are not sent to the model.
+    """
+    if not batch.texts:
+        return []
+    return cached_predict(cache,
+                          partial(predict_texts, model, task=task, max_batch_tokens=max_batch_tokens),
+                          batch.texts, model_name, task)
+
+
+def predict_texts(model, texts: List[str], task: str, max_batch_tokens: int = None) -> List[dict]:
+    return model.batch_predict(batch=texts, task=task, max_length=128, max_batch_tokens=max_batch_tokens)
+
+
+def log_cache_hit_rate(cache: Optional[PredictionCache], hits: int, misses: int):
+    """
+    Logs the hit rate of the cache since its counters were hits and misses.
+    """
+    if cache is None:
+        return
+    hits, misses = cache.hits - hits, cache.misses - misses
+    total = hits + misses
+    logger.info(f"Prediction cache: {hits} hits, {misses} misses ({hits / total if total else 0:.1%} hit rate)")
+
+
+def get_dump_dir(dump: bool) -> Optional[pathlib.Path]:
+    if not dump:
+        return None
+    dump_dir = pathlib.Path("dump")
+    dump_dir.mkdir(parents=True, exist_ok=True)
+    return dump_dir
+
+
 async def analyze_db_reviews(db: AsyncSession, game_id: int = None, task="joint-acos",
                              model_name="mt5-acos-1.0", **kwargs):
     """
@@ -55,26 +268,16 @@ async def analyze_db_reviews(db: AsyncSession, game_id: int = None, task="joint-
     :param game_id: If set, only reviews for this game are analyzed
     :param task: Task to perform. Currently only "joint-acos" is supported
     :param model_name: Name of the model to use. If None, the default model is used
+    :param cache: PredictionCache of the predictions, reviews with a cached prediction are not sent to the model
     """
     batch_size = kwargs.get("batch_size", 100)
-    dump = kwargs.get("dump", False)
-    dump_dir = None
-    if dump:
-        dump_dir = pathlib.Path("dump")
-        dump_dir.mkdir(parents=True, exist_ok=True)
-
-    if task in ("joint-acos", "joint-aspect-category-sentiment"):
-        from .acos import model as acos_model
-        if model_name is None:
-            model_dir = findfile.find_dir(f"{pathlib.Path(__file__).parent.resolve()}/acos/models", key=["mt5"])
-            model_name = model_dir.rsplit("/", 1)[-1]
-        else:
-            model_dir = findfile.find_dir(f"{pathlib.Path(__file__).parent.resolve()}/acos/models", key=[model_name])
-        if not model_dir:
-            raise ValueError(f"Model {model_name} not found")
-        model = acos_model.ABSAGenerator(model_dir)
-    else:
-        raise ValueError(f"Task {task} not supported")
+    max_batch_tokens = kwargs.get("max_batch_tokens")
+    cache = kwargs.get("cache")
+    cache_counters = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    dump_dir = get_dump_dir(kwargs.get("dump", False))
+    model, model_name = load_model(task, model_name, cache_prefix=kwargs.get("cache_prefix", False),
+                                   backend=kwargs.get("backend"), num_threads=kwargs.get("num_threads"),
+                                   profile=kwargs.get("profile", False))
 
     num_reviews_to_process = await crud.review.count_not_processed_reviews(db, game_id=game_id)
     logger.info(f"Found {num_reviews_to_process} reviews to process")
@@ -85,89 +288,269 @@ async def analyze_db_reviews(db: AsyncSession, game_id: int = None, task="joint-
         if len(reviews) == 0:
             continue
         last_id = reviews[-1].id
-        cleaned_texts = [clean(review.text) for review in reviews]
-        # check if long reviews are present and join with respective review id zipped
-        short_reviews = []
-        short_cleaned_texts = []
-        long_reviews_output = {}
-
-        for review, text in zip(reviews, cleaned_texts):
-            if len(text) > 200:
-                # create a new AnalyzedReview for the long review
-                long_reviews_output[review.id] = schemas.AnalyzedReviewCreate(
-                    cleaned_text=text,
-                    review_id=review.id,
-                    model=model_name,
-                    task=task,
-                    prediction="",
-                    created_at=datetime.now()
-                )
-                sentences = sent_tokenize(text, language=review.language)
-                # create an object to store review sentences and their respective review id so they can be joined later
-                for sentence in sentences:
-                    short_reviews.append(review)
-                    short_cleaned_texts.append(sentence)
-            else:
-                short_reviews.append(review)
-                short_cleaned_texts.append(text)
+        previous = await crud.analyzer.get_previous_analysis(db, review_ids=[review.id for review in reviews],
+                                                             model=model_name, task=task)
+        batch = prepare_batch([ReviewInput(review.id, review.text, review.language, review.game_id) for review in reviews],
+                              model_name, task, previous)
 
         try:
-            results = model.batch_predict(batch=short_cleaned_texts, task=task, max_length=128)
+            results = predict_batch(model, batch, model_name, task, max_batch_tokens, cache)
         except Exception as e:
             logger.error(f"Error while processing batch: {e}")
             continue
 
         # strore results in database
-        analyzed_reviews_in = []
-        aspects_in = []
-        for review, result in zip(short_reviews, results):
-            for aspect in result["Quadruples"]:
-                if aspect["category"] not in ("gameplay", "overall", "other", "audio_visuals", "performance_bugs",
-                                              "community") \
-                        or aspect["polarity"] not in ("positive", "negative", "neutral"):
-                    continue
-                aspect_in = schemas.AspectCreate(
-                    review_id=review.id,
-                    term=aspect["aspect"],
-                    category=aspect["category"],
-                    polarity=aspect["polarity"],
-                    opinion=aspect["opinion"],
-                    model_id=model_name)
-                aspects_in.append(aspect_in)
-
-            prediction = data_utils.create_task_output_string(task, outputs=result["Quadruples"])
-            if review.id in long_reviews_output:
-                long_reviews_output[review.id].prediction = "|".join(
-                    [long_reviews_output[review.id].prediction, prediction])
+        analyzed_reviews_in, aspects_in, sentences_in = build_results(batch, results, model_name, task)
+        if dump_dir is None:
+            await crud.analyzer.store_analysis(db, review_ids=batch.review_ids,
+                                               analyzed_reviews_in=analyzed_reviews_in,
+                                               aspects_in=aspects_in, sentences_in=sentences_in,
+                                               replace_review_ids=batch.replaced_review_ids)
+        else:
+            await crud.analyzer.store_analysis(db, review_ids=batch.review_ids,
+                                               analyzed_reviews_in=[], aspects_in=[])
+            dump_results(dump_dir, analyzed_reviews_in, aspects_in)
+        await invalidate_games(batch.game_ids)
+    log_cache_hit_rate(cache, *cache_counters)
+
+
+async def analyze_db_reviews_pipelined(sessionmaker, game_id: int = None, task="joint-acos",
+                                       model_name="mt5-acos-1.0", model=None, batch_size: int = 100,
+                                       dump: bool = False, queue_size: int = 2, max_batch_tokens: int = None,
+                                       cache: Optional[PredictionCache] = None, cache_prefix: bool = False,
+                                       backend: Optional[str] = None, num_threads: Optional[int] = None,
+                                       profile: bool = False):
+    """
+    Pipelined analyze_db_reviews, the stages run concurrently and are connected by bounded queues:
+    fetch (next batch from the database) -> prepare (cleaning and sentence splitting, thread pool)
+    -> inference (model thread) -> write (one transaction per batch).
+    The model works on a batch while the next one is fetched and prepared and the previous one is written,
+    so inference does not wait for the database. Inference releases the GIL, the other stages keep running.
+    :param sessionmaker: Session factory, the fetch and write stages use their own sessions
+    :param game_id: If set, only reviews for this game are analyzed
+    :param task: Task to perform. Currently only "joint-acos" is supported
+    :param model_name: Name of the model to use. If None, the default model is used
+    :param model: Loaded model of the task, loaded from model_name if None (reuse it when analyzing many games)
+    :param batch_size: Number of reviews in one batch
+    :param dump: Dump the results to files instead of the database
+    :param queue_size: Max number of batches waiting between two stages
+    :param max_batch_tokens: Token budget of the length bucketed model batches (see ABSAGenerator.batch_predict)
+    :param cache: PredictionCache of the predictions, used by the inference stage
+    :param cache_prefix: tokenize the instruction once, used if the model is loaded from model_name (see load_model)
+    :param backend: inference backend of the model loaded from model_name
+    :param num_threads: number of CPU threads of the model loaded from model_name
+    :param profile: log the tokenize/generate/decode times of every batch of the model loaded from model_name
+    """
+    dump_dir = get_dump_dir(dump)
+    cache_counters = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    if model is None:
+        model, model_name = load_model(task, model_name, cache_prefix=cache_prefix, backend=backend,
+                                       num_threads=num_threads, profile=profile)
+
+    async with sessionmaker() as db:
+        num_reviews_to_process = await crud.review.count_not_processed_reviews(db, game_id=game_id)
+    logger.info(f"Found {num_reviews_to_process} reviews to process")
+    progress = tqdm.tqdm(total=num_reviews_to_process, desc="Analyzing reviews")
+
+    loop = asyncio.get_running_loop()
+    inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analyzer-inference")
+    fetched = asyncio.Queue(maxsize=queue_size)
+    prepared = asyncio.Queue(maxsize=queue_size)
+    predicted = asyncio.Queue(maxsize=queue_size)
+
+    async def fetch():
+        async with sessionmaker() as db:
+            last_id = None
+            while True:
+                reviews = await crud.review.get_not_processed_by_game(db, limit=batch_size, game_id=game_id,
+                                                                      last_id=last_id)
+                if len(reviews) == 0:
+                    break
+                last_id = reviews[-1].id
+                previous = await crud.analyzer.get_previous_analysis(
+                    db, review_ids=[review.id for review in reviews], model=model_name, task=task)
+                await fetched.put(([ReviewInput(review.id, review.text, review.language, review.game_id) for review in reviews],
+                                   previous))
+                db.expunge_all()
+        await fetched.put(None)
+
+    async def prepare():
+        while (item := await fetched.get()) is not None:
+            reviews, previous = item
+            await prepared.put(await loop.run_in_executor(None, prepare_batch, reviews, model_name, task, previous))
+        await prepared.put(None)
+
+    async def infer():
+        while (batch := await prepared.get()) is not None:
+            try:
+                results = await loop.run_in_executor(
+                    inference_executor, predict_batch, model, batch, model_name, task, max_batch_tokens, cache)
+            except Exception as e:
+                logger.error(f"Error while processing batch: {e}")
                 continue
+            await predicted.put((batch, results))
+        await predicted.put(None)
 
-            analyzed_review_in = schemas.AnalyzedReviewCreate(
-                cleaned_text=result["text"],
-                review_id=review.id,
-                model=model_name,
-                task=task,
-                prediction=prediction,
-                created_at=datetime.now()
-            )
-            analyzed_reviews_in.append(analyzed_review_in)
+    async def write():
+        async with sessionmaker() as db:
+            while (item := await predicted.get()) is not None:
+                batch, results = item
+                analyzed_reviews_in, aspects_in, sentences_in = build_results(batch, results, model_name, task)
+                if dump_dir is None:
+                    await crud.analyzer.store_analysis(db, review_ids=batch.review_ids,
+                                                       analyzed_reviews_in=analyzed_reviews_in,
+                                                       aspects_in=aspects_in, sentences_in=sentences_in,
+                                                       replace_review_ids=batch.replaced_review_ids)
+                else:
+                    await crud.analyzer.store_analysis(db, review_ids=batch.review_ids,
+                                                       analyzed_reviews_in=[], aspects_in=[])
+                    dump_results(dump_dir, analyzed_reviews_in, aspects_in)
+                await invalidate_games(batch.game_ids)
+                db.expunge_all()
+                progress.update(len(batch.review_ids))
 
-        # add long reviews to database
-        for analyzed_review_in in long_reviews_output.values():
-            analyzed_reviews_in.append(analyzed_review_in)
+    tasks = [asyncio.create_task(stage()) for stage in (fetch, prepare, infer, write)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # a failed stage stops the pipeline
+        for task_ in tasks:
+            task_.cancel()
+        inference_executor.shutdown(wait=False)
+        progress.close()
+        log_cache_hit_rate(cache, *cache_counters)
 
-        await crud.review.update_multi(
-            db, db_objs=reviews, objs_in=[schemas.ReviewUpdate(processed_at=datetime.now())] * len(reviews))
-        if not dump:
-            await crud.aspect.create_multi(db, objs_in=aspects_in)
-            await crud.analyzed_review.create_multi(db, objs_in=analyzed_reviews_in)
-        else:
-            file = dump_dir / f"dumped_analysis_results_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S.%f')}.insert.pkl"
-            with file.open("wb") as f:
-                map = {
-                    "analyzed_reviews": analyzed_reviews_in,
-                    "aspects": aspects_in
-                }
-                pickle.dump(map, f)
+
+async def analyze_claimed_reviews(sessionmaker, model, model_name: str, task="joint-acos", game_id: int = None,
+                                  batch_size: int = 100, dump: bool = False, max_batch_tokens: int = None,
+                                  cache: Optional[PredictionCache] = None) -> int:
+    """
+    Analyzes unprocessed reviews until none are left, batches are claimed with
+    crud.analyzer.claim_unprocessed_reviews (FOR UPDATE SKIP LOCKED) and stay locked until their results are
+    committed, so any number of workers (processes or hosts) can run at once without analyzing a review twice.
+    Reviews of a batch the model fails on are released and not claimed again by this worker.
+    :param sessionmaker: Session factory, every batch is claimed and stored in its own transaction
+    :param model: Loaded model of the task
+    :param game_id: If set, only reviews for this game are analyzed
+    :param cache: PredictionCache of the predictions
+    :return: number of analyzed reviews
+    """
+    dump_dir = get_dump_dir(dump)
+    cache_counters = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    failed_ids = set()
+    num_analyzed = 0
+    while True:
+        async with sessionmaker() as db:
+            reviews = await crud.analyzer.claim_unprocessed_reviews(db, limit=batch_size, game_id=game_id,
+                                                                    exclude_ids=failed_ids)
+            if len(reviews) == 0:
+                break
+            previous = await crud.analyzer.get_previous_analysis(
+                db, review_ids=[review.id for review in reviews], model=model_name, task=task)
+            batch = prepare_batch([ReviewInput(review.id, review.text, review.language, review.game_id) for review in reviews],
+                                  model_name, task, previous)
+            try:
+                results = predict_batch(model, batch, model_name, task, max_batch_tokens, cache)
+            except Exception as e:
+                logger.error(f"Error while processing batch: {e}")
+                failed_ids.update(batch.review_ids)
+                await db.rollback()
+                continue
+
+            analyzed_reviews_in, aspects_in, sentences_in = build_results(batch, results, model_name, task)
+            if dump_dir is None:
+                await crud.analyzer.store_analysis(db, review_ids=batch.review_ids,
+                                                   analyzed_reviews_in=analyzed_reviews_in, aspects_in=aspects_in,
+                                                   sentences_in=sentences_in,
+                                                   replace_review_ids=batch.replaced_review_ids)
+            else:
+                await crud.analyzer.store_analysis(db, review_ids=batch.review_ids,
+                                                   analyzed_reviews_in=[], aspects_in=[])
+                dump_results(dump_dir, analyzed_reviews_in, aspects_in)
+            await invalidate_games(batch.game_ids)
+            num_analyzed += len(batch.review_ids)
+    log_cache_hit_rate(cache, *cache_counters)
+    return num_analyzed
+
+
+def split_cores(num_workers: int, cores: Optional[List[int]] = None) -> List[List[int]]:
+    """
+    Splits cores into num_workers disjoint subsets of nearly equal size.
+    :param cores: cores to split, cores available to the process if None
+    """
+    if cores is None:
+        cores = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else range(os.cpu_count() or 1)
+    cores = sorted(cores)
+    if not 0 < num_workers <= len(cores):
+        raise ValueError(f"Number of workers must be between 1 and the number of cores ({len(cores)})")
+    size, remainder = divmod(len(cores), num_workers)
+    subsets = []
+    start = 0
+    for i in range(num_workers):
+        end = start + size + (1 if i < remainder else 0)
+        subsets.append(cores[start:end])
+        start = end
+    return subsets
+
+
+def analyzer_worker(worker_id: int, cores: List[int], task: str, model_name: str, game_id: Optional[int],
+                    batch_size: int, dump: bool, max_batch_tokens: Optional[int], cache_prefix: bool,
+                    backend: Optional[str], cache_path: Optional[str] = None, profile: bool = False,
+                    cache_max_entries: int = DEFAULT_MAX_ENTRIES):
+    """
+    Entry point of a worker process of analyze_db_reviews_workers, pinned to the cores, with its own model
+    and database connections.
+    """
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    os.environ["OMP_NUM_THREADS"] = str(len(cores))
+    model, model_name = load_model(task, model_name, cache_prefix=cache_prefix, backend=backend,
+                                   num_threads=len(cores), profile=profile)
+    cache = PredictionCache(cache_path, max_entries=cache_max_entries) if cache_path else None
+
+    async def run():
+        try:
+            return await analyze_claimed_reviews(async_session, model, model_name, task=task, game_id=game_id,
+                                                 batch_size=batch_size, dump=dump,
+                                                 max_batch_tokens=max_batch_tokens, cache=cache)
+        finally:
+            await async_engine.dispose()
+            if cache is not None:
+                cache.close()
+
+    num_analyzed = asyncio.run(run())
+    logger.info(f"Worker {worker_id} (cores {cores}) analyzed {num_analyzed} reviews")
+
+
+def analyze_db_reviews_workers(num_workers: int, game_id: int = None, task="joint-acos",
+                               model_name="mt5-acos-1.0", batch_size: int = 100, dump: bool = False,
+                               max_batch_tokens: int = None, cache_prefix: bool = False, backend: str = None,
+                               cores: Optional[List[int]] = None, cache_path: Optional[str] = None,
+                               profile: bool = False, cache_max_entries: int = DEFAULT_MAX_ENTRIES):
+    """
+    Analyzes unprocessed reviews with num_workers processes, each pinned to its own subset of the cores
+    with its own model (see analyze_claimed_reviews). Workers on other hosts can drain the same database.
+    Blocks until all workers finish.
+    :param num_workers: Number of worker processes
+    :param game_id: If set, only reviews for this game are analyzed, all unprocessed reviews otherwise
+    :param cores: cores split between the workers, cores available to the process if None
+    :param cache_path: path of the PredictionCache database shared by the workers, no cache if None
+    :param cache_max_entries: max number of cached predictions, least recently used are evicted
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=analyzer_worker, name=f"analyzer-worker-{i}",
+                        args=(i, worker_cores, task, model_name, game_id, batch_size, dump, max_batch_tokens,
+                              cache_prefix, backend, cache_path, profile, cache_max_entries))
+        for i, worker_cores in enumerate(split_cores(num_workers, cores))
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    failed = [process.name for process in processes if process.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"Analyzer workers failed: {', '.join(failed)}")
 
 
 async def insert_from_dumped_file(sessionmaker: AsyncSession, file: pathlib.Path = None):
@@ -186,25 +569,71 @@ async def insert_from_dumped_file(sessionmaker: AsyncSession, file: pathlib.Path
             async with sessionmaker() as db:
                 tasks.append(crud.analyzed_review.create_multi(db, objs_in=map["analyzed_reviews"]))
             await asyncio.gather(*tasks)
+            async with sessionmaker() as db:
+                review_ids = {}
+                for aspect in map["aspects"]:
+                    review_ids.setdefault(aspect.model_id, set()).add(aspect.review_id)
+                for model_id, ids in review_ids.items():
+                    await crud.game_stats.add_reviews(db, review_ids=ids, model_id=model_id)
+                    await crud.review_stats.add_reviews(db, review_ids=ids, model_id=model_id)
+                await db.commit()
+            # games of the dumped aspects are not known
+            await invalidate_games()
             file.unlink()
         time.sleep(10)
 
 
 async def main(args):
-    if args.analyze:
+    cache = None
+    if args.prediction_cache and args.analyze and not args.workers:
+        cache = PredictionCache(args.prediction_cache, max_entries=args.prediction_cache_max_entries)
+    try:
+        await run(args, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+async def run(args, cache: Optional[PredictionCache] = None):
+    if args.analyze and args.workers:
+        if args.game_id is None and not args.all:
+            raise ValueError("game_id must be specified or use all to analyze all reviews")
+        await asyncio.get_running_loop().run_in_executor(None, partial(
+            analyze_db_reviews_workers, args.workers, game_id=args.game_id, task=args.task, model_name=args.model,
+            batch_size=args.batch_size, dump=args.dump, max_batch_tokens=args.max_batch_tokens,
+            cache_prefix=args.cache_prefix, backend=args.backend, cache_path=args.prediction_cache,
+            profile=args.profile, cache_max_entries=args.prediction_cache_max_entries))
+    elif args.analyze and args.pipelined:
+        model, model_name = load_model(args.task, args.model, cache_prefix=args.cache_prefix,
+                                       backend=args.backend, num_threads=args.threads, profile=args.profile)
+        game_ids = [args.game_id]
+        if args.all:
+            async with async_session() as db:
+                game_ids = [game.id for game in await crud.analyzer.get_games_with_unprocessed_reviews(db, limit=100)]
+        elif args.game_id is None:
+            raise ValueError("game_id must be specified or use all to analyze all reviews")
+        for game_id in game_ids:
+            await analyze_db_reviews_pipelined(async_session, game_id=game_id, task=args.task, model_name=model_name,
+                                               model=model, batch_size=args.batch_size, dump=args.dump,
+                                               queue_size=args.queue_size, max_batch_tokens=args.max_batch_tokens,
+                                               cache=cache)
+    elif args.analyze:
         async with async_session() as db:
             if args.all:
                 games = await crud.analyzer.get_games_with_unprocessed_reviews(db, limit=100)
                 for game in games:
                     await analyze_db_reviews(db, game_id=game.id, task=args.task, model_name=args.model,
-                                             batch_size=args.batch_size,
-                                             dump=args.dump)
+                                             batch_size=args.batch_size, dump=args.dump,
+                                             max_batch_tokens=args.max_batch_tokens, cache_prefix=args.cache_prefix,
+                                             backend=args.backend, cache=cache, num_threads=args.threads,
+                                             profile=args.profile)
             else:
                 if args.game_id is None:
                     raise ValueError("game_id must be specified or use all to analyze all reviews")
                 await analyze_db_reviews(
                     db, game_id=args.game_id, task=args.task, model_name=args.model, batch_size=args.batch_size,
-                    dump=args.dump)
+                    dump=args.dump, max_batch_tokens=args.max_batch_tokens, cache_prefix=args.cache_prefix,
+                    backend=args.backend, cache=cache, num_threads=args.threads, profile=args.profile)
     elif args.insert:
         await insert_from_dumped_file(sessionmaker=async_session)
     print("Done...")
@@ -221,6 +650,30 @@ if __name__ == "__main__":
     argparse.add_argument("--model", type=str, default="mt5-acos-1.0")
     argparse.add_argument("--batch_size", type=int, default=32)
     argparse.add_argument("--all", action="store_true", help="Analyze all games that have unprocessed reviews")
+    argparse.add_argument("--max_batch_tokens", type=int, default=None,
+                          help="Split batches into buckets of inputs of similar length, padded to at most this many "
+                               "tokens each, instead of padding the whole batch to its longest input")
+    argparse.add_argument("--pipelined", action="store_true",
+                          help="Fetch, prepare, analyze and store batches concurrently (model never waits for the db)")
+    argparse.add_argument("--queue_size", type=int, default=2,
+                          help="Max number of batches waiting between two stages of the pipeline")
+    argparse.add_argument("--cache_prefix", action="store_true",
+                          help="Tokenize the few-shot instruction once and only the reviews of each batch")
+    argparse.add_argument("--backend", type=str, default=None,
+                          choices=("pytorch", "pytorch-int8", "onnx", "onnx-int8"),
+                          help="Inference backend of the model, the backend of the model config by default")
+    argparse.add_argument("--workers", type=int, default=None,
+                          help="Analyze with this many processes, each pinned to a subset of the cores, "
+                               "reviews are claimed with row locks so several hosts can run at once")
+    argparse.add_argument("--prediction_cache", type=str, default=None,
+                          help="Path of the SQLite cache of predictions, reviews with the same cleaned text "
+                               "are sent to the model once")
+    argparse.add_argument("--prediction_cache_max_entries", type=int, default=1_000_000,
+                          help="Max number of cached predictions, least recently used are evicted")
+    argparse.add_argument("--threads", type=int, default=None,
+                          help="Number of CPU threads of the model (per worker with --workers: cores of the worker)")
+    argparse.add_argument("--profile", action="store_true",
+                          help="Log the tokenize, generate and decode times of every model batch")
     args = argparse.parse_args()
 
     loop = asyncio.get_event_loop()
@@ -0,0 +1,156 @@
+"""
+Created by Frantisek Sabol
+Persistent cache of model predictions backed by SQLite.
+Predictions are stored under (model, task, sha256 of the cleaned text), repeated reviews ("10/10", "good game",
+copy-pasted memes) are predicted once. The cache is bounded by the number of predictions,
+least recently used predictions are evicted first.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional, List, Dict, Callable, Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS prediction (
+    model TEXT NOT NULL,
+    task TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    result TEXT NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (model, task, text_hash)
+)
+"""
+CREATE_INDEX = "CREATE INDEX IF NOT EXISTS ix_prediction_accessed_at ON prediction (accessed_at)"
+
+# max number of variables of a SQLite statement is 999 in older versions
+QUERY_CHUNK_SIZE = 900
+
+
+def _to_json(obj: Any):
+    # numpy arrays and scalars of pyabsa results
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class PredictionCache:
+    """
+    Count bounded LRU cache of predictions stored in a SQLite database.
+    All operations are synchronous, they are short compared to the inference they replace.
+    The database can be shared by processes of one host (WAL journal).
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        :param path: path of the SQLite database file, created if it does not exist
+        :param max_entries: max number of stored predictions
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(CREATE_TABLE)
+        self.connection.execute(CREATE_INDEX)
+        # upper bound of the number of predictions, recounted on eviction (replaced rows and other processes)
+        self.size = len(self)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get_many(self, model: str, task: str, texts: List[str]) -> Dict[int, dict]:
+        """
+        :return: cached predictions by index of the text in texts
+        """
+        hashes = [self.text_hash(text) for text in texts]
+        found = {}
+        unique = list(set(hashes))
+        for i in range(0, len(unique), QUERY_CHUNK_SIZE):
+            chunk = unique[i:i + QUERY_CHUNK_SIZE]
+            rows = self.connection.execute(
+                f"SELECT text_hash, result FROM prediction WHERE model = ? AND task = ? "
+                f"AND text_hash IN ({', '.join('?' * len(chunk))})", (model, task, *chunk)).fetchall()
+            found.update(rows)
+        if found:
+            now = time.time()
+            self.connection.executemany("UPDATE prediction SET accessed_at = ? WHERE model = ? AND task = ? "
+                                        "AND text_hash = ?", [(now, model, task, h) for h in found])
+        return {i: json.loads(found[h]) for i, h in enumerate(hashes) if h in found}
+
+    def put_many(self, model: str, task: str, texts: List[str], results: List[dict]):
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO prediction (model, task, text_hash, result, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            [(model, task, self.text_hash(text), json.dumps(result, default=_to_json, ensure_ascii=False), now)
+             for text, result in zip(texts, results)])
+        self.size += len(texts)
+        if self.size > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """Deletes least recently used predictions until the cache fits into max_entries."""
+        self.size = len(self)
+        excess = self.size - self.max_entries
+        if excess <= 0:
+            return
+        self.connection.execute("DELETE FROM prediction WHERE rowid IN "
+                                "(SELECT rowid FROM prediction ORDER BY accessed_at LIMIT ?)", (excess,))
+        self.size -= excess
+        logger.debug(f"prediction cache: evicted {excess} predictions")
+
+    def clear(self):
+        self.connection.execute("DELETE FROM prediction")
+        self.size = 0
+
+    def close(self):
+        logger.info(f"prediction cache: {self.hits} hits, {self.misses} misses ({self.hit_rate:.1%} hit rate)")
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT count(*) FROM prediction").fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate, "predictions": len(self)}
+
+
+def cached_predict(cache: Optional[PredictionCache], predict: Callable[[List[str]], List[dict]],
+                   texts: List[str], model: str, task: str) -> List[dict]:
+    """
+    Resolves predictions of the texts from the cache and predicts only the misses (each distinct text once),
+    predicted results are stored in the cache.
+    :param cache: prediction cache, all texts are predicted if None
+    :param predict: predicts a list of texts, returns the results in the order of the texts
+    :return: results in the order of the texts
+    """
+    if cache is None:
+        return predict(texts)
+    results = cache.get_many(model, task, texts)
+    # duplicates within the batch are predicted once
+    missing = list(dict.fromkeys(text for i, text in enumerate(texts) if i not in results))
+    # texts not sent to the model are hits
+    cache.hits += len(texts) - len(missing)
+    cache.misses += len(missing)
+    if missing:
+        predicted = dict(zip(missing, predict(missing)))
+        cache.put_many(model, task, missing, [predicted[text] for text in missing])
+        for i, text in enumerate(texts):
+            if i not in results:
+                results[i] = predicted[text]
+    return [results[i] for i in range(len(texts))]
@@ -0,0 +1,96 @@
+"""
+Created by Frantisek Sabol
+Sentence segmentation of long reviews.
+Punkt models of NLTK are loaded once per language and kept in memory. Languages without a Punkt model
+(e.g. "slovak", "schinese", "brazilian" of Steam) and missing NLTK data use a rule-based segmenter,
+which splits after ".", "!" or "?" followed by whitespace and an uppercase letter, digit or an opening quote/bracket.
+"""
+import logging
+import re
+from typing import List, Dict, Optional, Callable, Iterable
+
+import nltk
+
+logger = logging.getLogger(__name__)
+
+# ISO 639-1 codes of the languages with a Punkt model
+LANGUAGE_CODES = {
+    "cs": "czech", "da": "danish", "nl": "dutch", "en": "english", "et": "estonian", "fi": "finnish",
+    "fr": "french", "de": "german", "el": "greek", "it": "italian", "ml": "malayalam", "no": "norwegian",
+    "pl": "polish", "pt": "portuguese", "ru": "russian", "sl": "slovene", "es": "spanish", "sv": "swedish",
+    "tr": "turkish"
+}
+
+# uppercase letters of the Latin, Greek and Cyrillic scripts
+UPPERCASE = "".join(c for c in map(chr, range(0x530)) if c.isupper())
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]*[" + re.escape(UPPERCASE) + r"\d])")
+
+
+def split_sentences_by_rules(text: str) -> List[str]:
+    """Rule-based segmentation, used for languages without a Punkt model."""
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+
+
+def load_punkt(language: str):
+    """
+    :return: Punkt tokenizer of the language
+    :raises LookupError: if the language has no Punkt model or the NLTK data are not installed
+    """
+    try:
+        # nltk >= 3.8.2 (punkt_tab data)
+        from nltk.tokenize import PunktTokenizer
+    except ImportError:
+        return nltk.data.load(f"tokenizers/punkt/{language}.pickle")
+    try:
+        return PunktTokenizer(language)
+    except (OSError, ValueError) as e:
+        raise LookupError(str(e)) from e
+
+
+class SentenceSegmenter:
+    """
+    Sentence segmenters by language, Punkt models are loaded on the first use of the language.
+    Results are the same as of nltk.sent_tokenize for the languages with a Punkt model.
+    """
+
+    def __init__(self):
+        self.segmenters: Dict[str, Callable[[str], List[str]]] = {}
+
+    def get(self, language: Optional[str]) -> Callable[[str], List[str]]:
+        """
+        :param language: name ("czech") or ISO 639-1 code ("cs") of the language
+        :return: function splitting a text into sentences
+        """
+        language = (language or "").lower()
+        language = LANGUAGE_CODES.get(language, language)
+        segmenter = self.segmenters.get(language)
+        if segmenter is None:
+            try:
+                segmenter = load_punkt(language).tokenize if language else split_sentences_by_rules
+            except LookupError:
+                logger.info(f"No Punkt model for language '{language}', using rule-based sentence segmentation")
+                segmenter = split_sentences_by_rules
+            self.segmenters[language] = segmenter
+        return segmenter
+
+    def split(self, text: str, language: Optional[str]) -> List[str]:
+        return self.get(language)(text)
+
+    def split_many(self, texts: List[str], languages: Iterable[Optional[str]]) -> List[List[str]]:
+        """
+        Splits a batch of texts, the segmenter is resolved once per language of the batch.
+        :param languages: language of each text
+        :return: sentences of each text in the order of texts
+        """
+        results = [[] for _ in texts]
+        by_language = {}
+        for i, language in enumerate(languages):
+            by_language.setdefault(language, []).append(i)
+        for language, indices in by_language.items():
+            segment = self.get(language)
+            for i in indices:
+                results[i] = segment(texts[i])
+        return results
+
+
+sentence_segmenter = SentenceSegmenter()
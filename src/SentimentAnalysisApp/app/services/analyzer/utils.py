@@ -3,6 +3,8 @@ Created by Frantisek Sabol
 Utility for text cleaning.
 """
 import re
+from typing import List
+
 import emoji
 import locale
 
@@ -36,24 +38,82 @@ def replace_price_with_placeholder(text):
     return text
 
 
+# patterns of clean, applied in this order (a pass can create a match of a later pass)
+REPEATED_CHARACTERS = re.compile(r'(.)\1{2,}')
+EMOTICONS = re.compile(r"(?:[<>]?[:x;=8][\-o\*\']?[\)\]\(\[dDpP\/\:\}\{@\|\\]|[\)\]\(\[dDpP\/\:\}\{@\|\\][\-o\*\']?[:;=8][<>]?|<3)")
+LINKS = re.compile(r'https?\S+')
+FORMATTING = re.compile(r'\[[^]]*?]')
+# characters removed by clean, "!-;" is the range of ASCII characters from "!" to ";" (includes digits, "/", ":")
+NOT_ALLOWED = re.compile(r'[^\w\d ().,?!-;\']')
+# every emoji contains at least one of these (non ASCII) characters, emoji.replace_emoji does not change other texts
+EMOJI_CHARACTERS = frozenset(c for e in emoji.EMOJI_DATA for c in e if not c.isascii())
+
+# clean_many joins the texts with SEPARATOR, the batch patterns do not match across it
+SEPARATOR = "\x00"
+BATCH_LINKS = re.compile(r'https?[^\s\x00]+')
+BATCH_FORMATTING = re.compile(r'\[[^]\x00]*?]')
+
+
+class AllowedCharacters(dict):
+    """
+    Translation table of str.translate removing the characters matched by NOT_ALLOWED,
+    the pattern is evaluated once per distinct character.
+    """
+
+    def __missing__(self, char):
+        allowed = self[char] = None if NOT_ALLOWED.match(chr(char)) else char
+        return allowed
+
+
+ALLOWED_CHARACTERS = AllowedCharacters()
+
+
+def remove_emoji(text):
+    """ Remove graphical emoji, texts without emoji characters are not tokenized by emoji """
+    if text.isascii() or EMOJI_CHARACTERS.isdisjoint(text):
+        return text
+    return emoji.replace_emoji(text)
+
+
 def clean(text):
     """
     Removes unnecessary whitespaces, characters, emoticons, non ASCII characters, punctuation, normalizes to lowercase.
     :param text: string to clean
     :return: cleaned string
     """
-    text = re.sub(r'(.)\1{2,}', r'\1', text)
+    text = REPEATED_CHARACTERS.sub(r'\1', text)
     # remove graphical emoji
-    text = emoji.replace_emoji(text)
+    text = remove_emoji(text)
     # remove textual emoji
-    emoticon_string = r"(?:[<>]?[:x;=8][\-o\*\']?[\)\]\(\[dDpP\/\:\}\{@\|\\]|[\)\]\(\[dDpP\/\:\}\{@\|\\][\-o\*\']?[:;=8][<>]?|<3)"
-    text = re.sub(emoticon_string, '', text)
+    text = EMOTICONS.sub('', text)
     # remove links
-    text = re.sub(r'https?\S+', '', text)
+    if "http" in text:
+        text = LINKS.sub('', text)
     # remove formatting
     # input: [h1] lorem ipsum [\h1]
     # output: lorem ipsum
-    text = re.sub(r'\[[^]]*?]', '', text)
+    if "[" in text:
+        text = FORMATTING.sub('', text)
     # remove non alphanumeric characters except for some punctuation
-    text = re.sub(r'[^\w\d ().,?!-;\']', '', text)
-    return text
+    return text.translate(ALLOWED_CHARACTERS)
+
+
+def clean_many(texts: List[str]) -> List[str]:
+    """
+    Cleans a batch of texts, same results as clean of each text.
+    Repeated characters and emoji are removed from each text, the texts are joined and the other patterns
+    run once over the whole batch.
+    :param texts: strings to clean
+    :return: cleaned strings in the order of texts
+    """
+    if not texts:
+        return []
+    if any(SEPARATOR in text for text in texts):
+        return [clean(text) for text in texts]
+    text = SEPARATOR.join(remove_emoji(REPEATED_CHARACTERS.sub(r'\1', text)) for text in texts)
+    text = EMOTICONS.sub('', text)
+    if "http" in text:
+        text = BATCH_LINKS.sub('', text)
+    if "[" in text:
+        text = BATCH_FORMATTING.sub('', text)
+    return [cleaned.translate(ALLOWED_CHARACTERS) for cleaned in text.split(SEPARATOR)]
@@ -0,0 +1,248 @@
+"""
+Created by Frantisek Sabol
+Cache of the JSON responses of the read-heavy API endpoints (summaries, wordcloud, search).
+Responses are stored under a digest of the path and sorted query of the request and the versions of their scope,
+a game or all games. Writers (analyzer, scraper) invalidate games by incrementing their versions and the version
+of all games, entries of older versions are not read again and expire after ttl seconds.
+Backends:
+    "redis://host:port/db" - Redis shared by the API processes, the analyzer and the scraper (requires redis)
+    "memory://" - in-process LRU cache, invalidations of other processes are not seen, entries expire after ttl
+The cache is disabled by default (empty RESPONSE_CACHE_URL), only the Redis backend is invalidated on commit.
+Responses carry an ETag of their body, requests with a matching If-None-Match get 304 Not Modified.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, NamedTuple, List, Iterable, Callable, Awaitable, Any, Dict, Tuple
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 600.0
+DEFAULT_MAX_ENTRIES = 10_000
+KEY_PREFIX = "api-cache"
+# scope of the responses which do not belong to a game (search, game list)
+ALL_GAMES = "all"
+
+
+class MemoryBackend:
+    """
+    In-process LRU cache of the entries with expiration. Versions are kept apart from the entries
+    and are never evicted.
+    """
+    shared = False
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.counters: Dict[str, int] = {}
+
+    async def get_versions(self, keys: List[str]) -> List[int]:
+        return [self.counters.get(key, 0) for key in keys]
+
+    async def incr(self, key: str) -> int:
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class RedisBackend:
+    """
+    Entries in Redis (or any client with the API of redis.asyncio.Redis, e.g. fakeredis), shared by processes.
+    Entries expire in Redis, versions are plain counters.
+    """
+    shared = True
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        # optional dependency, needed only with the redis backend
+        import redis.asyncio
+        return cls(redis.asyncio.from_url(url))
+
+    async def get_versions(self, keys: List[str]) -> List[int]:
+        return [int(value or 0) for value in await self.client.mget(keys)]
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(key, value, px=int(ttl * 1000))
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class ResponseCache:
+    """
+    Versioned cache of response bodies, see the module docstring.
+    """
+
+    def __init__(self, backend, ttl: float = DEFAULT_TTL, prefix: str = KEY_PREFIX):
+        """
+        :param backend: MemoryBackend or RedisBackend
+        :param ttl: seconds an entry is served, bounds the staleness when an invalidation is missed
+        :param prefix: prefix of the keys of the backend
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @property
+    def shared(self) -> bool:
+        """Whether invalidations reach the other processes."""
+        return self.backend.shared
+
+    @staticmethod
+    def etag(body: bytes) -> str:
+        return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+    def _version_key(self, scope: str) -> str:
+        return f"{self.prefix}:version:{scope}"
+
+    async def _entry_key(self, key: str, game_id: Optional[int]) -> str:
+        scope = str(game_id) if game_id is not None else ALL_GAMES
+        # version of all entries (invalidate()) and of the scope
+        epoch, version = await self.backend.get_versions([self._version_key("*"), self._version_key(scope)])
+        return f"{self.prefix}:{scope}:{epoch}.{version}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+    async def get_or_compute(self, key: str, game_id: Optional[int],
+                             compute: Callable[[], Awaitable[bytes]]) -> CachedResponse:
+        """
+        :param key: key of the response (path and query of the request)
+        :param game_id: game the response belongs to, None if it belongs to all games
+        :param compute: computes the body of the response if it is not cached
+        """
+        entry_key = await self._entry_key(key, game_id)
+        value = await self.backend.get(entry_key)
+        if value is not None:
+            etag, body = value.split(b"\n", 1)
+            return CachedResponse(body, etag.decode())
+        body = await compute()
+        etag = self.etag(body)
+        await self.backend.set(entry_key, etag.encode() + b"\n" + body, self.ttl)
+        return CachedResponse(body, etag)
+
+    async def invalidate(self, game_ids: Optional[Iterable[int]] = None):
+        """
+        Drops the responses of the games and the responses of all games (search, game list).
+        :param game_ids: ids of the games, all responses are dropped if None
+        """
+        if game_ids is None:
+            await self.backend.incr(self._version_key("*"))
+            return
+        for game_id in set(game_ids):
+            await self.backend.incr(self._version_key(str(game_id)))
+        await self.backend.incr(self._version_key(ALL_GAMES))
+
+
+def create_response_cache(url: str, ttl: float = DEFAULT_TTL,
+                          max_entries: int = DEFAULT_MAX_ENTRIES) -> Optional[ResponseCache]:
+    """
+    :param url: "memory://", "redis://..." (also "rediss://" and "unix://"), the cache is disabled if empty
+    :raises ValueError: if the scheme of the url is not supported
+    """
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return ResponseCache(MemoryBackend(max_entries), ttl=ttl)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return ResponseCache(RedisBackend.from_url(url), ttl=ttl)
+    raise ValueError(f"Unsupported response cache url: {url}")
+
+
+@lru_cache()
+def shared_response_cache() -> Optional[ResponseCache]:
+    """Response cache of the process configured by RESPONSE_CACHE_URL."""
+    return create_response_cache(settings.RESPONSE_CACHE_URL, ttl=settings.RESPONSE_CACHE_TTL,
+                                 max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+
+async def invalidate_games(game_ids: Optional[Iterable[Optional[int]]] = None):
+    """
+    Drops cached responses of the games after their data were committed by a writer process.
+    Only a shared cache (Redis) is invalidated, the in-process cache of the API is not reachable from other processes.
+    :param game_ids: ids of the games (None ids are ignored), all responses if None
+    """
+    cache = shared_response_cache()
+    if cache is None or not cache.shared:
+        return
+    if game_ids is not None:
+        game_ids = [game_id for game_id in game_ids if game_id is not None]
+        if not game_ids:
+            return
+    try:
+        await cache.invalidate(game_ids)
+    except Exception as e:
+        # entries expire after ttl, a failed invalidation must not fail the writer
+        logger.warning(f"Invalidation of cached responses failed: {e}")
+
+
+def request_key(request: Request) -> str:
+    """Path and sorted query of the request."""
+    return f"{request.url.path}?{urlencode(sorted(request.query_params.multi_items()))}"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # weak comparison
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+async def cached_json_response(request: Request, cache: Optional[ResponseCache],
+                               compute: Callable[[], Awaitable[Any]], *, game_id: Optional[int] = None) -> Response:
+    """
+    JSON response of the endpoint with an ETag, served from the cache if possible.
+    The body is serialized the same way as the responses of FastAPI (jsonable_encoder of the result).
+    :param cache: response cache, the response is always computed if None
+    :param compute: computes the result of the endpoint
+    :param game_id: game the response belongs to, None if it belongs to all games
+    :return: 304 Not Modified if the If-None-Match header of the request matches
+    """
+
+    async def render() -> bytes:
+        return json.dumps(jsonable_encoder(await compute()), ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":")).encode("utf-8")
+
+    if cache is None:
+        body = await render()
+        cached = CachedResponse(body, ResponseCache.etag(body))
+    else:
+        cached = await cache.get_or_compute(request_key(request), game_id, render)
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
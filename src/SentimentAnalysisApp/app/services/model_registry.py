@@ -0,0 +1,54 @@
+"""
+Created by Frantisek Sabol
+Registry of the analysis models used by the API.
+The most utilized model (the model with the most extracted aspects) of a game and of all games is read from
+the gamestats rollup, which the analyzer updates with every stored batch, and cached in the process for ttl seconds.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+
+DEFAULT_TTL = 300.0
+DEFAULT_MAX_ENTRIES = 10_000
+
+
+class ModelRegistry:
+    """
+    In-process TTL cache of the most utilized models, keyed by game id (None for all games).
+    Results of other processes (analyzer workers) show up at the latest after ttl seconds.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        :param ttl: seconds a resolved model is reused
+        :param max_entries: max number of cached games, least recently used are dropped
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Optional[int], Tuple[float, Optional[str]]]" = OrderedDict()
+
+    async def get_most_utilized_model(self, db: AsyncSession, game_id: Optional[int] = None) -> Optional[str]:
+        """
+        :param game_id: id of the game, all games if None
+        :return: id of the model, None if no aspects were extracted
+        """
+        now = time.monotonic()
+        entry = self.entries.get(game_id)
+        if entry is not None and now - entry[0] < self.ttl:
+            self.entries.move_to_end(game_id)
+            return entry[1]
+        model_id = await crud.game_stats.get_most_utilized_model(db, game_id=game_id)
+        self.entries[game_id] = (now, model_id)
+        self.entries.move_to_end(game_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return model_id
+
+    def invalidate(self, game_id: Optional[int] = None):
+        """Drops the cached model of the game and of all games."""
+        self.entries.pop(game_id, None)
+        self.entries.pop(None, None)
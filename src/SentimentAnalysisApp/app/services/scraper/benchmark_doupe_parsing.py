@@ -0,0 +1,64 @@
+"""
+Created by Frantisek Sabol
+Benchmark of the parser backends of DoupeScraper on saved doupe.cz pages (list pages and review detail pages).
+Pages whose file name contains "list" are parsed as review list pages, the others as review detail pages.
+Usage (cwd: app/):
+    python -m app.services.scraper.benchmark_doupe_parsing --pages-dir path/to/saved/pages --repeat 50
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Callable
+
+from .doupe_parser import BACKENDS, parse_review_list, parse_review_detail
+
+DEFAULT_PAGES_DIR = os.path.join(os.path.dirname(__file__), "tests", "pages", "doupe")
+
+
+def load_pages(pages_dir: str) -> List[Tuple[Callable, str]]:
+    pages = []
+    for name in sorted(os.listdir(pages_dir)):
+        if not name.endswith(".html"):
+            continue
+        with open(os.path.join(pages_dir, name), encoding="utf-8") as f:
+            pages.append((parse_review_list if "list" in name else parse_review_detail, f.read()))
+    if not pages:
+        raise RuntimeError(f"No .html pages in {pages_dir}")
+    return pages
+
+
+def run_backend(pages: List[Tuple[Callable, str]], backend: str, repeat: int, workers: int) -> float:
+    jobs = pages * repeat
+    start = time.perf_counter()
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(parser, html, backend) for parser, html in jobs]
+            for future in futures:
+                future.result()
+    else:
+        for parser, html in jobs:
+            parser(html, backend)
+    return len(jobs) / (time.perf_counter() - start)
+
+
+def main(args):
+    pages = load_pages(args.pages_dir)
+    results = {}
+    for backend in args.backends.split(","):
+        results[backend] = run_backend(pages, backend, args.repeat, args.workers)
+        print(f"{backend:<12} {results[backend]:>12.1f} pages/sec")
+    baseline = results.get("html.parser")
+    if baseline:
+        for backend, rate in results.items():
+            print(f"{backend:<12} {rate / baseline:>12.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("benchmark_doupe_parsing.py")
+    parser.add_argument("--pages-dir", default=DEFAULT_PAGES_DIR, type=str, help="Directory with saved doupe.cz pages")
+    parser.add_argument("--backends", default=",".join(BACKENDS), type=str, help="Comma separated parser backends")
+    parser.add_argument("--repeat", default=20, type=int, help="Number of times every page is parsed")
+    parser.add_argument("--workers", default=0, type=int,
+                        help="Parse in a process pool of this size (default: 0, parse in this process)")
+    main(parser.parse_args())
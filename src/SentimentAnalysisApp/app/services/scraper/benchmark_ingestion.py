@@ -0,0 +1,113 @@
+"""
+Created by Frantisek Sabol
+Benchmark of review ingestion paths of DBScraper: per review ORM path, bulk upsert and COPY loader.
+Synthetic review pages are written into the database selected by ENVIRONMENT and removed afterwards.
+Usage (cwd: app/):
+    python -m app.services.scraper.benchmark_ingestion --pages 20 --page-size 100
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import delete, select
+
+from app import crud, models, schemas
+from app.db.session import async_session
+from .copy_loader import ReviewCopyLoader
+from .db_scraper import DBScraper
+
+BENCHMARK_SOURCE = "ingestion_benchmark"
+
+
+def generate_page(path: str, page_num: int, page_size: int, source_id: int, game_id: int
+                  ) -> List[schemas.ScrapedReview]:
+    return [
+        schemas.ScrapedReview(
+            text=f"Benchmark review {i} of page {page_num}. Gameplay is fun but the servers lag a lot.",
+            language="english",
+            reviewer=schemas.ScrapedReviewer(
+                name=f"Benchmark reviewer {i % (page_size // 2 or 1)}",
+                source_id=source_id,
+                source_reviewer_id=f"{path}_reviewer_{page_num}_{i % (page_size // 2 or 1)}",
+                num_games_owned=i,
+                num_reviews=i,
+            ),
+            game_id=game_id,
+            source_id=source_id,
+            source_review_id=f"{path}_review_{page_num}_{i}",
+            helpful_score="0.5",
+            voted_up=i % 3 != 0,
+            playtime_at_review=i * 10,
+            created_at=datetime.now(),
+        ) for i in range(page_size)
+    ]
+
+
+async def setup(db) -> Tuple[DBScraper, int]:
+    source = await crud.source.get_by_name(db, name=BENCHMARK_SOURCE)
+    if source is None:
+        source = await crud.source.create(db, obj_in=schemas.SourceCreate(name=BENCHMARK_SOURCE,
+                                                                          url="https://benchmark.local"))
+    game = await crud.game.create_from_source(db, obj_in=schemas.GameCreate(name="Ingestion benchmark game"),
+                                              source_id=source.id, source_game_id=f"benchmark_{time.time()}")
+    db_scraper = DBScraper()
+    db_scraper.session = db
+    db_scraper.db_source = source
+    return db_scraper, game.id
+
+
+async def teardown(db, db_scraper: DBScraper, game_id: int):
+    source_id = db_scraper.db_source.id
+    await db.execute(delete(models.Review).where(models.Review.source_id == source_id))
+    await db.execute(delete(models.Reviewer).where(models.Reviewer.source_id == source_id))
+    await db.execute(delete(models.GameSource).where(models.GameSource.source_id == source_id))
+    await db.execute(delete(models.Game).where(models.Game.id == game_id))
+    await db.commit()
+
+
+async def run_path(db_scraper: DBScraper, game_id: int, path: str, pages: int, page_size: int) -> float:
+    source_id = db_scraper.db_source.id
+    db_scraper.bulk = path == "bulk"
+    db_scraper.copy_loader = ReviewCopyLoader(source_id=source_id) if path == "copy" else None
+    data = [generate_page(path, page_num, page_size, source_id, game_id) for page_num in range(pages)]
+
+    start = time.perf_counter()
+    for page in data:
+        if db_scraper.copy_loader is not None:
+            await db_scraper.copy_loader.load_page(db_scraper.session, page, game_id=game_id)
+        else:
+            await db_scraper.add_reviews_to_db(page)
+    elapsed = time.perf_counter() - start
+
+    stored_id = await db_scraper.session.scalar(
+        select(models.Review.id).where(models.Review.source_review_id == f"{path}_review_0_0"))
+    if stored_id is None:
+        raise RuntimeError(f"Path {path} did not store any reviews")
+    return pages * page_size / elapsed
+
+
+async def main(args):
+    async with async_session() as db:
+        db_scraper, game_id = await setup(db)
+        try:
+            results = {}
+            for path in args.paths.split(","):
+                results[path] = await run_path(db_scraper, game_id, path, args.pages, args.page_size)
+                print(f"{path:<10} {results[path]:>12.1f} rows/sec")
+            baseline = results.get("orm")
+            if baseline:
+                for path, rate in results.items():
+                    print(f"{path:<10} {rate / baseline:>12.2f}x")
+        finally:
+            await teardown(db, db_scraper, game_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("benchmark_ingestion.py")
+    parser.add_argument("--pages", default=10, type=int, help="Number of review pages per path")
+    parser.add_argument("--page-size", default=100, type=int, help="Number of reviews per page")
+    parser.add_argument("--paths", default="orm,bulk,copy", type=str, help="Comma separated ingestion paths")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,91 @@
+"""
+Created by Frantisek Sabol
+Micro-benchmark of decoding and validation of Steam review pages (100 reviews per page, synthetic payloads):
+json + pydantic (previous path), orjson + pydantic and orjson + construct_trusted, optionally in a process pool.
+Usage (cwd: app/):
+    python -m app.services.scraper.benchmark_steam_validation --pages 200 --workers 4
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List, Callable
+
+from .steam_resources import parse_reviews_response
+
+
+def generate_page(page_num: int, page_size: int) -> bytes:
+    reviews = [
+        {
+            "recommendationid": str(page_num * page_size + i),
+            "author": {
+                "steamid": str(76561198000000000 + i),
+                "num_games_owned": i,
+                "num_reviews": i % 7,
+                "playtime_forever": i * 60,
+                "playtime_last_two_weeks": 0,
+                "playtime_at_review": i * 30,
+                "last_played": 1670000000 + i,
+            },
+            "language": "english" if i % 2 else "czech",
+            "review": f"Review {i} of page {page_num}. Gameplay is fun but the servers lag a lot. " * 5,
+            "timestamp_created": 1670000000 + i,
+            "timestamp_updated": 1670000000 + i,
+            "voted_up": i % 3 != 0,
+            "votes_up": i,
+            "votes_funny": 0,
+            "weighted_vote_score": "0.523809552192687988" if i % 2 else 0,
+            "comment_count": 0,
+            "steam_purchase": True,
+            "received_for_free": False,
+            "written_during_early_access": False,
+        } for i in range(page_size)
+    ]
+    return json.dumps({
+        "success": 1,
+        "query_summary": {"num_reviews": page_size},
+        "reviews": reviews,
+        "cursor": f"AoJ4{page_num}",
+    }).encode()
+
+
+# partials of a module level function, picklable for the process pool
+PATHS = {
+    "json+pydantic": partial(parse_reviews_response, loads=json.loads),
+    "orjson+pydantic": partial(parse_reviews_response),
+    "orjson+trusted": partial(parse_reviews_response, trusted=True),
+}
+
+
+def run_path(pages: List[bytes], parser: Callable, workers: int) -> float:
+    start = time.perf_counter()
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(parser, pages))
+    else:
+        for page in pages:
+            parser(page)
+    return len(pages) / (time.perf_counter() - start)
+
+
+def main(args):
+    pages = [generate_page(page_num, args.page_size) for page_num in range(args.pages)]
+    results = {}
+    for path in args.paths.split(","):
+        results[path] = run_path(pages, PATHS[path], args.workers)
+        print(f"{path:<16} {results[path]:>12.1f} pages/sec")
+    baseline = results.get("json+pydantic")
+    if baseline:
+        for path, rate in results.items():
+            print(f"{path:<16} {rate / baseline:>12.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("benchmark_steam_validation.py")
+    parser.add_argument("--pages", default=200, type=int, help="Number of review pages per path")
+    parser.add_argument("--page-size", default=100, type=int, help="Number of reviews per page")
+    parser.add_argument("--paths", default=",".join(PATHS), type=str, help="Comma separated validation paths")
+    parser.add_argument("--workers", default=0, type=int,
+                        help="Validate in a process pool of this size (default: 0, validate in this process)")
+    main(parser.parse_args())
@@ -116,6 +116,20 @@ class ContentType(str, Enum):
 DEFAULT_RATE_LIMIT = {"max_rate": 10, "time_period": 3}
 STEAM_API_RATE_LIMIT = {"max_rate": 2, "time_period": 4}
 STEAM_REVIEWS_API_RATE_LIMIT = DEFAULT_RATE_LIMIT
+# a review page which fails is the end of the cursor chain, it is retried more than other requests
+STEAM_REVIEWS_RETRIES = 10
+
+# time to live of cached responses in seconds (see response_cache.py), endpoints without ttl are not cached
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# http clients of the sources (see http_client.py), HTTP/2 is negotiated with the host
+# keep-alive pools are sized for the concurrent requests the rate limits allow
+STEAM_HTTP = {"http2": True, "limits": {"max_connections": 20, "max_keepalive_connections": 20}}
+GAMESPOT_HTTP = {"http2": True, "limits": {"max_connections": 5, "max_keepalive_connections": 5}}
+DOUPE_HTTP = {"http2": True, "limits": {"max_connections": 10, "max_keepalive_connections": 10},
+              # review articles are large html pages
+              "timeout": {"read": 60.0}}
 
 SOURCES = {
     SourceName.STEAM.value:
@@ -123,10 +137,12 @@ SOURCES = {
             "url": "https://store.steampowered.com/api",
             "name": SourceName.STEAM,
             "rate_limit": DEFAULT_RATE_LIMIT,
+            "http": STEAM_HTTP,
             "endpoints": {
                 "user_reviews": {
                     "url": "https://store.steampowered.com/appreviews",
                     "content_type": ContentType.JSON.value,
+                    "rate_limit": STEAM_REVIEWS_API_RATE_LIMIT,
                     "scraping_resources": [ScrapingResource.REVIEW.value, ScrapingResource.REVIEWER.value],
                     "scraping_mode": ScrapingMode.REVIEWS_OF_GAME_FROM_SOURCE.value
                 },
@@ -134,12 +150,14 @@ SOURCES = {
                     "url": "https://store.steampowered.com/api/appdetails",
                     "content_type": ContentType.JSON.value,
                     "rate_limit": STEAM_API_RATE_LIMIT,
+                    "cache_ttl": 7 * DAY,
                     "scraping_resources": [ScrapingResource.GAME.value],
                     "scraping_mode": ScrapingMode.GAMES_FROM_SOURCE.value
                 },
                 "list_of_games": {
                     "url": "https://api.steampowered.com/ISteamApps/GetAppList/v2",
                     "content_type": ContentType.JSON.value,
+                    "cache_ttl": DAY,
                     "scraping_resources": [ScrapingResource.GAME.value],
                     "scraping_mode": ScrapingMode.GAMES_FROM_SOURCE.value
                 }
@@ -168,10 +186,12 @@ SOURCES = {
             "game_detail_url": "http://www.gamespot.com/api/games/",
             "list_of_games_url": "http://www.gamespot.com/api/games/",
             "rate_limit": DEFAULT_RATE_LIMIT,
+            "http": GAMESPOT_HTTP,
             "endpoints": {
                 "critic_reviews": {
                     "url": "https://www.gamespot.com/api/reviews/",
                     "content_type": ContentType.JSON.value,
+                    "cache_ttl": DAY,
                     "scraping_resources": [ScrapingResource.REVIEW.value],
                     "scraping_mode": ScrapingMode.REVIEWS_OF_GAME_FROM_SOURCE.value
                 }
@@ -187,10 +207,14 @@ SOURCES = {
             "game_detail_url": None,
             "list_of_games_url": None,
             "rate_limit": DEFAULT_RATE_LIMIT,
+            "http": DOUPE_HTTP,
+            # review articles do not change after publishing
+            "cache_ttl": 30 * DAY,
             "endpoints": {
                 "critic_reviews": {
                     "url": "https://doupe.zive.cz/recenze/",
                     "content_type": ContentType.HTML.value,
+                    "cache_ttl": DAY,
                     "scraping_resources": [ScrapingResource.REVIEW.value],
                     "scraping_mode": ScrapingMode.REVIEWS_FROM_SOURCE.value
                 }
@@ -0,0 +1,194 @@
+"""
+Created by Frantisek Sabol
+Server-side bulk loader for scraped review pages. Pages are streamed into a temporary staging table
+with asyncpg COPY and merged into review, reviewer and gamesource tables with one SQL statement per page.
+Skips ORM object construction completely, used for backfills of whole catalogs.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import schemas
+from app.crud.review import crud_review_stats
+from .steam_resources import SteamReview
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = "review_staging"
+
+STAGING_COLUMNS = (
+    "source_review_id",
+    "source_reviewer_id",
+    "game_id",
+    "language",
+    "text",
+    "summary",
+    "score",
+    "helpful_score",
+    "good",
+    "bad",
+    "voted_up",
+    "playtime_at_review",
+    "created_at",
+    "reviewer_name",
+    "reviewer_num_games_owned",
+    "reviewer_num_reviews",
+)
+
+# temporary table lives for the whole connection, rows are dropped on every commit
+CREATE_STAGING_TABLE = f"""
+CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (
+    source_review_id VARCHAR,
+    source_reviewer_id VARCHAR,
+    game_id INTEGER,
+    language VARCHAR,
+    text TEXT,
+    summary TEXT,
+    score VARCHAR,
+    helpful_score VARCHAR,
+    good TEXT,
+    bad TEXT,
+    voted_up BOOLEAN,
+    playtime_at_review INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE,
+    reviewer_name VARCHAR,
+    reviewer_num_games_owned INTEGER,
+    reviewer_num_reviews INTEGER
+) ON COMMIT DELETE ROWS
+"""
+
+# one statement merges the staged page into reviewer, review and gamesource tables
+MERGE_STAGING_TABLE = f"""
+WITH staged_reviewers AS (
+    SELECT DISTINCT ON (source_reviewer_id)
+        source_reviewer_id, reviewer_name, reviewer_num_games_owned, reviewer_num_reviews
+    FROM {STAGING_TABLE}
+    WHERE source_reviewer_id IS NOT NULL
+    ORDER BY source_reviewer_id
+), upserted_reviewers AS (
+    INSERT INTO reviewer (name, source_reviewer_id, source_id, num_games_owned, num_reviews)
+    SELECT reviewer_name, source_reviewer_id, :source_id, reviewer_num_games_owned, reviewer_num_reviews
+    FROM staged_reviewers
+    ON CONFLICT (source_reviewer_id, source_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        num_games_owned = EXCLUDED.num_games_owned,
+        num_reviews = EXCLUDED.num_reviews
+    RETURNING id, source_reviewer_id
+), inserted_reviews AS (
+    INSERT INTO review (source_review_id, source_reviewer_id, game_id, reviewer_id, source_id, language, text,
+                        summary, score, helpful_score, good, bad, voted_up, playtime_at_review, created_at)
+    SELECT DISTINCT ON (s.source_review_id)
+        s.source_review_id, s.source_reviewer_id, s.game_id, r.id, :source_id, s.language, s.text,
+        s.summary, s.score, s.helpful_score, s.good, s.bad, s.voted_up, s.playtime_at_review, s.created_at
+    FROM {STAGING_TABLE} s
+    LEFT JOIN upserted_reviewers r ON r.source_reviewer_id = s.source_reviewer_id
+    ORDER BY s.source_review_id
+    ON CONFLICT (source_review_id, source_id) DO NOTHING
+    RETURNING id, game_id
+), game_counts AS (
+    SELECT game_id, count(*) AS num_inserted FROM inserted_reviews GROUP BY game_id
+), updated_game_sources AS (
+    UPDATE gamesource gs SET num_reviews = coalesce(gs.num_reviews, 0) + gc.num_inserted
+    FROM game_counts gc
+    WHERE gs.game_id = gc.game_id AND gs.source_id = :source_id
+    RETURNING gs.id
+)
+SELECT id FROM inserted_reviews
+"""
+
+ReviewCopyRecord = Tuple
+
+
+def steam_review_to_record(review: SteamReview, game_id: int) -> ReviewCopyRecord:
+    """Builds a staging record straight from the Steam API model (no intermediate ScrapedReview)."""
+    author = review.author
+    return (
+        review.recommendationid,
+        author.steamid,
+        game_id,
+        review.language,
+        review.review,
+        None,
+        None,
+        review.weighted_vote_score,
+        None,
+        None,
+        review.voted_up,
+        review.playtime_at_review,
+        datetime.fromtimestamp(review.timestamp_created, tz=timezone.utc),
+        None,
+        author.num_games_owned,
+        author.num_reviews,
+    )
+
+
+def scraped_review_to_record(review: schemas.ScrapedReview, game_id: Optional[int] = None) -> ReviewCopyRecord:
+    reviewer = review.reviewer
+    return (
+        review.source_review_id,
+        reviewer.source_reviewer_id if reviewer else None,
+        game_id if game_id is not None else review.game_id,
+        review.language,
+        review.text,
+        review.summary,
+        review.score,
+        review.helpful_score,
+        review.good,
+        review.bad,
+        review.voted_up,
+        review.playtime_at_review,
+        review.created_at,
+        reviewer.name if reviewer else None,
+        reviewer.num_games_owned if reviewer else None,
+        reviewer.num_reviews if reviewer else None,
+    )
+
+
+class ReviewCopyLoader:
+    """
+    Loads pages of scraped reviews with Postgres COPY into a staging table and merges them into the app tables.
+    Requires the asyncpg driver.
+    """
+
+    def __init__(self, source_id: int):
+        self.source_id = source_id
+
+    @staticmethod
+    def to_records(page: List[Union[SteamReview, schemas.ScrapedReview]],
+                   game_id: Optional[int] = None) -> List[ReviewCopyRecord]:
+        records = []
+        for review in page:
+            if isinstance(review, SteamReview):
+                records.append(steam_review_to_record(review, game_id))
+            else:
+                records.append(scraped_review_to_record(review, game_id))
+        return records
+
+    async def load_page(self, db: AsyncSession, page: List[Union[SteamReview, schemas.ScrapedReview]],
+                        game_id: Optional[int] = None) -> int:
+        """
+        Copies a page of reviews into the staging table and merges it in the same transaction.
+        :param db: Database session
+        :param page: SteamReview or ScrapedReview objects
+        :param game_id: id of the game the reviews belong to, required for SteamReview pages
+        :return: number of newly inserted reviews
+        """
+        records = self.to_records(page, game_id)
+        if not records:
+            return 0
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await db.execute(text(CREATE_STAGING_TABLE))
+        await raw_connection.driver_connection.copy_records_to_table(
+            STAGING_TABLE, records=records, columns=STAGING_COLUMNS)
+        result = await db.execute(text(MERGE_STAGING_TABLE), {"source_id": self.source_id})
+        review_ids = result.scalars().all()
+        num_inserted = len(review_ids)
+        # inserted reviews are counted in the daily rollup in the same transaction
+        await crud_review_stats.add_new_reviews(db, review_ids=review_ids)
+        await db.commit()
+        logger.debug(f"copy loader: staged {len(records)} reviews, inserted {num_inserted}")
+        return num_inserted
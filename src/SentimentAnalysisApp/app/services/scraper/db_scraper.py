@@ -5,8 +5,7 @@ Script for scraping games from various sources and adding them to the database.
 import argparse
 import asyncio
 import logging
-import random
-from datetime import timedelta
+from datetime import timedelta, datetime, timezone
 from typing import List, Optional, Union, TypeVar, Tuple, Literal, Any, Dict
 
 from pydantic import BaseModel
@@ -17,8 +16,13 @@ from app.db.session import async_session
 
 import app.models as models
 from .scraper import SteamScraper, Scraper, DoupeScraper, GamespotScraper
+from .doupe_parser import BACKENDS, DEFAULT_BACKEND
+from .copy_loader import ReviewCopyLoader
+from .response_cache import ResponseCache
+from .http_client import ClientFactory
 from .constants import STEAM_REVIEWS_API_RATE_LIMIT, STEAM_API_RATE_LIMIT, DEFAULT_RATE_LIMIT
 from app.core.config import settings
+from app.services.api_cache import invalidate_games
 from sqlalchemy import exc, and_
 from app import crud, schemas
 
@@ -31,19 +35,33 @@ logger = logging.getLogger("scraper_to_db.py")
 
 class DBScraper:
     @classmethod
-    async def create(cls, scraper: Scraper = None, session: AsyncSession = None):
+    async def create(cls, scraper: Scraper = None, session: AsyncSession = None, bulk: bool = False,
+                     bulk_copy: bool = False):
         self = DBScraper()
         self.scraper = scraper
         self.session = session
+        self.bulk = bulk
         self.db_source = await crud.source.get_by_url(self.session, url=self.scraper.url)
         if self.db_source is None:
             raise ValueError(f"Source {self.scraper.url} was not found in db!")
+        if bulk_copy:
+            self.copy_loader = ReviewCopyLoader(source_id=self.db_source.id)
         return self
 
     def __init__(self):
         self.scraper = None
         self.session: Optional[AsyncSession] = None
         self.db_source = None
+        # use set based ingestion of review pages instead of storing reviews one by one
+        self.bulk = False
+        # load review pages with COPY into a staging table and merge them server side
+        self.copy_loader: Optional[ReviewCopyLoader] = None
+
+    def log_rate_metrics(self):
+        for metrics in self.scraper.rate_metrics():
+            logger.info(f"rate limiter {metrics['name']}: {metrics['rate']:.3f} requests/sec "
+                        f"(configured {metrics['configured_rate']:.3f}), {metrics['requests']} requests, "
+                        f"{metrics['backoffs']} backoffs")
 
     async def scrape_games(self, num_games: Optional[int] = 1000, **kwargs) -> List[str]:
         blacklist = await crud.game.get_all_app_ids_from_source(self.session, source_id=self.db_source.id)
@@ -54,6 +72,7 @@ class DBScraper:
                              page if game is not None]
             db_games = await self.add_games_to_db(scraped_games)
             await self.session.commit()
+            await invalidate_games([game.id for game in db_games.values()])
             logger.info(f"Added {list(db_games.keys())} games to db!")
             new_games_in_db += db_games.keys()
             if num_games is not None and len(new_games_in_db) >= num_games:
@@ -84,6 +103,8 @@ class DBScraper:
         return db_games
 
     async def add_reviews_to_db(self, scraped_reviews: List[schemas.ScrapedReview]) -> Dict[str, models.Review]:
+        if self.bulk:
+            return await self.add_reviews_to_db_bulk(scraped_reviews)
         review_ids = [str(r.source_review_id) for r in scraped_reviews]
         query_reviews = select(models.Review.id, models.Review.source_review_id) \
             .where(and_(models.Review.source_id == self.db_source.id,
@@ -103,6 +124,24 @@ class DBScraper:
             db_review_ids[result.source_review_id] = result.id
         return db_review_ids
 
+    async def add_reviews_to_db_bulk(self, scraped_reviews: List[schemas.ScrapedReview]) -> Dict[str, int]:
+        """
+        Stores a page of reviews with one upsert for reviewers and one for reviews in a single transaction.
+        Games of the reviews (critic sources) are resolved first, once per distinct game of the page.
+        """
+        game_ids = {}
+        for review in scraped_reviews:
+            if review.game_id is not None or review.game is None:
+                continue
+            source_game_id = review.game.source_game_id
+            if source_game_id not in game_ids:
+                db_game = await crud.scraper.store_game_with_additional_objects(self.session, scraped_obj=review.game)
+                game_ids[source_game_id] = db_game.id
+            review.game_id = game_ids[source_game_id]
+        return await crud.scraper.store_reviews_bulk(self.session,
+                                                     source_id=self.db_source.id,
+                                                     scraped_objs=scraped_reviews)
+
     async def add_reviewers_to_db(self, scraped_reviewers: List[BaseModel]) -> Dict[str, models.Reviewer]:
         data = [reviewer.dict(by_alias=True) for reviewer in scraped_reviewers]
         source_reviewer_ids = [reviewer.get("source_reviewer_id") for reviewer in data]
@@ -128,8 +167,18 @@ class DBScraper:
             day_range: int = None,
             language: str = "czech",
             max_reviews: Optional[int] = 100,
+            incremental: bool = False,
             **kwargs
     ) -> Tuple[int, int]:
+        """
+        Scrapes reviews of the game and stores them in the db.
+        Every stored page is checkpointed in a scraping job, an interrupted scrape resumes from the cursor
+        of the last stored page. If a page cannot be scraped, the job is not finished and the high water mark
+        is not moved, the next run continues after the last stored page.
+        :param incremental: only scrape reviews newer than the stored high water mark of the game
+        (GameSource.reviews_updated_until), the scraper stops at the first page without new reviews
+        :return: game id and number of scraped reviews
+        """
         num_reviews_scraped = 0
         if source_game_id is None and game_id is None:
             raise ValueError("Either game_id or source_game_id must be provided!")
@@ -150,127 +199,277 @@ class DBScraper:
         if source_game_id is None:
             source_game_id = await crud.game.get_source_game_id(self.session, id=game_id)
 
+        if incremental:
+            updated_until = await crud.game.get_reviews_high_water_mark(self.session,
+                                                                        source_id=self.db_source.id,
+                                                                        game_id=game_id)
+            if updated_until is not None:
+                # reviews around the mark may have been stored already, they are skipped by the scraper
+                kwargs["updated_since"] = int(updated_until.timestamp())
+                kwargs["known_review_ids"] = await crud.review.get_source_review_ids_by_game_since(
+                    self.session, source_id=self.db_source.id, game_id=game_id,
+                    since=updated_until - timedelta(days=1))
+                logger.debug(f"Incremental scrape of game {source_game_id} from {updated_until}, "
+                             f"{len(kwargs['known_review_ids'])} known reviews around the mark")
+
+        job = await crud.scraping_job.start(self.session,
+                                            name=f"reviews:{self.db_source.id}:{game_id}",
+                                            source_id=self.db_source.id,
+                                            game_id=game_id)
+        if job.cursor is not None:
+            logger.info(f"Resuming scraping of game {source_game_id} after {job.pages_done} pages "
+                        f"({job.reviews_done} reviews) from cursor {job.cursor}")
+            kwargs["cursor"] = job.cursor
+
         async for page in self.scraper.game_reviews_page_generator(
                 game_id=source_game_id,
                 language=language,
                 day_range=day_range,
                 max_reviews=max_reviews, **kwargs):
             num_reviews_scraped += len(page)
-            reviews = [
-                schemas.ScrapedReview(game_id=game_id, source_id=self.db_source.id, **review.dict(by_alias=True)) for
-                review in page]
-            db_review_ids = await self.add_reviews_to_db(reviews)
-
-        await crud.game.update_after_reviews_scrape(self.session, source_id=self.db_source.id, game_id=game_id)
+            newest_update = max((r.timestamp_updated for r in page if hasattr(r, "timestamp_updated")),
+                                default=None)
+            if self.copy_loader is not None:
+                await self.copy_loader.load_page(self.session, page, game_id=game_id)
+            else:
+                reviews = [
+                    schemas.ScrapedReview(game_id=game_id, source_id=self.db_source.id, **review.dict(by_alias=True))
+                    for review in page]
+                db_review_ids = await self.add_reviews_to_db(reviews)
+            await crud.scraping_job.checkpoint(
+                self.session,
+                db_obj=job,
+                cursor=self.scraper.review_cursors.get(str(source_game_id)),
+                num_reviews=len(page),
+                reviews_updated_until=datetime.fromtimestamp(newest_update, tz=timezone.utc) if newest_update else None)
+
+        complete = str(source_game_id) not in self.scraper.incomplete_review_chains
+        if complete:
+            await crud.game.update_after_reviews_scrape(
+                self.session,
+                source_id=self.db_source.id,
+                game_id=game_id,
+                reviews_updated_until=job.reviews_updated_until)
+        await invalidate_games([game_id])
+        if complete:
+            await crud.scraping_job.finish(self.session, db_obj=job)
+        else:
+            # the high water mark stays and the job keeps the cursor of the last stored page,
+            # the next run resumes after it instead of skipping the reviews behind the failed page
+            logger.warning(f"Scraping of game {source_game_id} stopped at a failed page after "
+                           f"{job.pages_done} pages, the job will be resumed from cursor {job.cursor}")
         return game_id, num_reviews_scraped
 
     async def scrape_all_reviews_for_not_updated_steam_games(self, game_ids: List[str] = None,
                                                              check_interval: timedelta = None,
-                                                             max_reviews: int = 100000):
+                                                             max_reviews: int = 100000,
+                                                             concurrency: int = 1,
+                                                             incremental: bool = True):
+        """
+        Scrapes reviews for games which were not scraped in check_interval.
+        Games are scraped in order of the oldest reviews_scraped_at (never scraped first).
+        :param concurrency: number of games scraped at the same time on the shared scraper, the scraper
+        rate limiters keep the requests within the source budgets
+        :param incremental: only scrape reviews newer than the high water mark of each game
+        """
         if game_ids is None:
             games = await crud.game.get_ids_and_source_ids_for_reviews_scraping_from_source(
                 self.session,
                 source_id=self.db_source.id,
                 check_interval=check_interval
             )
-            random.shuffle(games)
             game_ids = {game[1]: game[0] for game in games}
 
+        if concurrency > 1:
+            await self.scrape_reviews_for_games_concurrently(game_ids, concurrency=concurrency,
+                                                             incremental=incremental)
+            return
+
         for source_game_id, game_id in game_ids.items():
             logger.info(f"Scraping for game {source_game_id} started.")
             _, num_reviews_scraped = await self.scrape_reviews_for_game(game_id=game_id,
                                                                         source_game_id=source_game_id,
-                                                                        max_reviews=1000000)
+                                                                        max_reviews=1000000,
+                                                                        incremental=incremental)
             logger.info(f"Scraping for game {source_game_id} finished. Scraped {num_reviews_scraped} reviews!")
+            self.log_rate_metrics()
+
+    async def scrape_reviews_for_games_concurrently(self, game_ids: Dict[str, int], concurrency: int = 4,
+                                                    incremental: bool = True):
+        """
+        Keeps up to concurrency games in flight on the shared scraper. Every worker uses its own db session,
+        games are taken from the queue in the order of game_ids.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for source_game_id, game_id in game_ids.items():
+            queue.put_nowait((source_game_id, game_id))
 
-    async def scrape_all_reviews(self, max_reviews: int = 100):
-        async for page in self.scraper.game_reviews_page_generator(max_reviews=max_reviews):
-            objs_in = []
-
-            for review in page:
-                review_data = review.dict(by_alias=True)
-                review_obj = schemas.Review.parse_obj(review_data)
-                review_obj.source_id = self.db_source.id
-
-                if review_data.get("game") is not None:
-                    game_data = review.game.dict(by_alias=True)
-                    source_game_id = game_data.get("source_game_id")
-                    game_obj = schemas.Game.parse_obj(game_data)
-                    db_game = await crud.game.get_by_source_id(self.session,
-                                                               source_id=self.db_source.id,
-                                                               source_game_id=source_game_id)
-
-                    if db_game is None:
-                        db_game = await crud.game.create_from_source(self.session,
-                                                                     obj_in=game_obj,
-                                                                     source_id=self.db_source.id,
-                                                                     source_game_id=source_game_id)
-                    review_obj.game_id = db_game.id
-
-                if review_data.get("reviewer") is not None:
-                    reviewer_data = review.reviewer.dict(by_alias=True)
-                    review_obj.playtime_at_review = reviewer_data.get("playtime_at_review")
-
-                    reviewer_obj = schemas.Reviewer.parse_obj(reviewer_data)
-                    reviewer_obj.source_id = self.db_source.id
-
-                    db_reviewer = await crud.reviewer.get_by_source_id(self.session,
-                                                                       source_id=self.db_source.id,
-                                                                       source_obj_id=reviewer_obj.source_reviewer_id)
-                    if db_reviewer is None:
-                        db_reviewer = await crud.reviewer.create_from_source(obj_in=reviewer_obj)
-                    reviewer_obj.id = db_reviewer.id
-
-                objs_in.append(review_obj)
-                if len(objs_in) >= max_reviews:
-                    break
-            await crud.review.create_multi(self.session, objs_in=objs_in)
-
-
-async def scrape_gamespot_reviews(rate_limit: dict = None):
+        async def worker(worker_id: int):
+            async with async_session() as session:
+                db_scraper = await DBScraper.create(scraper=self.scraper, session=session, bulk=self.bulk,
+                                                    bulk_copy=self.copy_loader is not None)
+                while not queue.empty():
+                    source_game_id, game_id = queue.get_nowait()
+                    logger.info(f"Worker {worker_id}: scraping for game {source_game_id} started.")
+                    try:
+                        _, num_reviews_scraped = await db_scraper.scrape_reviews_for_game(
+                            game_id=game_id,
+                            source_game_id=source_game_id,
+                            max_reviews=1000000,
+                            incremental=incremental)
+                    except Exception as e:
+                        # one failing game must not stop the other workers
+                        logger.exception(f"Worker {worker_id}: scraping for game {source_game_id} failed: {e}")
+                        await session.rollback()
+                        continue
+                    logger.info(f"Worker {worker_id}: scraping for game {source_game_id} finished. "
+                                f"Scraped {num_reviews_scraped} reviews! {queue.qsize()} games left.")
+                    db_scraper.log_rate_metrics()
+
+        await asyncio.gather(*[worker(i) for i in range(min(concurrency, len(game_ids)))])
+
+    async def scrape_all_reviews(self, max_reviews: int = 100, retry_failed: bool = True):
+        """
+        Scrapes all reviews of a source with numbered pages (Gamespot, Doupe).
+        Stored pages and failed urls are checkpointed in a scraping job, an interrupted scrape skips the stored
+        pages when it is resumed. Pages which failed are retried once at the end of the scrape.
+        """
+        job = await crud.scraping_job.start(self.session, name=f"reviews:{self.db_source.id}",
+                                            source_id=self.db_source.id)
+        if job.pages_done:
+            logger.info(f"Resuming scraping of source {self.db_source.name} after {job.pages_done} pages "
+                        f"({job.reviews_done} reviews)")
+        failed_urls = list(job.failed_urls or [])
+        self.scraper.failed_urls = []
+        async for page in self.scraper.game_reviews_page_generator(max_reviews=max_reviews,
+                                                                   skip_pages=set(job.done_pages or [])):
+            await self.add_critic_reviews_to_db(page, max_reviews=max_reviews)
+            await crud.scraping_job.checkpoint(self.session, db_obj=job, page=self.scraper.page_key,
+                                               num_reviews=len(page), failed_urls=self.scraper.failed_urls)
+
+        failed_urls += self.scraper.failed_urls
+        if retry_failed and failed_urls:
+            await self.retry_failed_urls(job, failed_urls, max_reviews=max_reviews)
+        await crud.scraping_job.finish(self.session, db_obj=job)
+        self.log_rate_metrics()
+
+    async def retry_failed_urls(self, job: models.ScrapingJob, failed_urls: List[str], max_reviews: int = 100):
+        """Retry pass over pages which failed, pages failing again stay in the failed urls of the job."""
+        logger.info(f"Retrying {len(failed_urls)} failed pages of source {self.db_source.name}")
+        self.scraper.failed_urls = []
+        async for page in self.scraper.failed_pages_generator(list(dict.fromkeys(failed_urls))):
+            await self.add_critic_reviews_to_db(page, max_reviews=max_reviews)
+        await crud.scraping_job.set_failed_urls(self.session, db_obj=job, failed_urls=self.scraper.failed_urls)
+        logger.info(f"Retry pass finished, {len(self.scraper.failed_urls)} pages failed again")
+
+    async def add_critic_reviews_to_db(self, page: list, max_reviews: int = 100):
+        objs_in = []
+
+        for review in page:
+            review_data = review.dict(by_alias=True)
+            review_obj = schemas.Review.parse_obj(review_data)
+            review_obj.source_id = self.db_source.id
+
+            if review_data.get("game") is not None:
+                game_data = review.game.dict(by_alias=True)
+                source_game_id = game_data.get("source_game_id")
+                game_obj = schemas.Game.parse_obj(game_data)
+                db_game = await crud.game.get_by_source_id(self.session,
+                                                           source_id=self.db_source.id,
+                                                           source_game_id=source_game_id)
+
+                if db_game is None:
+                    db_game = await crud.game.create_from_source(self.session,
+                                                                 obj_in=game_obj,
+                                                                 source_id=self.db_source.id,
+                                                                 source_game_id=source_game_id)
+                review_obj.game_id = db_game.id
+
+            if review_data.get("reviewer") is not None:
+                reviewer_data = review.reviewer.dict(by_alias=True)
+                review_obj.playtime_at_review = reviewer_data.get("playtime_at_review")
+
+                reviewer_obj = schemas.Reviewer.parse_obj(reviewer_data)
+                reviewer_obj.source_id = self.db_source.id
+
+                db_reviewer = await crud.reviewer.get_by_source_id(self.session,
+                                                                   source_id=self.db_source.id,
+                                                                   source_obj_id=reviewer_obj.source_reviewer_id)
+                if db_reviewer is None:
+                    db_reviewer = await crud.reviewer.create_from_source(obj_in=reviewer_obj)
+                reviewer_obj.id = db_reviewer.id
+
+            objs_in.append(review_obj)
+            if len(objs_in) >= max_reviews:
+                break
+        # create_multi counts the stored reviews in the daily rollup
+        await crud.review.create_multi(self.session, objs_in=objs_in)
+        game_ids = {obj.game_id for obj in objs_in if obj.game_id is not None}
+        if game_ids:
+            await invalidate_games(game_ids)
+
+
+async def scrape_gamespot_reviews(rate_limit: dict = None, cache: Optional[ResponseCache] = None,
+                                  client_factory: Optional[ClientFactory] = None):
     """Scrape gamespot reviews. This method is used to get initial data for system"""
     async with async_session() as session:
-        async with GamespotScraper(api_key=settings.GAMESPOT_API_KEY, rate_limit=rate_limit) as scraper:
+        async with GamespotScraper(api_key=settings.GAMESPOT_API_KEY, rate_limit=rate_limit, cache=cache,
+                                   client_factory=client_factory) as scraper:
             db_scraper = await DBScraper.create(scraper, session)
             await db_scraper.scrape_all_reviews()
 
 
-async def scrape_doupe_reviews(rate_limit: dict = None):
+async def scrape_doupe_reviews(rate_limit: dict = None, cache: Optional[ResponseCache] = None,
+                               parser_backend: str = DEFAULT_BACKEND, parse_workers: Optional[int] = None,
+                               client_factory: Optional[ClientFactory] = None):
     """Scrape all reviews from doupe.cz. This method is used to get initial data for system"""
     async with async_session() as session:
-        async with DoupeScraper(rate_limit=rate_limit) as scraper:
+        async with DoupeScraper(rate_limit=rate_limit, cache=cache, parser_backend=parser_backend,
+                                parse_workers=parse_workers, client_factory=client_factory) as scraper:
             db_scraper = await DBScraper.create(scraper=scraper, session=session)
             await db_scraper.scrape_all_reviews(max_reviews=2000)
 
 
-async def scrape_steam_games(rate_limit: dict = None, **kwargs):
+async def scrape_steam_games(rate_limit: dict = None, cache: Optional[ResponseCache] = None,
+                             client_factory: Optional[ClientFactory] = None, **kwargs):
     """Scrape all games from steam. This method is used to get initial data for system"""
     if rate_limit is None:
         rate_limit = STEAM_API_RATE_LIMIT
     async with async_session() as session:
-        async with SteamScraper(rate_limit=rate_limit) as scraper:
+        async with SteamScraper(rate_limit=rate_limit, cache=cache, client_factory=client_factory) as scraper:
             db_scraper = await DBScraper.create(scraper=scraper, session=session)
             await db_scraper.scrape_games(**kwargs)
 
 
-async def scrape_steam_reviews(rate_limit: dict = None, check_interval: timedelta = timedelta(days=7)):
+async def scrape_steam_reviews(rate_limit: dict = None, check_interval: timedelta = timedelta(days=7),
+                               bulk: bool = False, bulk_copy: bool = False, concurrency: int = 1,
+                               incremental: bool = True, cache: Optional[ResponseCache] = None,
+                               trusted_validation: bool = False, parse_workers: Optional[int] = 0,
+                               client_factory: Optional[ClientFactory] = None):
     """Scrape all reviews from steam for scraped games. This method is used to get initial data for system"""
     async with async_session() as session:
-        async with SteamScraper(rate_limit=rate_limit) as scraper:
-            db_scraper = await DBScraper.create(scraper=scraper, session=session)
-            await db_scraper.scrape_all_reviews_for_not_updated_steam_games(check_interval=check_interval)
-
-
-async def scrape_steam_reviews_for_game(rate_limit: dict = None, **kwargs):
+        async with SteamScraper(rate_limit=rate_limit, cache=cache, trusted_validation=trusted_validation,
+                                parse_workers=parse_workers, client_factory=client_factory) as scraper:
+            db_scraper = await DBScraper.create(scraper=scraper, session=session, bulk=bulk, bulk_copy=bulk_copy)
+            await db_scraper.scrape_all_reviews_for_not_updated_steam_games(check_interval=check_interval,
+                                                                            concurrency=concurrency,
+                                                                            incremental=incremental)
+
+
+async def scrape_steam_reviews_for_game(rate_limit: dict = None, bulk: bool = False, bulk_copy: bool = False,
+                                        cache: Optional[ResponseCache] = None, trusted_validation: bool = False,
+                                        parse_workers: Optional[int] = 0,
+                                        client_factory: Optional[ClientFactory] = None, **kwargs):
     """Scrape all reviews from steam for specific game. This method is used to get initial data for system"""
     logger.debug(f"Creating db session: In progress.")
     async with async_session() as session:
         logger.debug(f"Creating db session: Done.")
         logger.debug(f"Creating scraper: In progress.")
-        async with SteamScraper(rate_limit=rate_limit) as scraper:
+        async with SteamScraper(rate_limit=rate_limit, cache=cache, trusted_validation=trusted_validation,
+                                parse_workers=parse_workers, client_factory=client_factory) as scraper:
             logger.debug(f"Creating scraper: Done.")
             logger.debug(f"Creating db scraper: In progress.")
-            db_scraper = await DBScraper.create(scraper=scraper, session=session)
+            db_scraper = await DBScraper.create(scraper=scraper, session=session, bulk=bulk, bulk_copy=bulk_copy)
             logger.debug(f"Creating db scraper: Done.")
             await db_scraper.scrape_reviews_for_game(**kwargs)
 
@@ -290,16 +489,44 @@ async def main():
     parser.add_argument('--max-games', default=None, type=int, help="Max games to scrape")
     parser.add_argument('--page-size', default=1, type=int, help="Page size for scraper")
     parser.add_argument('--language', default='english,czech', type=str, help="Language of the reviews")
+    parser.add_argument('--bulk', action='store_true',
+                        help="Store scraped review pages with set based upserts (one transaction per page)")
+    parser.add_argument('--concurrency', default=1, type=int,
+                        help="Number of games scraped at the same time when scraping steam reviews")
+    parser.add_argument('--bulk-copy', action='store_true',
+                        help="Load scraped review pages with Postgres COPY into a staging table and merge them")
+    parser.add_argument('--full-refresh', action='store_true',
+                        help="Scrape all reviews of the games instead of only reviews newer than the last scrape")
+    parser.add_argument('--cache', default=None, type=str,
+                        help="Path of the SQLite response cache, responses are replayed from it on re-runs")
+    parser.add_argument('--cache-max-size', default=512, type=int, help="Max size of the response cache in MB")
+    parser.add_argument('--parser-backend', default=DEFAULT_BACKEND, choices=BACKENDS,
+                        help="HTML parser of the doupe.cz pages")
+    parser.add_argument('--parse-workers', default=None, type=int,
+                        help="Number of processes parsing doupe.cz pages and validating steam review pages "
+                             "(default: number of cpus for doupe.cz, no processes for steam; 0: no processes)")
+    parser.add_argument('--no-http2', action='store_true', help="Use HTTP/1.1 for all sources")
+    parser.add_argument('--read-timeout', default=None, type=float,
+                        help="Read timeout of the requests in seconds (default: per source, see http_client.py)")
+    parser.add_argument('--trusted-validation', action='store_true',
+                        help="Build steam reviews without pydantic validation, only ids, language and types "
+                             "of the stored fields are checked")
     args = parser.parse_args()
 
     rate_limit = None
     if args.rate_limit:
         rate_limit = {"max_rate": args.rate_limit, "time_period": 1}
+    cache = None
+    if args.cache:
+        cache = ResponseCache(args.cache, max_size=args.cache_max_size * 1024 * 1024)
+    client_factory = ClientFactory(http2=False if args.no_http2 else None,
+                                   timeout={"read": args.read_timeout} if args.read_timeout is not None else None)
     try:
 
         if args.steam_games:
             logger.info("Started scraping steam games")
-            await scrape_steam_games(rate_limit=rate_limit, num_games=args.max_games, page_size=args.page_size)
+            await scrape_steam_games(rate_limit=rate_limit, cache=cache, client_factory=client_factory,
+                                     num_games=args.max_games, page_size=args.page_size)
         elif args.steam_reviews:
             if args.game_id is not None or args.source_game_id is not None:
                 logger.info(f"Started scraping steam reviews for game {args.game_id}")
@@ -308,21 +535,39 @@ async def main():
                     source_game_id=args.source_game_id,
                     rate_limit=rate_limit,
                     max_reviews=args.max_reviews,
-                    language=args.language)
+                    language=args.language,
+                    bulk=args.bulk,
+                    bulk_copy=args.bulk_copy,
+                    incremental=not args.full_refresh,
+                    cache=cache,
+                    trusted_validation=args.trusted_validation,
+                    parse_workers=args.parse_workers or 0,
+                    client_factory=client_factory)
             else:
                 logger.info("Started scraping steam reviews")
-                await scrape_steam_reviews(rate_limit=rate_limit)
+                await scrape_steam_reviews(rate_limit=rate_limit, bulk=args.bulk, bulk_copy=args.bulk_copy,
+                                           check_interval=timedelta(days=args.check_interval),
+                                           concurrency=args.concurrency,
+                                           incremental=not args.full_refresh,
+                                           cache=cache,
+                                           trusted_validation=args.trusted_validation,
+                                           parse_workers=args.parse_workers or 0,
+                                           client_factory=client_factory)
         elif args.doupe_reviews:
             logger.info("Started scraping doupe reviews")
-            await scrape_doupe_reviews(rate_limit=rate_limit)
+            await scrape_doupe_reviews(rate_limit=rate_limit, cache=cache, parser_backend=args.parser_backend,
+                                       parse_workers=args.parse_workers, client_factory=client_factory)
         elif args.gamespot_reviews:
             logger.info("Started scraping gamespot reviews")
-            await scrape_gamespot_reviews(rate_limit=rate_limit)
+            await scrape_gamespot_reviews(rate_limit=rate_limit, cache=cache, client_factory=client_factory)
         else:
             parser.print_help()
     except Exception as e:
         raise e
     finally:
+        await client_factory.aclose()
+        if cache is not None:
+            cache.close()
         logger.info("Finished")
 
 
@@ -0,0 +1,245 @@
+"""
+Created by Frantisek Sabol
+Parsing of doupe.cz review list pages and review detail pages with swappable backends.
+Functions are module level and work on plain strings, so DoupeScraper can run them in a process pool
+off the event loop.
+Backends:
+- html.parser: BeautifulSoup tree of the whole page (reference implementation)
+- lxml: libxml2 tree, only the rating/verdict containers are looked up with XPath
+- selectolax: selectolax (lexbor) tree, only the rating/verdict containers are looked up with CSS selectors
+"""
+from typing import List, Tuple, Dict, Optional, Callable
+
+from bs4 import BeautifulSoup, NavigableString
+
+from .doupe_resources import game_tags
+
+BACKENDS = ("html.parser", "lxml", "selectolax")
+DEFAULT_BACKEND = "lxml"
+
+SCORE_LABELS = ("Závěrečné hodnocení:", "Celkové hodnocení:")
+VERDICT_LABEL = "Verdikt"
+GOOD_CONTAINERS = (("div", "rating-plus"), ("ul", "game-plus"))
+BAD_CONTAINERS = (("div", "rating-minus"), ("ul", "game-minus"))
+GOOD_BGCOLOR = "#e2e2e2"
+BAD_BGCOLOR = "#ababab"
+
+ReviewListItem = Tuple[str, List[str]]
+
+
+def _join_items(strings: List[Optional[str]]) -> str:
+    # same as "|".join([x.string for x in ...]) of the original formatter, fails on items without a single string
+    return "|".join(strings)
+
+
+def _parse_score(string: Optional[str], content: Optional[str], next_sibling: Optional[str]) -> Optional[str]:
+    return string or content or next_sibling.split("/")[0]
+
+
+# html.parser backend (BeautifulSoup)
+
+def _soup_review_list(html: str) -> List[ReviewListItem]:
+    soup = BeautifulSoup(html, "html.parser")
+    nodes = {}
+    for element in soup.find_all("span", {"class": game_tags.keys()}):
+        url = element.parent.parent.find("a", {"class": "ar-title"})["href"]
+        nodes.setdefault(url, []).append(game_tags[element["class"][0]])
+    return list(nodes.items())
+
+
+def _soup_review_detail(html: str) -> Dict[str, Optional[str]]:
+    soup = BeautifulSoup(html, "html.parser")
+    good_container = soup.find("div", {"class": "rating-plus"}) or \
+                     soup.find("ul", {"class": "game-plus"}) or \
+                     soup.find("td", {"bgcolor": GOOD_BGCOLOR})
+    bad_container = soup.find("div", {"class": "rating-minus"}) or \
+                    soup.find("ul", {"class": "game-minus"}) or \
+                    soup.find("td", {"bgcolor": BAD_BGCOLOR})
+    score_container = soup.find("span", {"class": "bigger"}) or \
+                      soup.find("span", {"class": "rating"}) or \
+                      soup.find("strong", string=lambda t: t in SCORE_LABELS)
+    text_container = soup.find("h3", string=VERDICT_LABEL)
+
+    result = {"text": None, "good": None, "bad": None, "score": None}
+    if text_container is not None:
+        result["text"] = text_container.parent.find("p", recursive=True).string
+    if good_container is not None:
+        result["good"] = _join_items([x.string for x in good_container.find_all("li", recursive=True)])
+    if bad_container is not None:
+        result["bad"] = _join_items([x.string for x in bad_container.find_all("li", recursive=True)])
+    if score_container is not None:
+        next_sibling = score_container.next_sibling
+        result["score"] = _parse_score(score_container.string, score_container.get("content"),
+                                       next_sibling if isinstance(next_sibling, NavigableString) else None)
+    return result
+
+
+# lxml backend
+
+def _lxml_string(element) -> Optional[str]:
+    """BeautifulSoup Tag.string for lxml elements: the only text of the element or of its only child."""
+    contents = [element.text] if element.text else []
+    for child in element:
+        contents.append(child)
+        if child.tail:
+            contents.append(child.tail)
+    if len(contents) != 1:
+        return None
+    if isinstance(contents[0], str):
+        return contents[0]
+    if not isinstance(contents[0].tag, str):
+        # comments count as strings in BeautifulSoup
+        return contents[0].text
+    return _lxml_string(contents[0])
+
+
+def _lxml_class(tag: str, name: str) -> str:
+    return f'//{tag}[contains(concat(" ", normalize-space(@class), " "), " {name} ")]'
+
+
+def _lxml_first(doc, *xpaths: str):
+    for xpath in xpaths:
+        found = doc.xpath(f"({xpath})[1]")
+        if found:
+            return found[0]
+    return None
+
+
+def _lxml_review_list(html: str) -> List[ReviewListItem]:
+    import lxml.html
+
+    doc = lxml.html.fromstring(html)
+    nodes = {}
+    for element in doc.iter("span"):
+        classes = element.get("class", "").split()
+        if not any(c in game_tags for c in classes):
+            continue
+        grandparent = element.getparent().getparent()
+        title = _lxml_first(grandparent, "descendant::a[contains(concat(' ', normalize-space(@class), ' '), "
+                                         "' ar-title ')]")
+        nodes.setdefault(title.get("href"), []).append(game_tags[classes[0]])
+    return list(nodes.items())
+
+
+def _lxml_review_detail(html: str) -> Dict[str, Optional[str]]:
+    import lxml.html
+
+    doc = lxml.html.fromstring(html)
+    good_container = _lxml_first(doc, *[_lxml_class(tag, name) for tag, name in GOOD_CONTAINERS],
+                                 f'//td[@bgcolor="{GOOD_BGCOLOR}"]')
+    bad_container = _lxml_first(doc, *[_lxml_class(tag, name) for tag, name in BAD_CONTAINERS],
+                                f'//td[@bgcolor="{BAD_BGCOLOR}"]')
+    score_container = _lxml_first(doc, _lxml_class("span", "bigger"), _lxml_class("span", "rating"))
+    if score_container is None:
+        score_container = next((e for e in doc.iter("strong") if _lxml_string(e) in SCORE_LABELS), None)
+    text_container = next((e for e in doc.iter("h3") if _lxml_string(e) == VERDICT_LABEL), None)
+
+    result = {"text": None, "good": None, "bad": None, "score": None}
+    if text_container is not None:
+        result["text"] = _lxml_string(next(text_container.getparent().iter("p")))
+    if good_container is not None:
+        result["good"] = _join_items([_lxml_string(x) for x in good_container.iter("li")])
+    if bad_container is not None:
+        result["bad"] = _join_items([_lxml_string(x) for x in bad_container.iter("li")])
+    if score_container is not None:
+        result["score"] = _parse_score(_lxml_string(score_container), score_container.get("content"),
+                                       score_container.tail)
+    return result
+
+
+# selectolax backend
+
+def _selectolax_children(node) -> list:
+    children = []
+    child = node.child
+    while child is not None:
+        children.append(child)
+        child = child.next
+    return children
+
+
+def _selectolax_string(node) -> Optional[str]:
+    """BeautifulSoup Tag.string for selectolax nodes: the only text of the node or of its only child."""
+    children = _selectolax_children(node)
+    if len(children) != 1:
+        return None
+    child = children[0]
+    if child.tag == "-text":
+        return child.text(deep=False)
+    if child.tag == "-comment":
+        # comments count as strings in BeautifulSoup
+        return child.html[len("<!--"):-len("-->")]
+    return _selectolax_string(child)
+
+
+def _selectolax_review_list(html: str) -> List[ReviewListItem]:
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    nodes = {}
+    selector = ", ".join(f'span[class~="{tag}"]' for tag in game_tags)
+    for element in tree.css(selector):
+        title = element.parent.parent.css_first("a.ar-title")
+        classes = element.attributes.get("class", "").split()
+        nodes.setdefault(title.attributes.get("href"), []).append(game_tags[classes[0]])
+    return list(nodes.items())
+
+
+def _selectolax_review_detail(html: str) -> Dict[str, Optional[str]]:
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    good_container = tree.css_first("div.rating-plus") or \
+                     tree.css_first("ul.game-plus") or \
+                     tree.css_first(f'td[bgcolor="{GOOD_BGCOLOR}"]')
+    bad_container = tree.css_first("div.rating-minus") or \
+                    tree.css_first("ul.game-minus") or \
+                    tree.css_first(f'td[bgcolor="{BAD_BGCOLOR}"]')
+    score_container = tree.css_first("span.bigger") or tree.css_first("span.rating")
+    if score_container is None:
+        score_container = next((e for e in tree.css("strong") if _selectolax_string(e) in SCORE_LABELS), None)
+    text_container = next((e for e in tree.css("h3") if _selectolax_string(e) == VERDICT_LABEL), None)
+
+    result = {"text": None, "good": None, "bad": None, "score": None}
+    if text_container is not None:
+        result["text"] = _selectolax_string(text_container.parent.css_first("p"))
+    if good_container is not None:
+        result["good"] = _join_items([_selectolax_string(x) for x in good_container.css("li")])
+    if bad_container is not None:
+        result["bad"] = _join_items([_selectolax_string(x) for x in bad_container.css("li")])
+    if score_container is not None:
+        next_sibling = score_container.next
+        result["score"] = _parse_score(
+            _selectolax_string(score_container),
+            score_container.attributes.get("content"),
+            next_sibling.text(deep=False) if next_sibling is not None and next_sibling.tag == "-text" else None)
+    return result
+
+
+REVIEW_LIST_PARSERS: Dict[str, Callable[[str], List[ReviewListItem]]] = {
+    "html.parser": _soup_review_list,
+    "lxml": _lxml_review_list,
+    "selectolax": _selectolax_review_list,
+}
+
+REVIEW_DETAIL_PARSERS: Dict[str, Callable[[str], Dict[str, Optional[str]]]] = {
+    "html.parser": _soup_review_detail,
+    "lxml": _lxml_review_detail,
+    "selectolax": _selectolax_review_detail,
+}
+
+
+def parse_review_list(html: str, backend: str = DEFAULT_BACKEND) -> List[ReviewListItem]:
+    """
+    Parses list page of reviews.
+    :return: list of (review url, game tags) in the order of the page
+    """
+    return REVIEW_LIST_PARSERS[backend](html)
+
+
+def parse_review_detail(html: str, backend: str = DEFAULT_BACKEND) -> Dict[str, Optional[str]]:
+    """
+    Parses detail page of a review.
+    :return: dict with text, good, bad and score of the review (None if not found)
+    """
+    return REVIEW_DETAIL_PARSERS[backend](html)
@@ -0,0 +1,77 @@
+"""
+Created by Frantisek Sabol
+HTTP clients of the scrapers. Clients are created from the "http" settings of the sources (see constants.SOURCES):
+HTTP/2 (negotiated with the host, HTTP/1.1 is used if the host does not support it), keep-alive pool sizes
+and connect/read/write/pool timeouts, so a hung socket fails the request instead of freezing the scrape.
+ClientFactory shares one client (connection pool) per source between all scrapers of a process.
+"""
+import importlib.util
+import logging
+from typing import Optional, Dict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# seconds, pool timeout is the wait for a free connection of the pool
+DEFAULT_TIMEOUT = {"connect": 10.0, "read": 30.0, "write": 30.0, "pool": 60.0}
+DEFAULT_LIMITS = {"max_connections": 10, "max_keepalive_connections": 10, "keepalive_expiry": 30.0}
+
+
+def http2_available() -> bool:
+    """HTTP/2 support of httpx requires the h2 package (httpx[http2])."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_client(http2: bool = True,
+                  timeout: Optional[dict] = None,
+                  limits: Optional[dict] = None,
+                  **kwargs) -> httpx.AsyncClient:
+    """
+    :param http2: enable HTTP/2, falls back to HTTP/1.1 if h2 is not installed
+    :param timeout: overrides of DEFAULT_TIMEOUT (connect, read, write, pool)
+    :param limits: overrides of DEFAULT_LIMITS (max_connections, max_keepalive_connections, keepalive_expiry)
+    :param kwargs: additional keyword arguments of httpx.AsyncClient
+    """
+    if http2 and not http2_available():
+        logger.warning("HTTP/2 disabled: h2 is not installed (pip install httpx[http2])")
+        http2 = False
+    return httpx.AsyncClient(http2=http2,
+                             timeout=httpx.Timeout(**{**DEFAULT_TIMEOUT, **(timeout or {})}),
+                             limits=httpx.Limits(**{**DEFAULT_LIMITS, **(limits or {})}),
+                             **kwargs)
+
+
+class ClientFactory:
+    """
+    Creates one client per source and hands the same client to every scraper of the source,
+    scrapers do not close clients of the factory, aclose() closes all of them.
+    """
+
+    def __init__(self, http2: Optional[bool] = None, timeout: Optional[dict] = None):
+        """
+        :param http2: overrides http2 of all sources if not None
+        :param timeout: overrides of the timeouts of all sources
+        """
+        self.http2 = http2
+        self.timeout = timeout or {}
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, name: str, http: Optional[dict] = None) -> httpx.AsyncClient:
+        """
+        :param name: name of the source
+        :param http: http settings of the source (keyword arguments of create_client)
+        """
+        client = self.clients.get(name)
+        if client is None or client.is_closed:
+            http = dict(http or {})
+            if self.http2 is not None:
+                http["http2"] = self.http2
+            http["timeout"] = {**(http.get("timeout") or {}), **self.timeout}
+            client = self.clients[name] = create_client(**http)
+        return client
+
+    async def aclose(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients = {}
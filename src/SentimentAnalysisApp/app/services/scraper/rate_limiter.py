@@ -0,0 +1,191 @@
+"""
+Created by Frantisek Sabol
+Adaptive rate limiter of the scrapers. A leaky bucket whose rate adapts to the responses of the source:
+429/503 responses lower the rate and pause all requests (Retry-After or jittered exponential delay),
+a run of healthy responses probes the rate upwards again.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from typing import Optional, Dict, Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_STATUS_CODES = (HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Returns delay in seconds from the Retry-After header (seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class LeakyBucket:
+    """
+    Leaky bucket of capacity requests draining at rate requests per second (same algorithm as AsyncLimiter),
+    the rate can be changed while the bucket is in use.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = 0.0
+        self.last_leak = time.monotonic()
+
+    def leak(self):
+        now = time.monotonic()
+        self.level = max(0.0, self.level - (now - self.last_leak) * self.rate)
+        self.last_leak = now
+
+    def set_rate(self, rate: float):
+        # drain at the old rate up to now
+        self.leak()
+        self.rate = rate
+
+    def has_capacity(self, amount: float = 1) -> bool:
+        self.leak()
+        return self.level + amount <= self.capacity
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        if not self.has_capacity(amount):
+            return False
+        self.level += amount
+        return True
+
+    def wait_time(self, amount: float = 1) -> float:
+        """Seconds until the bucket has capacity for amount."""
+        return max(0.0, (self.level + amount - self.capacity) / self.rate)
+
+
+class AdaptiveRateLimiter:
+    """
+    Rate limiter of a source (or endpoint) shared by all tasks of the scraper, used as `async with limiter:`.
+    The configured rate is the starting point, the rate moves between min_rate and ceiling_factor * configured rate.
+    """
+
+    def __init__(self,
+                 max_rate: float,
+                 time_period: float = 60,
+                 name: Optional[str] = None,
+                 min_rate_factor: float = 0.1,
+                 ceiling_factor: float = 2.0,
+                 backoff_factor: float = 0.5,
+                 increase_factor: float = 1.1,
+                 increase_after: int = 50,
+                 base_delay: float = 1.0,
+                 max_delay: float = 300.0):
+        """
+        :param max_rate: number of requests per time_period, capacity of the bucket
+        :param time_period: time period in seconds
+        :param name: name used in logs and metrics
+        :param min_rate_factor: lowest rate as a fraction of the configured rate
+        :param ceiling_factor: highest probed rate as a multiple of the configured rate
+        :param backoff_factor: rate multiplier applied on 429/503 responses
+        :param increase_factor: rate multiplier applied after increase_after healthy responses in a row
+        :param base_delay: first backoff delay in seconds without Retry-After, doubled on every consecutive backoff
+        :param max_delay: cap of the backoff delay in seconds
+        """
+        self.name = name
+        self.max_rate = max_rate
+        self.configured_rate = max_rate / time_period
+        self.min_rate = self.configured_rate * min_rate_factor
+        self.max_rate_ceiling = self.configured_rate * ceiling_factor
+        self.backoff_factor = backoff_factor
+        self.increase_factor = increase_factor
+        self.increase_after = increase_after
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.rate = self.configured_rate
+        # capacity stays the same, the period is stretched so the bucket never refuses a single request
+        self.bucket = LeakyBucket(max_rate, self.rate)
+        self.paused_until = 0.0
+        self.healthy_in_row = 0
+        self.consecutive_backoffs = 0
+        self.num_backoffs = 0
+        self.num_requests = 0
+
+    @property
+    def time_period(self) -> float:
+        return self.bucket.capacity / self.bucket.rate
+
+    async def __aenter__(self):
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay <= 0:
+                # pause and capacity are checked without awaiting in between, a pause set while the task
+                # waited for capacity is honoured before the task takes its unit
+                if self.bucket.try_acquire():
+                    break
+                delay = self.bucket.wait_time()
+            await asyncio.sleep(delay)
+        self.num_requests += 1
+
+    async def __aexit__(self, *args):
+        pass
+
+    def set_rate(self, rate: float):
+        rate = min(max(rate, self.min_rate), self.max_rate_ceiling)
+        if rate == self.rate:
+            return
+        logger.info(f"rate limiter {self.name}: rate changed {self.rate:.3f} -> {rate:.3f} requests/sec")
+        self.rate = rate
+        # the rate of the bucket is changed in place, a new bucket would start empty and let a burst through
+        self.bucket.set_rate(rate)
+
+    def backoff_delay(self, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_delay) + random.uniform(0, self.base_delay)
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.consecutive_backoffs - 1))
+        # equal jitter, concurrent tasks do not come back at the same time
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def on_response(self, response: httpx.Response) -> Optional[float]:
+        """
+        Adapts the rate to the response.
+        :return: delay in seconds all requests are paused for if the source asked to back off, None otherwise
+        """
+        if response.status_code in BACKOFF_STATUS_CODES:
+            self.healthy_in_row = 0
+            self.consecutive_backoffs += 1
+            self.num_backoffs += 1
+            self.set_rate(self.rate * self.backoff_factor)
+            delay = self.backoff_delay(parse_retry_after(response.headers.get("Retry-After")))
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            logger.warning(f"rate limiter {self.name}: {response.status_code} from {response.url}, "
+                           f"pausing for {delay:.1f}s")
+            return delay
+
+        self.consecutive_backoffs = 0
+        self.healthy_in_row += 1
+        if self.healthy_in_row >= self.increase_after and self.rate < self.max_rate_ceiling:
+            self.healthy_in_row = 0
+            self.set_rate(self.rate * self.increase_factor)
+        return None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "rate": self.rate,
+            "configured_rate": self.configured_rate,
+            "requests": self.num_requests,
+            "backoffs": self.num_backoffs,
+            "paused_for": max(0.0, self.paused_until - time.monotonic()),
+        }
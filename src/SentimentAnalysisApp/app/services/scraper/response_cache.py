@@ -0,0 +1,164 @@
+"""
+Created by Frantisek Sabol
+Persistent HTTP response cache of the scrapers backed by SQLite.
+Responses are stored under a digest of the request (url + sorted query params), served without a request
+while they are younger than the TTL of the endpoint and revalidated with ETag/Last-Modified afterwards.
+The cache is bounded by size, least recently used responses are evicted first.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional, NamedTuple, Mapping, Any, Dict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+# query params which must not end up in the cache keys and stored urls
+IGNORED_PARAMS = ("api_key",)
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS response (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    content BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+CREATE_INDEX = "CREATE INDEX IF NOT EXISTS ix_response_accessed_at ON response (accessed_at)"
+
+
+class CachedResponse(NamedTuple):
+    url: str
+    status_code: int
+    content_type: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content: bytes
+    stored_at: float
+
+    def is_fresh(self, ttl: float, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.time()) - self.stored_at < ttl
+
+    def revalidation_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_response(self, url: Any = None) -> httpx.Response:
+        headers = {"content-type": self.content_type} if self.content_type is not None else {}
+        return httpx.Response(status_code=self.status_code,
+                              headers=headers,
+                              content=self.content,
+                              request=httpx.Request("GET", url if url is not None else self.url))
+
+
+class ResponseCache:
+    """
+    Size bounded LRU cache of HTTP responses stored in a SQLite database.
+    All operations are synchronous, they are short compared to the requests they replace.
+    """
+
+    def __init__(self, path: str, max_size: int = DEFAULT_MAX_SIZE):
+        """
+        :param path: path of the SQLite database file, created if it does not exist
+        :param max_size: max size of stored response bodies in bytes
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_size = max_size
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(CREATE_TABLE)
+        self.connection.execute(CREATE_INDEX)
+        self.size = self.connection.execute("SELECT coalesce(sum(size), 0) FROM response").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def canonical_url(url: Any, params: Optional[Mapping[str, Any]] = None) -> str:
+        scheme, netloc, path, query, _ = urlsplit(str(url))
+        query = parse_qsl(query, keep_blank_values=True)
+        if params:
+            query += [(k, str(v)) for k, v in params.items() if v is not None]
+        query = sorted((k, v) for k, v in query if k not in IGNORED_PARAMS)
+        return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+    @staticmethod
+    def key(url: Any, params: Optional[Mapping[str, Any]] = None) -> str:
+        return hashlib.sha256(ResponseCache.canonical_url(url, params).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        row = self.connection.execute(
+            "SELECT url, status_code, content_type, etag, last_modified, content, stored_at "
+            "FROM response WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE response SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return CachedResponse(*row)
+
+    def put(self, key: str, url: Any, response: httpx.Response):
+        content = response.content
+        if len(content) > self.max_size:
+            return
+        now = time.time()
+        old_size = self.connection.execute("SELECT size FROM response WHERE key = ?", (key,)).fetchone()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO response "
+            "(key, url, status_code, content_type, etag, last_modified, content, size, stored_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, str(url), response.status_code, response.headers.get("content-type"),
+             response.headers.get("etag"), response.headers.get("last-modified"),
+             content, len(content), now, now))
+        self.size += len(content) - (old_size[0] if old_size else 0)
+        if self.size > self.max_size:
+            self.evict()
+
+    def refresh(self, key: str):
+        """Marks the stored response as fresh again (revalidated by the server)."""
+        now = time.time()
+        self.connection.execute("UPDATE response SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+
+    def evict(self):
+        """Deletes least recently used responses until the cache fits into max_size."""
+        rows = self.connection.execute("SELECT key, size FROM response ORDER BY accessed_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.size <= self.max_size:
+                break
+            evicted.append((key,))
+            self.size -= size
+        self.connection.executemany("DELETE FROM response WHERE key = ?", evicted)
+        logger.debug(f"response cache: evicted {len(evicted)} responses, size {self.size}B")
+
+    def clear(self):
+        self.connection.execute("DELETE FROM response")
+        self.size = 0
+
+    def close(self):
+        logger.info(f"response cache: {self.hits} hits, {self.misses} misses, size {self.size}B")
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT count(*) FROM response").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": self.size, "responses": len(self)}
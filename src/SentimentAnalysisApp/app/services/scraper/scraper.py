@@ -7,19 +7,23 @@ import os
 import json
 import logging
 import random
-from bs4 import BeautifulSoup
 from pydantic import ValidationError, AnyHttpUrl
-from typing import Union, List, Callable, Tuple, Iterable, Any, Optional, AsyncGenerator
+from typing import Union, List, Callable, Tuple, Iterable, Any, Optional, AsyncGenerator, Set
 import httpx
 from http import HTTPStatus
-from httpx import ConnectTimeout, ConnectError, URL, Response
-from .doupe_resources import DoupeReviewsRequestParams, game_tags, DoupeReview, MAX_PAGE, MAX_PER_PAGE
-from .constants import ContentType, STEAM_API_RATE_LIMIT, SOURCES, SourceName, DEFAULT_RATE_LIMIT, ScrapingResource
+from httpx import URL, Response
+from .doupe_resources import DoupeReviewsRequestParams, DoupeReview, MAX_PAGE, MAX_PER_PAGE
+from .doupe_parser import parse_review_list, parse_review_detail, DEFAULT_BACKEND
+from .constants import (ContentType, STEAM_API_RATE_LIMIT, SOURCES, SourceName, DEFAULT_RATE_LIMIT, ScrapingResource,
+                        STEAM_REVIEWS_RETRIES)
+from .response_cache import ResponseCache
+from .http_client import ClientFactory, create_client
+from .rate_limiter import AdaptiveRateLimiter, BACKOFF_STATUS_CODES
 from .steam_resources import (SteamAppDetail,
                               SteamAppDetailResponse,
                               SteamAppReviewsResponse,
                               SteamAppListResponse,
-                              SteamApp, SteamReview, SteamWebApiLanguageCodes)
+                              SteamApp, SteamReview, SteamWebApiLanguageCodes, parse_reviews_response)
 
 from .gamespot_resources import (GamespotRequestParams,
                                  GamespotFilterParam,
@@ -30,11 +34,14 @@ from .gamespot_resources import (GamespotRequestParams,
                                  GamespotReview,
                                  GamespotApiResponse, SortDirection)
 
-from aiolimiter import AsyncLimiter
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 
 logger = logging.getLogger()
 
+# response extension with the cache key and url of a response waiting for validation (see Scraper.cached_get)
+CACHE_ENTRY = "response_cache_entry"
+
 
 class Scraper:
     """
@@ -69,6 +76,11 @@ class Scraper:
             api_key: Optional[str] = None,
             session: Union[httpx.AsyncClient, None] = None,
             rate_limit: dict = None,
+            cache: Optional[ResponseCache] = None,
+            cache_ttl: Optional[int] = None,
+            parse_workers: Optional[int] = 0,
+            http: Optional[dict] = None,
+            client_factory: Optional[ClientFactory] = None,
             **kwargs):
         """
         :param url: Base url of the website
@@ -83,8 +95,16 @@ class Scraper:
         :param is_api: Boolean to indicate if the source is an api
         :param auth: Boolean to indicate if the source requires authentication
         :param api_key: API key for the source
-        :param session: httpx session
+        :param session: httpx session, created from the http settings when the scraper is entered if None
         :param rate_limit: Rate limit for the source
+        :param cache: Persistent response cache, requests are not cached if None
+        :param cache_ttl: Default time to live of cached responses in seconds, endpoints can override it
+                          with their own cache_ttl. Responses without ttl are never cached.
+        :param parse_workers: Number of processes parsing responses off the event loop (see parse),
+                              None for the number of cpus, 0 parses on the event loop
+        :param http: HTTP/2, keep-alive limits and timeouts of the source (keyword arguments of create_client)
+        :param client_factory: factory of clients shared by scrapers of the same source, the scraper creates and
+                               closes its own client if None
         :param kwargs: Additional keyword arguments
         """
 
@@ -103,7 +123,28 @@ class Scraper:
         self.auth = auth
         self.api_key = api_key
         self.session: Union[httpx.AsyncClient, None] = session
-        self.rate_limit = AsyncLimiter(**rate_limit)
+        self.http = http or {}
+        self.client_factory = client_factory
+        # clients of the factory are shared with other scrapers and closed by the factory
+        self.owns_session = True
+        # limiters adapt their rate to 429/503 responses of the source
+        self.rate_limit = AdaptiveRateLimiter(name=str(url), **rate_limit)
+        # endpoints with their own rate budget get a separate limiter shared by all tasks using the scraper
+        self.endpoint_rate_limits = {
+            name: AdaptiveRateLimiter(name=f"{url} {name}", **endpoint["rate_limit"])
+            for name, endpoint in self.endpoints.items() if endpoint.get("rate_limit") is not None
+        }
+
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+
+        self.parse_workers = parse_workers
+        self.parse_executor: Optional[ProcessPoolExecutor] = None
+
+        # urls of pages which could not be scraped, kept for the retry pass
+        self.failed_urls: List[str] = []
+        # key of the page yielded last by the page generators (page number or offset), used for checkpoints
+        self.page_key: Optional[str] = None
 
         self.default_request_params = {"api_key": self.api_key} if self.api_key is not None else {}
         self.headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:107.0) Gecko/20100101 Firefox/107.0"
@@ -113,13 +154,110 @@ class Scraper:
 
         self.scraper_task = None
 
+    def get_rate_limit(self, endpoint: Optional[str] = None) -> AdaptiveRateLimiter:
+        """
+        Returns limiter for the endpoint if the endpoint has its own rate budget, otherwise the source limiter.
+        """
+        return self.endpoint_rate_limits.get(endpoint, self.rate_limit)
+
+    def rate_metrics(self) -> List[dict]:
+        """Current rates of the limiters of the scraper."""
+        return [self.rate_limit.metrics()] + [limiter.metrics() for limiter in self.endpoint_rate_limits.values()]
+
+    async def limited_get(self, url, endpoint: Optional[str] = None, **kwargs) -> Response:
+        """GET request under the rate limit of the endpoint, the limiter adapts its rate to the response."""
+        limiter = self.get_rate_limit(endpoint)
+        async with limiter:
+            response = await self.session.get(url, **kwargs)
+        limiter.on_response(response)
+        return response
+
+    def get_cache_ttl(self, endpoint: Optional[str] = None) -> Optional[int]:
+        """
+        Returns time to live of cached responses of the endpoint in seconds, the source default otherwise.
+        """
+        if endpoint in self.endpoints and "cache_ttl" in self.endpoints[endpoint]:
+            return self.endpoints[endpoint]["cache_ttl"]
+        return self.cache_ttl
+
+    async def cached_get(self, url, endpoint: Optional[str] = None, **kwargs) -> Response:
+        """
+        GET request under the rate limit of the endpoint which goes through the response cache.
+        Fresh cached responses are returned without a request, stale ones are revalidated with
+        If-None-Match/If-Modified-Since and returned if the server answers 304 Not Modified.
+        New 200 responses are stored by handle_response/parse (store_response) only once they pass validation,
+        error payloads returned with 200 are not replayed from the cache.
+        """
+        ttl = self.get_cache_ttl(endpoint)
+        if self.cache is None or ttl is None:
+            return await self.limited_get(url, endpoint=endpoint, **kwargs)
+
+        key = self.cache.key(url, kwargs.get("params"))
+        cached = self.cache.get(key)
+        if cached is not None and cached.is_fresh(ttl):
+            logger.log(logging.DEBUG, f"cache hit: {cached.url}")
+            return cached.to_response()
+
+        if cached is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **cached.revalidation_headers()}
+        response = await self.limited_get(url, endpoint=endpoint, **kwargs)
+
+        if cached is not None and response.status_code == HTTPStatus.NOT_MODIFIED:
+            logger.log(logging.DEBUG, f"cache revalidated: {cached.url}")
+            self.cache.refresh(key)
+            return cached.to_response(response.url)
+        if response.status_code == HTTPStatus.OK:
+            response.extensions[CACHE_ENTRY] = (key, self.cache.canonical_url(url, kwargs.get("params")))
+        return response
+
+    def store_response(self, response: Response):
+        """Stores the response fetched by cached_get in the response cache, called once it passed validation."""
+        entry = response.extensions.pop(CACHE_ENTRY, None)
+        if entry is not None and self.cache is not None:
+            self.cache.put(*entry, response)
+
     async def __aenter__(self):
         if self.session is None:
-            self.session = httpx.AsyncClient(timeout=None)
+            if self.client_factory is not None:
+                self.session = self.client_factory.get(str(self.url), self.http)
+                self.owns_session = False
+            else:
+                self.session = create_client(**self.http)
+        if self.parse_workers != 0:
+            self.parse_executor = ProcessPoolExecutor(max_workers=self.parse_workers)
         return self
 
     async def __aexit__(self, *args):
-        await self.session.aclose()
+        if self.parse_executor is not None:
+            self.parse_executor.shutdown(wait=False, cancel_futures=True)
+            self.parse_executor = None
+        if self.owns_session:
+            await self.session.aclose()
+
+    async def parse(self, response: httpx.Response, validator: Callable, parser: Callable, *args) -> Any:
+        """
+        Async counterpart of handle_response for CPU heavy formatters: validates the response and runs
+        parser(*args) in the process pool, on the event loop if there is none.
+        Parser must be a module level function of picklable arguments (eg. the response body).
+        Same logging, None on failure and caching of valid responses as handle_response.
+        """
+        if not validator(response):
+            logger.log(logging.INFO, f"Validation failed for response from {response.url}.")
+            return None
+        try:
+            if self.parse_executor is None:
+                result = parser(*args)
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(self.parse_executor, parser, *args)
+            if result is not None:
+                self.store_response(response)
+            return result
+        except ValidationError as e:
+            logger.log(logging.INFO, f"Validation failed for response from {response.url}.")
+            logger.log(logging.DEBUG, e)
+        except Exception as e:
+            logger.log(logging.INFO, f"Unexpected response error? {response.url}.")
+            logger.log(logging.DEBUG, e)
 
     def handle_response(
             self,
@@ -129,13 +267,20 @@ class Scraper:
             validator_params: dict = None,
             formatter_params: dict = None,
     ) -> Any:
+        """
+        Validates the response and returns it formatted, None if validation or formatting fails.
+        Responses formatted to a value are stored in the response cache.
+        """
         if validator_params is None:
             validator_params = {}
         if formatter_params is None:
             formatter_params = {}
         if validator(response, **validator_params):
             try:
-                return formatter(response, **formatter_params)
+                result = formatter(response, **formatter_params)
+                if result is not None:
+                    self.store_response(response)
+                return result
 
             except ValidationError as e:
                 logger.log(logging.INFO, f"Validation failed for response from {response.url}.")
@@ -149,19 +294,26 @@ class Scraper:
             logger.log(logging.INFO, f"Validation failed for response from {response.url}.")
             logger.log(logging.DEBUG, response.text)
 
-    async def get_retry(self, url, retries: int = 3, **kwargs):
+    async def get_retry(self, url, retries: int = 3, endpoint: Optional[str] = None, **kwargs):
+        """
+        GET request retried on connection errors and on 429/503 responses.
+        Retries after 429/503 wait until the limiter of the endpoint stops backing off.
+        """
         response = None
         for retry in range(retries):
-            async with self.rate_limit:
-                try:
-                    response = await self.session.get(url, **kwargs)
-                except (TimeoutError, ConnectTimeout, ConnectError, AssertionError):
-                    if response is not None:
-                        logger.log(logging.INFO, f"api call:{response.url} TIMED OUT! retry: {retry + 1}")
-                    continue
-                else:
-                    logger.log(logging.INFO, f"api call:{response.url}")
-                    break
+            try:
+                response = await self.cached_get(url, endpoint=endpoint, **kwargs)
+            except (TimeoutError, httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError,
+                    AssertionError):
+                if response is not None:
+                    logger.log(logging.INFO, f"api call:{response.url} TIMED OUT! retry: {retry + 1}")
+                continue
+            if response.status_code in BACKOFF_STATUS_CODES:
+                logger.log(logging.INFO, f"api call:{response.url} returned {response.status_code}! "
+                                         f"retry: {retry + 1}")
+                continue
+            logger.log(logging.INFO, f"api call:{response.url}")
+            break
 
         if response is None:
             logger.error(f"Could not establish connection to {url}.")
@@ -170,8 +322,15 @@ class Scraper:
 
         return response
 
+    def add_failed_url(self, url: Any):
+        # api keys must not end up in the stored urls, they are added again by the retry pass
+        self.failed_urls.append(ResponseCache.canonical_url(url))
+
     async def review_page_generator(self, page_size: int = 100, params: dict = None):
         raise NotImplementedError
+
+    async def failed_pages_generator(self, urls: List[str]):
+        raise NotImplementedError
     async def get_all_reviews(self):
         raise NotImplementedError
 
@@ -197,17 +356,32 @@ class Scraper:
 class SteamScraper(Scraper):
     _source = SOURCES[SourceName.STEAM]
 
-    def __init__(self, api_key: str = None, rate_limit: dict = None):
+    def __init__(self, api_key: str = None, rate_limit: dict = None, cache: Optional[ResponseCache] = None,
+                 trusted_validation: bool = False, parse_workers: Optional[int] = 0,
+                 client_factory: Optional[ClientFactory] = None):
+        """
+        :param trusted_validation: build reviews without pydantic validation (SteamReview.construct_trusted)
+        :param parse_workers: number of processes decoding and validating review pages off the event loop,
+                              None for the number of cpus, 0 validates on the event loop
+        """
         if rate_limit is not None:
             self._source["rate_limit"] = rate_limit
         super().__init__(content_type=ContentType.JSON,
                          is_api=True,
                          api_key=api_key,
+                         cache=cache,
+                         parse_workers=parse_workers,
+                         client_factory=client_factory,
                          **self._source
                          )
+        self.trusted_validation = trusted_validation
+        # last cursor received for each game (appid -> cursor)
+        self.review_cursors = {}
+        # games whose last cursor chain stopped at a page which could not be fetched (appid)
+        self.incomplete_review_chains: Set[str] = set()
 
     async def get_games(self) -> List[str]:
-        response = await self.session.get(self.list_of_games_url)
+        response = await self.get_retry(self.list_of_games_url, endpoint="list_of_games")
         result = self.handle_response(response,
                                       self.json_response_validator,
                                       lambda r: SteamAppListResponse.parse_obj(r.json()).apps)
@@ -231,9 +405,8 @@ class SteamScraper(Scraper):
             "language": SteamWebApiLanguageCodes.ENGLISH.value,
         }
 
-        async with self.rate_limit:
-            logger.log(logging.DEBUG, f"Api call: get_game_info")
-            response = await self.session.get(self.game_detail_url, params=params)
+        logger.log(logging.DEBUG, f"Api call: get_game_info")
+        response = await self.get_retry(self.game_detail_url, endpoint="game_detail", params=params)
 
         return self.handle_response(response,
                                     self.json_response_validator,
@@ -275,9 +448,8 @@ class SteamScraper(Scraper):
             yield result
 
     @staticmethod
-    def game_reviews_formatter(r):
-        result = r.json()
-        return SteamAppReviewsResponse.parse_obj(result)
+    def game_reviews_formatter(r, trusted: bool = False):
+        return parse_reviews_response(r.content, trusted)
         # if not result.get("success", 0) == 1:
         #     raise StopAsyncIteration(result.get("error"))
         # if result["query_summary"].get("total_reviews"):
@@ -293,7 +465,19 @@ class SteamScraper(Scraper):
                                           purchase_type: Optional[str] = "all",
                                           cursor: Optional[str] = "*",
                                           max_reviews: Optional[int] = 100,
+                                          known_review_ids: Optional[Set[str]] = None,
+                                          updated_since: Optional[int] = None,
                                           **kwargs) -> AsyncGenerator[List[SteamReview], None]:
+        """
+        Yields pages of reviews of the game following the cursor chain.
+        Incremental refresh: with known_review_ids and/or updated_since (unix timestamp of the newest
+        timestamp_updated already stored) only new reviews are yielded and the generator stops at the first page
+        which contains only already known reviews.
+        The last received cursor is kept in self.review_cursors[game_id].
+        If a page still fails after STEAM_REVIEWS_RETRIES, the generator stops and the game is added to
+        self.incomplete_review_chains, the chain can be continued from self.review_cursors[game_id].
+        """
+        self.incomplete_review_chains.discard(str(game_id))
         reviews_processed = 0
         if max_reviews is None:
             max_reviews = 100000000
@@ -309,18 +493,17 @@ class SteamScraper(Scraper):
         }
         params = {k: v for k, v in params.items() if v is not None}
         while reviews_processed < max_reviews:
-            async with self.rate_limit:
-                try:
-                    response = await self.session.get(f"{self.user_reviews_url}/{game_id}", params=params)
-                except (TimeoutError, ConnectTimeout, ConnectError, AssertionError):
-                    continue
+            response = await self.get_retry(f"{self.user_reviews_url}/{game_id}", endpoint="user_reviews",
+                                            retries=STEAM_REVIEWS_RETRIES, params=params)
 
             logger.debug(f"api call: game {game_id}: {response.url}")
-            result: SteamAppReviewsResponse = self.handle_response(response,
-                                                                   validator=self.json_response_validator,
-                                                                   formatter=self.game_reviews_formatter)
+            result: SteamAppReviewsResponse = await self.parse(response, self.json_response_validator,
+                                                               parse_reviews_response, response.content,
+                                                               self.trusted_validation)
             if result is None:
-                logger.debug(f"no result StopAsyncIteration ")
+                logger.warning(f"game {game_id}: page {params.get('cursor')} could not be scraped, "
+                               f"cursor chain is incomplete")
+                self.incomplete_review_chains.add(str(game_id))
                 break
 
             reviews, num_reviews, cursor = result.reviews, result.query_summary.num_reviews, result.cursor
@@ -334,8 +517,18 @@ class SteamScraper(Scraper):
                 continue
 
             params["cursor"] = cursor
+            self.review_cursors[str(game_id)] = cursor
             reviews_processed += num_reviews
 
+            if known_review_ids is not None or updated_since is not None:
+                new_reviews = [r for r in reviews
+                               if (known_review_ids is None or r.recommendationid not in known_review_ids)
+                               and (updated_since is None or r.timestamp_updated > updated_since)]
+                if not new_reviews:
+                    logger.debug(f"game {game_id}: page contains only known reviews, StopAsyncIteration")
+                    break
+                reviews = new_reviews
+
             if reviews_processed >= max_reviews:
                 reviews = reviews[:max_reviews]
                 logger.debug(f"max_reviews StopAsyncIteration")
@@ -374,12 +567,15 @@ class SteamScraper(Scraper):
 class GamespotScraper(Scraper):
     _source = SOURCES[SourceName.GAMESPOT]
 
-    def __init__(self, api_key: str, rate_limit: dict = None):
+    def __init__(self, api_key: str, rate_limit: dict = None, cache: Optional[ResponseCache] = None,
+                 client_factory: Optional[ClientFactory] = None):
         if rate_limit is not None:
             self._source["rate_limit"] = rate_limit
         super().__init__(content_type=ContentType.JSON,
                          is_api=True,
                          api_key=api_key,
+                         cache=cache,
+                         client_factory=client_factory,
                          **self._source)
         self.api_key = api_key
 
@@ -397,14 +593,21 @@ class GamespotScraper(Scraper):
 
     async def get_reviews_page(self, params: GamespotRequestParams) -> Tuple[URL, Optional[GamespotApiResponse]]:
         response = await self.get_retry(self.critic_reviews_url,
+                                        endpoint="critic_reviews",
                                         headers=self.headers,
                                         params=params.dict(exclude_none=True))
         return response.url, self.handle_response(response,
                                                   validator=self.json_response_validator,
                                                   formatter=self.game_reviews_formatter)
 
-    async def game_reviews_page_generator(self, max_reviews: Optional[int] = 100
+    async def game_reviews_page_generator(self, max_reviews: Optional[int] = 100,
+                                          skip_pages: Optional[Set[str]] = None
                                           ) -> AsyncGenerator[List[GamespotReview], None]:
+        """
+        Yields pages of reviews, self.page_key is the offset of the yielded page.
+        :param skip_pages: offsets of pages which were already scraped (resumed job)
+        """
+        skip_pages = skip_pages or set()
         params = GamespotRequestParams(
             api_key=self.api_key,
             sort=GamespotSortParam(
@@ -413,26 +616,47 @@ class GamespotScraper(Scraper):
         )
         url, result = await self.get_reviews_page(params=params)
         if result is None:
+            self.add_failed_url(url)
             return
-        yield result.results
+        if "0" not in skip_pages:
+            self.page_key = "0"
+            yield result.results
         logger.log(logging.INFO, f"Number of all reviews: {result.number_of_total_results}")
         if max_reviews is None or max_reviews > result.number_of_total_results:
             max_reviews = result.number_of_total_results
         if result.number_of_page_results < params.limit:
             return
 
-        tasks = [self.get_reviews_page(params=params.copy(update={"offset": offset}))
-                 for offset in range(result.number_of_page_results, max_reviews, params.limit)]
-        failed_urls = []
+        async def get_page(offset: int):
+            url, result = await self.get_reviews_page(params=params.copy(update={"offset": offset}))
+            return offset, url, result
+
+        tasks = [get_page(offset)
+                 for offset in range(result.number_of_page_results, max_reviews, params.limit)
+                 if str(offset) not in skip_pages]
         for future in asyncio.as_completed(tasks):
-            try:
-                url, result = await future
-            except ValueError as e:
-                failed_urls.append(url)
+            offset, url, result = await future
             if result is None:
-                failed_urls.append(url)
+                self.add_failed_url(url)
                 continue
             logger.info(f"api call:{url}\n{' ' * 30} returned {len(result.results)} reviews")
+            self.page_key = str(offset)
+            yield [r for r in result.results if r.game is not None]
+
+    async def failed_pages_generator(self, urls: List[str]) -> AsyncGenerator[List[GamespotReview], None]:
+        """Retries pages which failed before, pages failing again are added to self.failed_urls."""
+        for url in urls:
+            response = await self.get_retry(url,
+                                            endpoint="critic_reviews",
+                                            headers=self.headers,
+                                            params=self.default_request_params)
+            result = self.handle_response(response,
+                                          validator=self.json_response_validator,
+                                          formatter=self.game_reviews_formatter)
+            if result is None:
+                self.add_failed_url(url)
+                continue
+            self.page_key = None
             yield [r for r in result.results if r.game is not None]
 
     async def get_game_info(self, game_id: Union[int, str]) -> Optional[GamespotGame]:
@@ -460,78 +684,66 @@ class GamespotScraper(Scraper):
 class DoupeScraper(Scraper):
     _source = SOURCES[SourceName.DOUPE]
 
-    def __init__(self, api_key: str = None, rate_limit: dict = None):
+    def __init__(self, api_key: str = None, rate_limit: dict = None, cache: Optional[ResponseCache] = None,
+                 parser_backend: str = DEFAULT_BACKEND, parse_workers: Optional[int] = None,
+                 client_factory: Optional[ClientFactory] = None):
+        """
+        :param parser_backend: html parser of the pages, one of doupe_parser.BACKENDS
+        :param parse_workers: number of processes parsing the pages off the event loop,
+                              None for the number of cpus, 0 parses on the event loop
+        """
         if rate_limit is not None:
             self._source["rate_limit"] = rate_limit
         super().__init__(content_type=ContentType.JSON,
                          is_api=False,
                          api_key=api_key,
+                         cache=cache,
+                         parse_workers=parse_workers,
+                         client_factory=client_factory,
                          **self._source)
+        self.parser_backend = parser_backend
 
-    @staticmethod
-    def game_reviews_formatter(r) -> Optional[List[DoupeReview]]:
-        soup = BeautifulSoup(r.text, "html.parser")
-        nodes = {}
-        reviews = []
-        for element in soup.find_all("span", {"class": game_tags.keys()}):
-            url = element.parent.parent.find("a", {"class": "ar-title"})["href"]
-            tags = nodes.get(url)
-            if tags is None:
-                nodes[url] = []
-                tags = nodes[url]
-            tags.append(game_tags[element["class"][0]])
-
-        for url, tags in nodes.items():
-            reviews.append(DoupeReview(url=url, tags=tags))
-        return reviews
+    async def parse_html(self, parser: Callable, response: httpx.Response) -> Any:
+        """Parses the html page with the parser backend in the process pool."""
+        return await self.parse(response, self.html_response_validator, parser, response.text, self.parser_backend)
 
     @staticmethod
-    def game_review_formatter(r, review=None) -> Optional[DoupeReview]:
-        soup = BeautifulSoup(r.text, "html.parser")
-        # all_json_data = soup.find_all('script', attrs={'type':'application/ld+json'})
-        good_container = soup.find("div", {"class": "rating-plus"}) or \
-                         soup.find("ul", {"class": "game-plus"}) or \
-                         soup.find("td", {"bgcolor": "#e2e2e2"})
-
-        bad_container = soup.find("div", {"class": "rating-minus"}) or \
-                        soup.find("ul", {"class": "game-minus"}) or \
-                        soup.find("td", {"bgcolor": "#ababab"})
-
-        score_container = soup.find("span", {"class": "bigger"}) or \
-                          soup.find("span", {"class": "rating"}) or \
-                          soup.find("strong",
-                                    string=lambda t: t in ("Závěrečné hodnocení:",
-                                                           "Celkové hodnocení:"))
-
-        # text_container = soup.find("div", {"class": "infobox-data"})
-        text_container = soup.find("h3", string="Verdikt")
-
-        if text_container is not None:
-            review.text = text_container.parent.find("p", recursive=True).string
-        if good_container is not None:
-            review.good = "|".join([x.string for x in good_container.find_all("li", recursive=True)])
-        if bad_container is not None:
-            review.bad = "|".join([x.string for x in bad_container.find_all("li", recursive=True)])
-        if score_container is not None:
-            review.score = score_container.string or \
-                           score_container.get("content") or \
-                           score_container.next_sibling.split("/")[0]
+    def apply_review_detail(review: DoupeReview, detail: dict) -> DoupeReview:
+        for field in ("text", "good", "bad", "score"):
+            if detail.get(field) is not None:
+                setattr(review, field, detail[field])
         if review.text is None:
             review.text = ""
         return review
 
+    @staticmethod
+    def game_reviews_formatter(r, backend: str = DEFAULT_BACKEND) -> Optional[List[DoupeReview]]:
+        return [DoupeReview(url=url, tags=tags) for url, tags in parse_review_list(r.text, backend)]
+
+    @staticmethod
+    def game_review_formatter(r, review=None, backend: str = DEFAULT_BACKEND) -> Optional[DoupeReview]:
+        return DoupeScraper.apply_review_detail(review, parse_review_detail(r.text, backend))
+
     async def get_reviews_page(self, params: DoupeReviewsRequestParams):
         exclude = {"pgnum"} if params.pgnum == 1 else {}
         response = await self.get_retry(self.critic_reviews_url,
+                                        endpoint="critic_reviews",
                                         headers=self.headers,
                                         params=params.dict(exclude=exclude, exclude_none=True)
                                         )
-        return response.url, self.handle_response(response,
-                                                  validator=self.html_response_validator,
-                                                  formatter=self.game_reviews_formatter)
-
-    async def game_reviews_page_generator(self, max_reviews: int = 100, max_pages: int = MAX_PAGE) -> AsyncGenerator[
-        List[GamespotReview], None]:
+        items = await self.parse_html(parse_review_list, response)
+        if items is None:
+            return response.url, None
+        return response.url, [DoupeReview(url=url, tags=tags) for url, tags in items]
+
+    async def game_reviews_page_generator(self, max_reviews: int = 100, max_pages: int = MAX_PAGE,
+                                          skip_pages: Optional[Set[str]] = None
+                                          ) -> AsyncGenerator[List[DoupeReview], None]:
+        """
+        Yields pages of reviews with their details, self.page_key is the number of the yielded page.
+        :param skip_pages: numbers of pages which were already scraped (resumed job)
+        """
+        skip_pages = skip_pages or set()
         params = DoupeReviewsRequestParams(
             pgnum=1
         )
@@ -539,16 +751,33 @@ class DoupeScraper(Scraper):
             max_pages = int(max_reviews / MAX_PER_PAGE) * 2
             if max_pages > max_pages:
                 max_pages = max_pages
-        tasks = [self.get_reviews_page(params=params.copy(update={"pgnum": page_num}))
-                 for page_num in range(1, max_pages)]
-        failed_urls = []
+
+        async def get_page(page_num: int):
+            url, result = await self.get_reviews_page(params=params.copy(update={"pgnum": page_num}))
+            return page_num, url, result
+
+        tasks = [get_page(page_num) for page_num in range(1, max_pages) if str(page_num) not in skip_pages]
         for future in asyncio.as_completed(tasks):
-            url, result = await future
+            page_num, url, result = await future
             if result is None:
-                failed_urls.append(url)
+                self.add_failed_url(url)
                 continue
             await self.get_reviews_detail(result)
             logger.info(f"api call:{url}\n{' ' * 30} returned {len(result)} reviews")
+            self.page_key = str(page_num)
+            yield result
+
+    async def failed_pages_generator(self, urls: List[str]) -> AsyncGenerator[List[DoupeReview], None]:
+        """Retries pages which failed before, pages failing again are added to self.failed_urls."""
+        for url in urls:
+            response = await self.get_retry(url, endpoint="critic_reviews", headers=self.headers)
+            items = await self.parse_html(parse_review_list, response)
+            if items is None:
+                self.add_failed_url(url)
+                continue
+            result = [DoupeReview(url=review_url, tags=tags) for review_url, tags in items]
+            await self.get_reviews_detail(result)
+            self.page_key = None
             yield result
 
     async def get_reviews_detail(self, reviews: List[DoupeReview]) -> List[DoupeReview]:
@@ -560,8 +789,7 @@ class DoupeScraper(Scraper):
     async def get_review_detail(self, review: DoupeReview) -> Tuple[URL, Optional[DoupeReview]]:
         response = await self.get_retry(review.url,
                                         headers=self.headers)
-
-        return URL(review.url), self.handle_response(response,
-                                                     validator=self.html_response_validator,
-                                                     formatter=self.game_review_formatter,
-                                                     formatter_params={"review": review})
+        detail = await self.parse_html(parse_review_detail, response)
+        if detail is None:
+            return URL(review.url), None
+        return URL(review.url), self.apply_review_detail(review, detail)
@@ -2,13 +2,20 @@
 Created by Frantisek Sabol
 Steam scraper resources used for data validation and transformation
 """
-
+import json
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Union, List
+from typing import Optional, Union, List, Callable
 
 from pydantic import BaseModel, Field, validator, root_validator
 
+try:
+    import orjson
+
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 
 class SteamApiLanguageCodes(str, Enum):
     ARABIC = "arabic"
@@ -74,6 +81,9 @@ class SteamWebApiLanguageCodes(str, Enum):
     VIETNAMESE = "vn"
 
 
+STEAM_LANGUAGES = {x.value for x in SteamApiLanguageCodes} | {x.value for x in SteamWebApiLanguageCodes}
+
+
 class SteamReviewQuerySummary(BaseModel):
     __name__ = "query_summary"
     num_reviews: int
@@ -102,6 +112,18 @@ class SteamReviewer(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
+    @classmethod
+    def construct_trusted(cls, values: dict) -> "SteamReviewer":
+        return cls.construct(
+            steamid=str(values["steamid"]),
+            num_games_owned=int(values["num_games_owned"]),
+            num_reviews=int(values["num_reviews"]),
+            playtime_forever=values.get("playtime_forever"),
+            playtime_last_two_weeks=values.get("playtime_last_two_weeks"),
+            playtime_at_review=values.get("playtime_at_review", 0),
+            last_played=values.get("last_played"),
+        )
+
 
 class SteamReview(BaseModel):
     recommendationid: str = Field(alias="source_review_id")
@@ -132,6 +154,36 @@ class SteamReview(BaseModel):
         use_enum_values = True
         allow_population_by_field_name = True
 
+    @classmethod
+    def construct_trusted(cls, values: dict) -> "SteamReview":
+        """
+        Builds the review without pydantic validation from a review of the Steam API.
+        Only the fields the types of which Steam does not guarantee (ids, language, score) are checked and converted,
+        missing required fields raise KeyError.
+        """
+        language = values["language"]
+        if language not in STEAM_LANGUAGES:
+            raise ValueError(f"Unknown language: {language}")
+        author = SteamReviewer.construct_trusted(values["author"])
+        return cls.construct(
+            recommendationid=str(values["recommendationid"]),
+            author=author,
+            language=language,
+            review=values["review"],
+            timestamp_created=values["timestamp_created"],
+            timestamp_updated=values["timestamp_updated"],
+            voted_up=bool(values["voted_up"]),
+            votes_up=values["votes_up"],
+            votes_funny=values["votes_funny"],
+            weighted_vote_score=str(values["weighted_vote_score"]),
+            comment_count=values["comment_count"],
+            steam_purchase=bool(values["steam_purchase"]),
+            received_for_free=bool(values["received_for_free"]),
+            written_during_early_access=bool(values["written_during_early_access"]),
+            source_reviewer_id=author.steamid,
+            playtime_at_review=author.playtime_at_review,
+        )
+
 
 class SteamMetacriticReview(BaseModel):
     score: int
@@ -198,6 +250,33 @@ class SteamAppReviewsResponse(BaseModel):
         else:
             raise ValueError(f"Response status: {value}")
 
+    @classmethod
+    def construct_trusted(cls, values: dict) -> "SteamAppReviewsResponse":
+        """Builds the response without pydantic validation, see SteamReview.construct_trusted."""
+        if values.get("success") != 1:
+            raise ValueError(f"Response status: {values.get('success')}")
+        return cls.construct(
+            success=1,
+            cursor=values.get("cursor", "*"),
+            reviews=[SteamReview.construct_trusted(review) for review in values["reviews"]],
+            query_summary=SteamReviewQuerySummary.parse_obj(values["query_summary"]),
+            error=values.get("error", ""),
+        )
+
+
+def parse_reviews_response(content: bytes, trusted: bool = False, loads: Callable = json_loads
+                           ) -> SteamAppReviewsResponse:
+    """
+    Decodes (orjson if installed) and validates the body of a Steam reviews response.
+    Module level function working on bytes, so it can run in a process pool.
+    :param trusted: skip pydantic validation of the reviews (SteamAppReviewsResponse.construct_trusted)
+    :param loads: json decoder
+    """
+    values = loads(content)
+    if trusted:
+        return SteamAppReviewsResponse.construct_trusted(values)
+    return SteamAppReviewsResponse.parse_obj(values)
+
 
 class SteamAppDetailResponse(BaseModel):
     success: bool
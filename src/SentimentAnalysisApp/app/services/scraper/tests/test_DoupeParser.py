@@ -0,0 +1,63 @@
+"""
+Created by Frantisek Sabol
+Tests for the parser backends of DoupeScraper on saved doupe.cz pages.
+"""
+import os
+
+import httpx
+import pytest
+
+from ..doupe_parser import BACKENDS, parse_review_list, parse_review_detail
+from ..doupe_resources import DoupeReview
+from ..scraper import DoupeScraper
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "pages", "doupe")
+DETAIL_PAGES = ("review_detail_modern.html", "review_detail_game_info.html", "review_detail_legacy.html")
+
+
+def read_page(name: str) -> str:
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_review_list_parity(backend):
+    html = read_page("list_page.html")
+    items = parse_review_list(html, backend)
+    assert items == parse_review_list(html, "html.parser")
+    assert len(items) == 36
+    assert items[0] == ("https://doupe.zive.cz/clanek/recenze-hra-0-1000", ["Platform", "Strategy"])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("page", DETAIL_PAGES)
+def test_review_detail_parity(backend, page):
+    html = read_page(page)
+    assert parse_review_detail(html, backend) == parse_review_detail(html, "html.parser")
+
+
+def test_review_detail_values():
+    detail = parse_review_detail(read_page("review_detail_modern.html"))
+    assert detail == {"text": "Zábavná hra, kterou kazí technické problémy.",
+                      "good": "příběh|hudba|grafika",
+                      "bad": "chyby|délka",
+                      "score": "8"}
+    assert parse_review_detail(read_page("review_detail_game_info.html"))["score"] == "75"
+    assert parse_review_detail(read_page("review_detail_legacy.html"))["good"] == "atmosféra|hádanky"
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("parse_workers", [0, 1])
+async def test_get_review_detail_parsed_off_event_loop(parse_workers):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text=read_page("review_detail_modern.html"),
+                              headers={"content-type": "text/html; charset=utf-8"})
+
+    scraper = DoupeScraper(parse_workers=parse_workers)
+    scraper.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    async with scraper:
+        assert (scraper.parse_executor is None) == (parse_workers == 0)
+        review = DoupeReview(url="https://doupe.zive.cz/clanek/recenze-hra-0-1000")
+        _, review = await scraper.get_review_detail(review)
+    assert review.score == "8"
+    assert review.bad == "chyby|délka"
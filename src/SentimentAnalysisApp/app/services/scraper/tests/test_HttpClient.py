@@ -0,0 +1,50 @@
+"""
+Created by Frantisek Sabol
+Tests for the http clients of the scrapers.
+"""
+import httpx
+import pytest
+
+from ..http_client import ClientFactory, create_client, DEFAULT_TIMEOUT
+from ..scraper import SteamScraper, DoupeScraper
+
+
+@pytest.mark.anyio
+async def test_create_client_timeouts():
+    client = create_client(timeout={"read": 5.0})
+    assert client.timeout.read == 5.0
+    assert client.timeout.connect == DEFAULT_TIMEOUT["connect"]
+    await client.aclose()
+
+
+@pytest.mark.anyio
+async def test_client_factory_shares_clients_per_source():
+    factory = ClientFactory(http2=False, timeout={"read": 1.0})
+    async with SteamScraper(client_factory=factory) as first:
+        async with SteamScraper(client_factory=factory) as second:
+            assert first.session is second.session
+            assert first.session.timeout.read == 1.0
+    # scrapers do not close clients of the factory
+    assert not first.session.is_closed
+    async with DoupeScraper(client_factory=factory, parse_workers=0) as doupe:
+        assert doupe.session is not first.session
+    await factory.aclose()
+    assert first.session.is_closed
+
+
+@pytest.mark.anyio
+async def test_get_retry_retries_read_timeout():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) == 1:
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200, json={"applist": {"apps": []}})
+
+    scraper = SteamScraper()
+    scraper.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    async with scraper:
+        response = await scraper.get_retry(scraper.list_of_games_url, endpoint="list_of_games")
+    assert response.status_code == 200
+    assert len(requests) == 2
@@ -0,0 +1,106 @@
+"""
+Created by Frantisek Sabol
+Tests for the adaptive rate limiter of the scrapers.
+"""
+import asyncio
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from ..rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from ..scraper import SteamScraper
+
+
+def response(status_code: int, headers: dict = None) -> httpx.Response:
+    return httpx.Response(status_code, headers=headers, request=httpx.Request("GET", "https://test.com"))
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("not a date") is None
+    retry_at = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 50 < parse_retry_after(retry_at) <= 60
+
+
+def test_backoff_and_probe():
+    limiter = AdaptiveRateLimiter(max_rate=10, time_period=1, increase_after=5)
+    delay = limiter.on_response(response(429, {"Retry-After": "3"}))
+    assert 3 <= delay <= 4
+    assert limiter.rate == 5
+    assert limiter.paused_until > time.monotonic() + 2
+
+    # no Retry-After: jittered exponential delay
+    second_delay = limiter.on_response(response(503))
+    assert 0.5 <= second_delay <= 2
+    assert limiter.rate == 2.5
+
+    for _ in range(5):
+        assert limiter.on_response(response(200)) is None
+    assert limiter.rate == pytest.approx(2.75)
+    assert limiter.metrics()["backoffs"] == 2
+
+
+def test_rate_bounds():
+    limiter = AdaptiveRateLimiter(max_rate=10, time_period=1, increase_after=1)
+    for _ in range(100):
+        limiter.on_response(response(200))
+    assert limiter.rate == limiter.max_rate_ceiling == 20
+    limiter.paused_until = 0
+    for _ in range(100):
+        limiter.on_response(response(429, {"Retry-After": "0"}))
+    assert limiter.rate == limiter.min_rate == 1
+
+
+@pytest.mark.anyio
+async def test_backoff_keeps_bucket_level():
+    limiter = AdaptiveRateLimiter(max_rate=4, time_period=1, base_delay=0)
+    bucket = limiter.bucket
+    for _ in range(4):
+        async with limiter:
+            pass
+    limiter.on_response(response(429, {"Retry-After": "0"}))
+    # same bucket at half the rate, still full
+    assert limiter.bucket is bucket
+    assert limiter.time_period == 2
+    assert not bucket.has_capacity()
+
+
+@pytest.mark.anyio
+async def test_pause_while_waiting_for_capacity():
+    limiter = AdaptiveRateLimiter(max_rate=1, time_period=0.1)
+    async with limiter:
+        pass
+
+    async def request() -> float:
+        async with limiter:
+            return time.monotonic()
+
+    task = asyncio.create_task(request())
+    await asyncio.sleep(0)
+    limiter.paused_until = time.monotonic() + 0.3
+    assert await task >= limiter.paused_until
+    # the task takes a single unit of the bucket
+    assert limiter.bucket.level <= 1
+
+
+@pytest.mark.anyio
+async def test_get_retry_retries_too_many_requests():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"applist": {"apps": []}})
+
+    scraper = SteamScraper()
+    scraper.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    async with scraper:
+        result = await scraper.get_retry(scraper.list_of_games_url, endpoint="list_of_games")
+    assert result.status_code == 200
+    assert len(requests) == 2
+    assert scraper.rate_limit.num_backoffs == 1
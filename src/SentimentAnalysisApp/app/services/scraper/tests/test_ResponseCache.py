@@ -0,0 +1,92 @@
+"""
+Created by Frantisek Sabol
+Tests for the persistent response cache of the scrapers.
+"""
+import time
+
+import httpx
+import pytest
+
+from ..response_cache import ResponseCache
+from ..scraper import SteamScraper
+
+APPDETAILS_URL = "https://store.steampowered.com/api/appdetails"
+APPDETAILS = {"730": {"success": True, "data": {"type": "game", "name": "Counter-Strike", "steam_appid": 730}}}
+
+
+def appdetails_transport(requests: list, etag: str = '"v1"', body=APPDETAILS) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json=body, headers={"ETag": etag})
+
+    return httpx.MockTransport(handler)
+
+
+def test_key_ignores_param_order_and_api_key():
+    assert ResponseCache.key(APPDETAILS_URL, {"appids": 730, "language": "english"}) == \
+           ResponseCache.key(f"{APPDETAILS_URL}?language=english", {"appids": 730, "api_key": "secret"})
+    assert ResponseCache.key(APPDETAILS_URL, {"appids": 730}) != ResponseCache.key(APPDETAILS_URL, {"appids": 440})
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_size=250)
+    for i in range(3):
+        cache.put(str(i), f"https://test.com/{i}", httpx.Response(200, content=b"x" * 100))
+        # keep the first response recently used
+        cache.get("0")
+    assert cache.size <= 250
+    assert cache.get("0") is not None
+    assert cache.get("1") is None
+    assert cache.get("2") is not None
+    cache.close()
+
+    # size is restored from the database file
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_size=250)
+    assert cache.size == 200
+    cache.close()
+
+
+@pytest.mark.anyio
+async def test_cached_get_replays_and_revalidates(tmp_path):
+    requests = []
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    scraper = SteamScraper(cache=cache)
+    scraper.session = httpx.AsyncClient(transport=appdetails_transport(requests))
+    async with scraper:
+        first = await scraper.get_game_info(730)
+        second = await scraper.get_game_info(730)
+        assert first == second
+        assert first.name == "Counter-Strike"
+        assert len(requests) == 1
+
+        # stale response is revalidated with its ETag and served from the cache on 304
+        cache.connection.execute("UPDATE response SET stored_at = ?", (time.time() - 8 * 24 * 60 * 60,))
+        third = await scraper.get_game_info(730)
+        assert len(requests) == 2
+        assert requests[1].headers["If-None-Match"] == '"v1"'
+        assert third == first
+
+        # endpoints without ttl are not cached
+        params = {"appids": 730, "language": "english"}
+        response = await scraper.cached_get(APPDETAILS_URL, endpoint="user_reviews", params=params)
+        scraper.handle_response(response)
+        assert len(requests) == 3
+    cache.close()
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("body", [None, {"730": {"success": False}}])
+async def test_invalid_response_not_cached(tmp_path, body):
+    requests = []
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    scraper = SteamScraper(cache=cache)
+    scraper.session = httpx.AsyncClient(transport=appdetails_transport(requests, body=body))
+    async with scraper:
+        assert await scraper.get_game_info(730) is None
+        # the error payload is requested again instead of being replayed from the cache
+        assert await scraper.get_game_info(730) is None
+        assert len(requests) == 2
+        assert len(cache) == 0
+    cache.close()
@@ -4,6 +4,10 @@ Tests for the SteamScraper class.
 """
 import hashlib
 import json
+
+import httpx
+from .. import scraper as scraper_module
+from ..benchmark_steam_validation import generate_page
 from ..scraper import SteamScraper
 import pytest
 
@@ -65,3 +69,49 @@ async def test_get_reviews_from_list_of_game_ids():
 
 
 
+
+
+@pytest.mark.anyio
+async def test_get_game_reviews_incremental():
+    async with SteamScraper() as scraper:
+        first_page = []
+        async for page in scraper.game_reviews_page_generator(730, max_reviews=100):
+            first_page.extend(page)
+        assert scraper.review_cursors.get("730") is not None
+
+        known_review_ids = {review.recommendationid for review in first_page}
+        updated_since = max(review.timestamp_updated for review in first_page)
+        new_reviews = []
+        async for page in scraper.game_reviews_page_generator(730, max_reviews=1000,
+                                                              known_review_ids=known_review_ids,
+                                                              updated_since=updated_since):
+            new_reviews.extend(page)
+    # only reviews written in the meantime, generator stops at the first page of known reviews
+    assert all(review.recommendationid not in known_review_ids for review in new_reviews)
+    assert len(new_reviews) < 1000
+
+
+@pytest.mark.anyio
+async def test_get_game_reviews_failed_page(monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.params["cursor"] == "*":
+            return httpx.Response(200, content=generate_page(0, 100), headers={"content-type": "application/json"})
+        return httpx.Response(503, headers={"Retry-After": "0"})
+
+    monkeypatch.setattr(scraper_module, "STEAM_REVIEWS_RETRIES", 3)
+    scraper = SteamScraper()
+    scraper.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    scraper.get_rate_limit("user_reviews").base_delay = 0
+    async with scraper:
+        reviews = []
+        async for page in scraper.game_reviews_page_generator(730, max_reviews=1000):
+            reviews.extend(page)
+    # first page and the retries of the second one
+    assert len(requests) == 4
+    assert len(reviews) == 100
+    assert "730" in scraper.incomplete_review_chains
+    # the chain can be continued after the last yielded page
+    assert scraper.review_cursors["730"] == requests[-1].url.params["cursor"]
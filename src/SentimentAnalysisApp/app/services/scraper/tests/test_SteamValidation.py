@@ -0,0 +1,53 @@
+"""
+Created by Frantisek Sabol
+Tests for the lightweight validation path of Steam review pages.
+"""
+import json
+
+import httpx
+import pytest
+
+from ..benchmark_steam_validation import generate_page
+from ..scraper import SteamScraper
+from ..steam_resources import parse_reviews_response
+
+
+def test_trusted_validation_matches_pydantic():
+    content = generate_page(0, 20)
+    validated = parse_reviews_response(content, loads=json.loads)
+    trusted = parse_reviews_response(content, trusted=True)
+    assert trusted.cursor == validated.cursor
+    assert trusted.query_summary == validated.query_summary
+    assert [r.dict(by_alias=True) for r in trusted.reviews] == [r.dict(by_alias=True) for r in validated.reviews]
+
+
+def test_trusted_validation_checks():
+    page = json.loads(generate_page(0, 2))
+    page["reviews"][1]["language"] = "klingon"
+    with pytest.raises(ValueError):
+        parse_reviews_response(json.dumps(page).encode(), trusted=True)
+    page["reviews"][1]["language"] = "czech"
+    del page["reviews"][1]["author"]
+    with pytest.raises(KeyError):
+        parse_reviews_response(json.dumps(page).encode(), trusted=True)
+    with pytest.raises(ValueError):
+        parse_reviews_response(json.dumps({"success": 2}).encode(), trusted=True)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("parse_workers", [0, 1])
+async def test_reviews_validated_off_event_loop(parse_workers):
+    pages = [generate_page(0, 100), generate_page(1, 50)]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        page = pages[0] if request.url.params["cursor"] == "*" else pages[1]
+        return httpx.Response(200, content=page, headers={"content-type": "application/json"})
+
+    scraper = SteamScraper(trusted_validation=True, parse_workers=parse_workers)
+    scraper.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    async with scraper:
+        reviews = []
+        async for page in scraper.game_reviews_page_generator(730, max_reviews=150):
+            reviews.extend(page)
+    assert len(reviews) == 150
+    assert reviews[0].source_reviewer_id == reviews[0].author.steamid
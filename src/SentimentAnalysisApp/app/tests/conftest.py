@@ -11,7 +11,7 @@ from app.main import app
 from app.models import Base
 from app.db.session import async_engine, async_session
 from app.tests import utils
-from app.api.deps import get_session
+from app.api.deps import get_session, get_response_cache
 from .utils import seed_initial_test_data, is_test_data_seeded
 
 default_user_email = "default@test.com"
@@ -35,6 +35,8 @@ def event_loop():
 @pytest.fixture
 async def client(session) -> AsyncGenerator[AsyncClient, None]:
     app.dependency_overrides[get_session] = lambda: session
+    # responses are not cached between tests with different data
+    app.dependency_overrides[get_response_cache] = lambda: None
     async with AsyncClient(app=app, base_url="http://127.0.0.1:8000") as client:
         yield client
 
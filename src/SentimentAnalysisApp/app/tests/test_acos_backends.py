@@ -0,0 +1,33 @@
+import pytest
+
+from app.services.analyzer.benchmark_acos_backends import read_validation_texts, run
+from app.services.analyzer.db_analyzer import load_model
+
+NUM_REVIEWS = 32
+
+
+@pytest.fixture(scope="module")
+def validation_texts():
+    texts = read_validation_texts(NUM_REVIEWS)
+    assert len(texts) == NUM_REVIEWS
+    return texts
+
+
+@pytest.fixture(scope="module")
+def pytorch_outputs(validation_texts):
+    model, _ = load_model("joint-acos", "mt5-acos-1.0", backend="pytorch")
+    return [result["Quadruples"] for result in run(model, validation_texts, 16, "joint-acos")]
+
+
+def agreement(outputs, reference):
+    return sum(a == b for a, b in zip(outputs, reference)) / len(reference)
+
+
+@pytest.mark.parametrize("backend, min_agreement", [("onnx", 0.95), ("onnx-int8", 0.7), ("pytorch-int8", 0.7)])
+def test_backend_parity(validation_texts, pytorch_outputs, backend, min_agreement):
+    if backend.startswith("onnx"):
+        pytest.importorskip("optimum.onnxruntime")
+    model, _ = load_model("joint-acos", "mt5-acos-1.0", backend=backend)
+    outputs = [result["Quadruples"] for result in run(model, validation_texts, 16, "joint-acos")]
+    # greedy decoding of the same graph, fp32 export differs only in rare float ties, int8 in some quadruples
+    assert agreement(outputs, pytorch_outputs) >= min_agreement
@@ -0,0 +1,74 @@
+import pytest
+from starlette.requests import Request
+
+from app.services.api_cache import ResponseCache, MemoryBackend, RedisBackend, cached_json_response
+
+
+def make_backend(kind: str):
+    if kind == "memory":
+        return MemoryBackend(max_entries=100)
+    fakeredis = pytest.importorskip("fakeredis.aioredis")
+    return RedisBackend(fakeredis.FakeRedis())
+
+
+def make_request(path: str, query: str = "", if_none_match: str = None) -> Request:
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(),
+                    "headers": headers})
+
+
+def computing(calls: list, body: bytes):
+    async def compute():
+        calls.append(body)
+        return body
+
+    return compute
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("kind", ["memory", "redis"])
+async def test_invalidation_by_game(kind):
+    cache = ResponseCache(make_backend(kind), ttl=60)
+    calls = []
+    first = await cache.get_or_compute("/games/1/summary", 1, computing(calls, b'{"a":1}'))
+    cached = await cache.get_or_compute("/games/1/summary", 1, computing(calls, b'{"a":2}'))
+    assert calls == [b'{"a":1}']
+    assert cached == first
+    await cache.get_or_compute("/games/2/summary", 2, computing(calls, b'{"b":1}'))
+    await cache.get_or_compute("/games/search", None, computing(calls, b'[1]'))
+
+    # only the game and the responses of all games are dropped
+    await cache.invalidate([1])
+    updated = await cache.get_or_compute("/games/1/summary", 1, computing(calls, b'{"a":2}'))
+    assert updated.body == b'{"a":2}'
+    assert updated.etag != first.etag
+    await cache.get_or_compute("/games/2/summary", 2, computing(calls, b'{"b":2}'))
+    await cache.get_or_compute("/games/search", None, computing(calls, b'[2]'))
+    assert calls == [b'{"a":1}', b'{"b":1}', b'[1]', b'{"a":2}', b'[2]']
+
+    await cache.invalidate()
+    assert (await cache.get_or_compute("/games/2/summary", 2, computing(calls, b'{"b":2}'))).body == b'{"b":2}'
+
+
+@pytest.mark.anyio
+async def test_cached_json_response_etag():
+    cache = ResponseCache(MemoryBackend(), ttl=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"score": 0.5}
+
+    # query order does not change the key
+    response = await cached_json_response(make_request("/games/1/summary", "b=2&a=1"), cache, compute, game_id=1)
+    assert response.status_code == 200
+    assert response.body == b'{"score":0.5}'
+    etag = response.headers["etag"]
+    response = await cached_json_response(make_request("/games/1/summary", "a=1&b=2", if_none_match=etag), cache,
+                                          compute, game_id=1)
+    assert response.status_code == 304
+    assert calls == [1]
+
+    response = await cached_json_response(make_request("/games/1/summary", if_none_match=etag), None, compute)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from app.services.analyzer.benchmark_clean import DATA_PATH, legacy_clean
+from app.services.analyzer.utils import clean, clean_many
+
+TEXTS = [
+    "Skvělá hra 😀😀😀!!! :) :D <3 https://store.steampowered.com/app/730 [h1]Nadpis[/h1] 10/10",
+    "Nooooo way... 👨‍👩‍👧 rodina",
+    # "x]" is an emoticon, removing it creates a link
+    "[url=x]link[/url] ht:)tps://x",
+    "",
+]
+CLEANED = ["Skvělá hra !     Nadpis 10/10", "No way.  rodina", " ", ""]
+
+
+@pytest.mark.parametrize("text,cleaned", zip(TEXTS, CLEANED))
+def test_clean(text, cleaned):
+    assert clean(text) == cleaned
+
+
+def test_clean_many():
+    assert clean_many(TEXTS) == CLEANED
+    assert clean_many([]) == []
+    # texts with the separator of the batch are cleaned one by one
+    assert clean_many(["a\x00\x00\x00b", *TEXTS]) == ["ab", *CLEANED]
+
+
+def test_clean_matches_legacy_clean():
+    with open(DATA_PATH, "r", encoding="utf8") as f:
+        texts = json.load(f)
+    assert clean_many(texts) == [legacy_clean(text) for text in texts]
+    assert [clean(text) for text in texts] == [legacy_clean(text) for text in texts]
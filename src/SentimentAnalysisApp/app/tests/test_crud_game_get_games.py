@@ -235,7 +235,7 @@ async def test_crud_game_get_game_list_pagination_without_sort(session, test_dat
         offset += 1
         response = await crud.game.get_game_list(session, limit=limit, offset=offset)
         logger.debug(f"Games:\n{games_compare_str(response.games)}")
-        assert response.query_summary is None
+        assert response.query_summary.total == len(expected.games)
         last_iter = i
         if len(response.games) == 0:
             break
@@ -265,7 +265,7 @@ async def test_crud_game_get_game_list_pagination_with_sort_release_date_asc(ses
         response = await crud.game.get_game_list(session, limit=limit, offset=offset, sort=sort)
 
         logger.debug(f"Games:\n{games_compare_str(response.games)}")
-        assert response.query_summary is None
+        assert response.query_summary.total == len(expected.games)
         last_iter = i
         if len(response.games) == 0:
             break
@@ -291,7 +291,7 @@ async def test_crud_game_get_game_list_pagination_with_sort_release_date_desc(se
         offset += 1
         response = await crud.game.get_game_list(session, limit=limit, offset=offset, sort=sort)
         logger.debug(f"Games:\n{games_compare_str(response.games)}")
-        assert response.query_summary is None
+        assert response.query_summary.total == len(expected.games)
         last_iter = i
         if len(response.games) == 0:
             break
@@ -318,9 +318,33 @@ async def test_crud_game_get_game_list_pagination_with_sort_multiple_should_be_n
     for i in range(its+5):
         offset += 1
         response = await crud.game.get_game_list(session, limit=limit, offset=offset, sort=sort)
-        assert response.query_summary is None
+        assert response.query_summary.total == len(expected.games)
         last_iter = i
         if len(response.games) == 0:
             break
 
-    assert last_iter == its
\ No newline at end of file
+    assert last_iter == its
+
+@pytest.mark.parametrize("sort", [None,
+                                  schemas.GameListSort(release_date="desc"),
+                                  schemas.GameListSort(score="asc"),
+                                  schemas.GameListSort(name="asc"),
+                                  schemas.GameListSort(num_reviews="desc")])
+async def test_crud_game_get_game_list_cursor_pagination(session, test_data: None, sort):
+    expected = await crud.game.get_game_list(session, sort=sort)
+
+    games = []
+    response = await crud.game.get_game_list(session, limit=1, sort=sort)
+    assert response.query_summary.total == len(expected.games)
+    while response.next_cursor is not None:
+        games.extend(response.games)
+        response = await crud.game.get_game_list(session, limit=1, sort=sort, cursor=response.next_cursor)
+        assert response.query_summary.total == len(expected.games)
+    games.extend(response.games)
+
+    assert [game.id for game in games] == [game.id for game in expected.games]
+
+
+async def test_crud_game_get_game_list_invalid_cursor(session, test_data: None):
+    with pytest.raises(ValueError):
+        await crud.game.get_game_list(session, cursor="invalid")
@@ -1,10 +1,10 @@
-from datetime import datetime
+from datetime import datetime, timezone, timedelta
 import random
 
 import pytest
 import httpx
 import respx
-from sqlalchemy import select
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
@@ -12,6 +12,10 @@ from sqlalchemy.orm import selectinload
 
 from app.services.scraper.steam_resources import SteamAppDetail, SteamReview, SteamAppListResponse, SteamApp, \
     SteamAppReviewsResponse, SteamMetacriticReview, SteamAppCategory
+from app.services.scraper import scraper as scraper_module
+from app.services.scraper.benchmark_steam_validation import generate_page
+from app.services.scraper.db_scraper import DBScraper
+from app.services.scraper.scraper import SteamScraper
 from app import crud, schemas, models
 import asyncio
 from .test_data import TEST_SOURCE
@@ -72,6 +76,10 @@ def generate_n_scraped_reviews(
     return scraped_reviews
 
 
+async def count_rollup_reviews(session: AsyncSession) -> int:
+    return await session.scalar(select(func.coalesce(func.sum(models.ReviewDailyStats.num_reviews), 0)))
+
+
 def mock_steam_app_detail(appid=730, name="Counter-Strike: Global Offensive") -> SteamAppDetail:
     app_detail = SteamAppDetail(
         type="game",
@@ -102,6 +110,15 @@ async def source(session: AsyncSession):
     return source
 
 
+@pytest.fixture
+async def steam_source(session: AsyncSession):
+    source_in = schemas.SourceCreate(name="steam", url=SteamScraper._source["url"])
+    source = await crud.source.get_by_url(session, url=source_in.url)
+    if not source:
+        source = await crud.source.create(session, obj_in=source_in)
+    return source
+
+
 @pytest.fixture
 async def game(session: AsyncSession):
     game = models.Game(id=999,
@@ -362,3 +379,183 @@ async def test_store_review_with_additional_objects_on_many_reviews(clear_db, so
         reviews = await session.execute(select(models.Review))
         reviews = reviews.scalars().all()
     assert len(reviews) == len(scraped_reviews) + len(scraped_reviews2)
+
+
+async def test_store_reviews_bulk(clear_db, session: AsyncSession, source: models.Source, game: models.Game):
+    """
+    Stores a page of reviews with set based upserts, duplicates in the page and in the db are skipped
+    """
+    scraped_reviews = generate_n_scraped_reviews(50, source_id=source.id, reviewer_id=7)
+    for review in scraped_reviews:
+        review.game = None
+        review.game_id = game.id
+
+    review_ids = await crud.scraper.store_reviews_bulk(session, source_id=source.id,
+                                                       scraped_objs=scraped_reviews + scraped_reviews[:10])
+    assert len(review_ids) == len(scraped_reviews)
+
+    # storing the same page again returns the same ids and does not create new rows
+    review_ids_again = await crud.scraper.store_reviews_bulk(session, source_id=source.id,
+                                                             scraped_objs=scraped_reviews)
+    assert review_ids_again == review_ids
+    # only inserted reviews are counted in the daily rollup
+    assert await count_rollup_reviews(session) == len(scraped_reviews)
+
+    reviews = await session.execute(select(models.Review))
+    reviews = reviews.scalars().all()
+    assert len(reviews) == len(scraped_reviews)
+    reviewers = await session.execute(select(models.Reviewer))
+    reviewers = reviewers.scalars().all()
+    assert len(reviewers) == 1
+    assert all(review.reviewer_id == reviewers[0].id for review in reviews)
+
+
+async def test_copy_loader_load_page(clear_db, session: AsyncSession, source: models.Source, game: models.Game):
+    """
+    Loads a page of reviews with COPY into the staging table and merges it into the app tables
+    """
+    from app.services.scraper.copy_loader import ReviewCopyLoader
+
+    await crud.source.add_game(session, game_id=game.id, source_id=source.id,
+                               source_game_id=f"game_{game.id}_source_{source.id}")
+    scraped_reviews = generate_n_scraped_reviews(30, source_id=source.id, reviewer_id=3)
+    loader = ReviewCopyLoader(source_id=source.id)
+
+    num_inserted = await loader.load_page(session, scraped_reviews, game_id=game.id)
+    assert num_inserted == len(scraped_reviews)
+    # already known reviews are skipped by the merge
+    num_inserted = await loader.load_page(session, scraped_reviews, game_id=game.id)
+    assert num_inserted == 0
+    assert await count_rollup_reviews(session) == len(scraped_reviews)
+
+    reviews = await session.execute(select(models.Review).where(models.Review.game_id == game.id))
+    reviews = reviews.scalars().all()
+    assert len(reviews) == len(scraped_reviews)
+    assert all(review.reviewer_id is not None for review in reviews)
+    game_source = await session.scalar(select(models.GameSource).where(models.GameSource.game_id == game.id))
+    await session.refresh(game_source)
+    assert game_source.num_reviews == len(scraped_reviews)
+
+
+async def test_update_after_reviews_scrape_high_water_mark(clear_db, session: AsyncSession, source: models.Source,
+                                                           game: models.Game):
+    """
+    The high water mark of review scraping only moves forward
+    """
+    session.add(models.GameSource(game_id=game.id, source_id=source.id, source_game_id="999"))
+    await session.commit()
+    mark = datetime(2022, 5, 1, tzinfo=timezone.utc)
+
+    await crud.game.update_after_reviews_scrape(session, source_id=source.id, game_id=game.id,
+                                                reviews_updated_until=mark)
+    await crud.game.update_after_reviews_scrape(session, source_id=source.id, game_id=game.id,
+                                                reviews_updated_until=datetime(2022, 1, 1, tzinfo=timezone.utc))
+
+    updated_until = await crud.game.get_reviews_high_water_mark(session, source_id=source.id, game_id=game.id)
+    assert updated_until == mark
+
+
+async def test_scraping_job_checkpoints(clear_db, session: AsyncSession, source: models.Source, game: models.Game):
+    """
+    Running job is resumed from its checkpoint, finished job starts again and keeps failed urls for the retry pass
+    """
+    name = f"reviews:{source.id}:{game.id}"
+    job = await crud.scraping_job.start(session, name=name, source_id=source.id, game_id=game.id)
+    await crud.scraping_job.checkpoint(session, db_obj=job, cursor="cursor_1", page="1", num_reviews=100)
+    await crud.scraping_job.checkpoint(session, db_obj=job, cursor="cursor_2", page="2", num_reviews=50,
+                                       failed_urls=["https://test_source.com/?page=3"])
+
+    resumed = await crud.scraping_job.start(session, name=name, source_id=source.id, game_id=game.id)
+    assert resumed.id == job.id
+    assert resumed.cursor == "cursor_2"
+    assert resumed.pages_done == 2
+    assert resumed.done_pages == ["1", "2"]
+    assert resumed.reviews_done == 150
+
+    await crud.scraping_job.finish(session, db_obj=resumed)
+    restarted = await crud.scraping_job.start(session, name=name, source_id=source.id, game_id=game.id)
+    assert restarted.status == "running"
+    assert restarted.cursor is None
+    assert restarted.pages_done == 0
+    assert restarted.failed_urls == ["https://test_source.com/?page=3"]
+
+
+async def test_scrape_reviews_for_game_failed_page(clear_db, session: AsyncSession, steam_source: models.Source,
+                                                   game: models.Game, monkeypatch):
+    """
+    Page which still fails after the retries leaves the job running with the cursor of the last stored page,
+    the high water mark of the game does not move
+    """
+    await crud.source.add_game(session, game_id=game.id, source_id=steam_source.id, source_game_id="730")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.params["cursor"] == "*":
+            return httpx.Response(200, content=generate_page(0, 100), headers={"content-type": "application/json"})
+        return httpx.Response(503, headers={"Retry-After": "0"})
+
+    monkeypatch.setattr(scraper_module, "STEAM_REVIEWS_RETRIES", 2)
+    scraper = SteamScraper()
+    scraper.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    scraper.get_rate_limit("user_reviews").base_delay = 0
+    async with scraper:
+        db_scraper = await DBScraper.create(scraper, session)
+        _, num_reviews_scraped = await db_scraper.scrape_reviews_for_game(game_id=game.id, source_game_id="730",
+                                                                          max_reviews=1000, incremental=True)
+    assert num_reviews_scraped == 100
+
+    job = await crud.scraping_job.get_by_name(session, name=f"reviews:{steam_source.id}:{game.id}")
+    assert job.status == "running"
+    assert job.cursor == scraper.review_cursors["730"]
+    assert job.reviews_done == 100
+    updated_until = await crud.game.get_reviews_high_water_mark(session, source_id=steam_source.id,
+                                                                game_id=game.id)
+    assert updated_until is None
+
+
+async def test_scrape_reviews_for_games_concurrently(clear_db, session: AsyncSession, steam_source: models.Source,
+                                                     monkeypatch):
+    """
+    Games never scraped or scraped the longest time ago go first, up to concurrency games are in flight
+    on the shared scraper and a failing game does not stop the others
+    """
+    scraped_at = {"1": None, "2": 30, "3": 10, "4": None, "5": 20, "6": 0}
+    for source_game_id, days_ago in scraped_at.items():
+        session.add(models.Game(id=int(source_game_id), name=f"test_game_{source_game_id}"))
+        session.add(models.GameSource(
+            game_id=int(source_game_id), source_id=steam_source.id, source_game_id=source_game_id,
+            reviews_scraped_at=datetime.now() - timedelta(days=days_ago) if days_ago is not None else None))
+    await session.commit()
+
+    started, finished = [], []
+    in_flight, max_in_flight = 0, 0
+
+    async def scrape_reviews_for_game(self, game_id: int = None, source_game_id: str = None, **kwargs):
+        nonlocal in_flight, max_in_flight
+        started.append(source_game_id)
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        try:
+            await asyncio.sleep(0.05)
+            if source_game_id == "2":
+                raise ValueError("failed game")
+            # all games share the limiter of the reviews endpoint
+            async with self.scraper.get_rate_limit("user_reviews"):
+                pass
+            finished.append(source_game_id)
+            return game_id, 1
+        finally:
+            in_flight -= 1
+
+    monkeypatch.setattr(DBScraper, "scrape_reviews_for_game", scrape_reviews_for_game)
+    async with SteamScraper() as scraper:
+        db_scraper = await DBScraper.create(scraper, session)
+        await db_scraper.scrape_all_reviews_for_not_updated_steam_games(check_interval=timedelta(days=5),
+                                                                        concurrency=3)
+
+    # the game scraped just now is not due, never scraped games first
+    assert started[:2] == ["1", "4"] or started[:2] == ["4", "1"]
+    assert started[2:] == ["2", "5", "3"]
+    assert max_in_flight == 3
+    assert sorted(finished) == ["1", "3", "4", "5"]
+    assert scraper.get_rate_limit("user_reviews").num_requests == 4
+    assert scraper.rate_limit.num_requests == 0
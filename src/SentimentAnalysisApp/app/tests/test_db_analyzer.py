@@ -1,11 +1,16 @@
-from sqlalchemy import select
+from sqlalchemy import select, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app import crud, schemas, models
 import asyncio
 import pytest
-from app.services.analyzer.db_analyzer import analyze_db_reviews
+from app.db.session import async_session
+from app.services.analyzer.db_analyzer import analyze_db_reviews, analyze_db_reviews_pipelined, load_model, \
+    analyze_claimed_reviews, split_cores
+from app.services.analyzer.acos.model import bucket_by_length
+from app.services.analyzer.acos.instruction import PromptFreeInstruction, JointACOSInstruction
+from app.services.analyzer.prediction_cache import PredictionCache
 
 pytestmark = pytest.mark.anyio
 
@@ -87,3 +92,214 @@ async def test_analyze_many_reviews_100_batch(clear_db, session: AsyncSession, s
     reviews = result.scalars().all()
     # ensure all reviews have set processed_at (not None)
     assert all([review.processed_at is not None for review in reviews])
+
+
+async def test_analyze_many_reviews_pipelined(clear_db, session: AsyncSession, seed_data: dict):
+    await analyze_db_reviews_pipelined(async_session, game_id=seed_data["game"].id, task="joint-acos",
+                                       model_name="mt5-acos-1.0", batch_size=10)
+    result = await session.execute(select(models.AnalyzedReview))
+    a_r = result.scalars().all()
+    assert len(a_r) == len(seed_data["reviews"])
+    # reviews are updated by the sessions of the pipeline
+    result = await session.execute(select(models.Review).execution_options(populate_existing=True))
+    reviews = result.scalars().all()
+    # ensure all reviews have set processed_at (not None)
+    assert all([review.processed_at is not None for review in reviews])
+
+
+def test_bucket_by_length():
+    lengths = [5, 300, 7, 6, 120, 8]
+    buckets = bucket_by_length(lengths, max_batch_tokens=40)
+    assert buckets == [[0, 3, 2, 5], [4], [1]]
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+    assert all(max(lengths[i] for i in bucket) * len(bucket) <= 40 or len(bucket) == 1 for bucket in buckets)
+
+
+async def test_analyze_many_reviews_max_batch_tokens(clear_db, session: AsyncSession, seed_data: dict):
+    await analyze_db_reviews(session, game_id=seed_data["game"].id, task="joint-acos", model_name="mt5-acos-1.0",
+                             batch_size=100, max_batch_tokens=4096)
+    result = await session.execute(select(models.AnalyzedReview))
+    a_r = result.scalars().all()
+    assert len(a_r) == len(seed_data["reviews"])
+    # results are stored for the reviews they were predicted for, not in the order of the buckets
+    cleaned_texts = {analyzed.review_id: analyzed.cleaned_text for analyzed in a_r}
+    assert cleaned_texts[seed_data["review1"].id] == "This game is awesome! Gameplay is stellar!"
+    assert cleaned_texts[seed_data["review2"].id] == "I love this game! Gunplay is amazing."
+
+
+def test_cached_prefix_inputs_match_full_inputs():
+    model, _ = load_model("joint-acos", "mt5-acos-1.0", cache_prefix=True)
+    texts = ["Příběh je velmi zajímavý, ale hra je plná cheaterů.", "Gunplay is amazing.", " Hra  ok "]
+    instructor = model._get_instructor("joint-acos")
+    cached = model.encode_inputs(texts, instructor)
+    model.cache_prefix = False
+    assert cached["input_ids"] == model.encode_inputs(texts, instructor)["input_ids"]
+
+
+def test_prompt_free_instruction():
+    instructor = PromptFreeInstruction("joint-acos")
+    assert instructor.prepare_input("Gunplay is amazing.") == "joint-acos: Gunplay is amazing."
+    assert len(instructor.prepare_input("x")) < len(JointACOSInstruction().prepare_input("x", [])) / 50
+
+
+def test_split_cores():
+    assert split_cores(3, cores=[0, 1, 2, 3, 4, 5, 6]) == [[0, 1, 2], [3, 4], [5, 6]]
+    assert split_cores(1, cores=[2, 3]) == [[2, 3]]
+    with pytest.raises(ValueError):
+        split_cores(3, cores=[0, 1])
+
+
+async def test_claim_unprocessed_reviews_skips_locked(clear_db, session: AsyncSession, seed_data: dict):
+    async with async_session() as db1, async_session() as db2:
+        claimed1 = await crud.analyzer.claim_unprocessed_reviews(db1, limit=10, game_id=seed_data["game"].id)
+        claimed2 = await crud.analyzer.claim_unprocessed_reviews(db2, limit=10, game_id=seed_data["game"].id)
+        assert [review.id for review in claimed1] == list(range(1, 11))
+        assert [review.id for review in claimed2] == list(range(11, 21))
+        # released reviews can be claimed again
+        await db1.rollback()
+        claimed3 = await crud.analyzer.claim_unprocessed_reviews(db1, limit=10, game_id=seed_data["game"].id)
+        assert [review.id for review in claimed3] == list(range(1, 11))
+        await db1.rollback()
+        await db2.rollback()
+
+
+async def test_analyze_claimed_reviews_concurrently(clear_db, session: AsyncSession, seed_data: dict):
+    model, model_name = load_model("joint-acos", "mt5-acos-1.0")
+    counts = await asyncio.gather(*[
+        analyze_claimed_reviews(async_session, model, model_name, game_id=seed_data["game"].id, batch_size=10)
+        for _ in range(2)])
+    assert sum(counts) == len(seed_data["reviews"])
+    result = await session.execute(select(models.AnalyzedReview))
+    a_r = result.scalars().all()
+    # every review is analyzed exactly once
+    assert sorted(analyzed.review_id for analyzed in a_r) == sorted(review.id for review in seed_data["reviews"])
+
+
+async def test_analyze_db_reviews_prediction_cache(clear_db, session: AsyncSession, seed_data: dict, tmp_path):
+    cache = PredictionCache(str(tmp_path / "predictions.sqlite"))
+    await analyze_db_reviews(session, game_id=seed_data["game"].id, task="joint-acos", model_name="mt5-acos-1.0",
+                             batch_size=10, cache=cache)
+    result = await session.execute(select(models.AnalyzedReview))
+    assert len(result.scalars().all()) == len(seed_data["reviews"])
+    # the 100 copies of one review are predicted once
+    assert cache.misses == 3
+    assert cache.hits == len(seed_data["reviews"]) - 3
+    cache.close()
+
+
+def test_batch_predict_profile():
+    model, _ = load_model("joint-acos", "mt5-acos-1.0")
+    profiles = []
+    model.profile_hook = profiles.append
+    texts = ["Gameplay is fun but visuals are trashy.", "I love this game! Gunplay is amazing.", "Bad servers."]
+    results = model.batch_predict(batch=texts, task="joint-acos", max_length=128, max_batch_tokens=64)
+    assert [result["text"] for result in results] == texts
+    assert len(profiles) == 1
+    profile = profiles[0]
+    assert profile.batch_size == len(texts)
+    assert profile.buckets > 1
+    assert min(profile.tokenize, profile.generate, profile.decode) >= 0
+
+
+async def test_analyze_long_review_sentences(clear_db, session: AsyncSession, seed_data: dict):
+    sentences = ["Gameplay is fun and the missions are varied.", "The visuals are trashy and the textures are blurry.",
+                 "Servers are laggy in the evening.", "Soundtrack is great and the voice acting is decent.",
+                 "I would recommend it to everyone who likes open world games, but only on sale."]
+    session.add(models.Game(id=2, name="Long Review Game"))
+    session.add(models.Review(id=200, source_review_id="200", text=" ".join(sentences), language="english",
+                              source_id=1, game_id=2, reviewer_id=1))
+    await session.commit()
+
+    model, model_name = load_model("joint-acos", "mt5-acos-1.0")
+    predicted = []
+    batch_predict = model.batch_predict
+
+    def counting_batch_predict(batch, **kwargs):
+        predicted.extend(batch)
+        return batch_predict(batch=batch, **kwargs)
+
+    model.batch_predict = counting_batch_predict
+    await analyze_claimed_reviews(async_session, model, model_name, game_id=2, batch_size=10)
+    assert predicted == sentences
+    result = await session.execute(select(models.AnalyzedReview)
+                                   .options(selectinload(models.AnalyzedReview.analyzed_review_sentences)))
+    analyzed = result.scalars().one()
+    stored = sorted(analyzed.analyzed_review_sentences, key=lambda sentence: sentence.id)
+    assert [sentence.sentence for sentence in stored] == sentences
+    # predictions of the sentences are joined in the order of the review, without a leading separator
+    assert analyzed.prediction == "|".join(sentence.prediction for sentence in stored)
+
+    # re-analysis predicts only the changed sentence
+    sentences[2] = "Servers are stable now."
+    await session.execute(update(models.Review).where(models.Review.id == 200)
+                          .values(text=" ".join(sentences), processed_at=None))
+    await session.commit()
+    predicted.clear()
+    await analyze_claimed_reviews(async_session, model, model_name, game_id=2, batch_size=10)
+    assert predicted == [sentences[2]]
+    session.expire_all()
+    result = await session.execute(select(models.AnalyzedReview)
+                                   .options(selectinload(models.AnalyzedReview.analyzed_review_sentences)))
+    analyzed = result.scalars().one()
+    assert sorted(sentence.sentence for sentence in analyzed.analyzed_review_sentences) == sorted(sentences)
+
+
+async def get_game_stats(session: AsyncSession) -> list:
+    session.expire_all()
+    result = await session.execute(select(models.GameStats).order_by(models.GameStats.game_id))
+    return [schemas.GameStats.from_orm(stats).dict(exclude={"updated_at"}) for stats in result.scalars().all()]
+
+
+async def test_game_stats_rollup(clear_db, session: AsyncSession, seed_data: dict):
+    await analyze_db_reviews(session, game_id=seed_data["game"].id, task="joint-acos", model_name="mt5-acos-1.0",
+                             batch_size=10)
+    stats = await get_game_stats(session)
+    assert len(stats) == 1
+    assert stats[0]["num_aspects"] == len((await session.execute(select(models.Aspect))).scalars().all())
+
+    # incremental updates of the analyzer match the recomputation from all aspects
+    await crud.game_stats.refresh(session)
+    assert await get_game_stats(session) == stats
+
+    # re-analysis replaces the aspects of the reviews, they are not counted twice
+    await session.execute(update(models.Review).values(processed_at=None))
+    await session.commit()
+    await analyze_db_reviews(session, game_id=seed_data["game"].id, task="joint-acos", model_name="mt5-acos-1.0",
+                             batch_size=10)
+    assert await get_game_stats(session) == stats
+
+
+async def get_review_stats(session: AsyncSession) -> tuple:
+    session.expire_all()
+    reviews = await session.execute(select(models.ReviewDailyStats)
+                                    .order_by(models.ReviewDailyStats.day, models.ReviewDailyStats.source_id))
+    aspects = await session.execute(select(models.AspectDailyStats.__table__)
+                                    .order_by(*models.AspectDailyStats.__table__.primary_key.columns))
+    return [schemas.ReviewDailyStats.from_orm(stats).dict() for stats in reviews.scalars().all()], aspects.all()
+
+
+async def test_review_stats_rollup(clear_db, session: AsyncSession, seed_data: dict):
+    # reviews of the last 7 days
+    await session.execute(update(models.Review)
+                          .values(created_at=func.now() - func.make_interval(0, 0, 0, models.Review.id % 7)))
+    await session.commit()
+    await crud.review_stats.refresh(session)
+    await analyze_db_reviews(session, game_id=seed_data["game"].id, task="joint-acos", model_name="mt5-acos-1.0",
+                             batch_size=10)
+    review_stats, aspect_stats = await get_review_stats(session)
+    assert sum(stats["num_processed"] for stats in review_stats) == len(seed_data["reviews"])
+    assert sum(stats.num_aspects for stats in aspect_stats) == \
+           len((await session.execute(select(models.Aspect))).scalars().all())
+
+    # incremental updates of the analyzer match the recomputation from all reviews and aspects
+    await crud.review_stats.refresh(session)
+    assert await get_review_stats(session) == (review_stats, aspect_stats)
+
+    # hours are counted from the reviews, days, weeks, months and years from the rollup
+    summaries = {time_interval: await crud.review.get_summary_v2(session, game_id=seed_data["game"].id,
+                                                                 time_interval=time_interval)
+                 for time_interval in ("hour", "day", "week", "month", "year")}
+    assert len(summaries["day"].data) == 7
+    for summary in summaries.values():
+        assert summary.dict(exclude={"data"}) == summaries["hour"].dict(exclude={"data"})
+    assert summaries["day"].processed == summaries["day"].total == len(seed_data["reviews"])
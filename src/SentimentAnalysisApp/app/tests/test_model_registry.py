@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, models
+from app.services.model_registry import ModelRegistry
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def aspects(session: AsyncSession):
+    session.add_all([models.Game(id=1, name="Game 1"), models.Game(id=2, name="Game 2"),
+                     models.Source(id=1, name="Test Source")])
+    session.add_all([models.Review(id=i, source_review_id=str(i), text="review", language="english", source_id=1,
+                                   game_id=1 if i <= 3 else 2) for i in range(1, 7)])
+    await session.commit()
+    # game 1: model-a 3 aspects, model-b 1, game 2: model-b 3 aspects
+    session.add_all([models.Aspect(review_id=review_id, term="game", category="gameplay", polarity="positive",
+                                   opinion="good", model_id=model_id)
+                     for review_id, model_id in [(1, "model-a"), (2, "model-a"), (3, "model-a"), (1, "model-b"),
+                                                 (4, "model-b"), (5, "model-b"), (6, "model-b")]])
+    await session.commit()
+    await crud.game_stats.refresh(session)
+
+
+async def test_most_utilized_model(clear_db, session: AsyncSession, aspects):
+    registry = ModelRegistry(ttl=0)
+    assert await registry.get_most_utilized_model(session, game_id=1) == "model-a"
+    assert await registry.get_most_utilized_model(session, game_id=2) == "model-b"
+    assert await registry.get_most_utilized_model(session) == "model-b"
+    assert await registry.get_most_utilized_model(session, game_id=3) is None
+
+
+async def test_most_utilized_model_ttl(clear_db, session: AsyncSession, aspects):
+    registry = ModelRegistry(ttl=3600)
+    assert await registry.get_most_utilized_model(session, game_id=1) == "model-a"
+    session.add_all([models.Aspect(review_id=1, term="game", category="gameplay", polarity="positive",
+                                   opinion="good", model_id="model-b") for _ in range(3)])
+    await session.commit()
+    await crud.game_stats.refresh(session, game_ids=[1])
+    # cached until the ttl expires or the game is invalidated
+    assert await registry.get_most_utilized_model(session, game_id=1) == "model-a"
+    registry.invalidate(game_id=1)
+    assert await registry.get_most_utilized_model(session, game_id=1) == "model-b"
+
+
+
+async def test_registry_max_entries(clear_db, session: AsyncSession, aspects):
+    registry = ModelRegistry(max_entries=1)
+    await registry.get_most_utilized_model(session, game_id=1)
+    await registry.get_most_utilized_model(session, game_id=2)
+    assert list(registry.entries) == [2]
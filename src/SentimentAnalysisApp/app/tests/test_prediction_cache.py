@@ -0,0 +1,49 @@
+from app.services.analyzer.prediction_cache import PredictionCache, cached_predict
+
+
+def predict_counting(calls: list):
+    def predict(texts):
+        calls.append(list(texts))
+        return [{"text": text, "Quadruples": [{"aspect": text, "polarity": "positive"}]} for text in texts]
+
+    return predict
+
+
+def test_cached_predict_sends_only_misses(tmp_path):
+    calls = []
+    cache = PredictionCache(str(tmp_path / "predictions.sqlite"))
+    texts = ["good game", "10/10", "good game", "bad servers"]
+    first = cached_predict(cache, predict_counting(calls), texts, "mt5-acos-1.0", "joint-acos")
+    # duplicates within the batch are predicted once
+    assert calls == [["good game", "10/10", "bad servers"]]
+    assert [result["text"] for result in first] == texts
+
+    second = cached_predict(cache, predict_counting(calls), ["10/10", "new review"], "mt5-acos-1.0", "joint-acos")
+    assert calls[-1] == ["new review"]
+    assert second[0] == first[1]
+    # duplicates within a batch count as hits, only texts sent to the model are misses
+    assert cache.hits == 2
+    assert cache.misses == 4
+
+    # predictions are cached per model and task
+    cached_predict(cache, predict_counting(calls), ["10/10"], "other-model", "joint-acos")
+    assert calls[-1] == ["10/10"]
+    cache.close()
+
+
+def test_lru_eviction(tmp_path):
+    calls = []
+    cache = PredictionCache(str(tmp_path / "predictions.sqlite"), max_entries=2)
+    cached_predict(cache, predict_counting(calls), ["a", "b"], "m", "t")
+    # keep "a" recently used
+    cached_predict(cache, predict_counting(calls), ["a"], "m", "t")
+    cached_predict(cache, predict_counting(calls), ["c"], "m", "t")
+    assert len(cache) == 2
+    cached_predict(cache, predict_counting(calls), ["a", "b"], "m", "t")
+    assert calls[-1] == ["b"]
+    cache.close()
+
+    # predictions are restored from the database file
+    cache = PredictionCache(str(tmp_path / "predictions.sqlite"), max_entries=2)
+    assert len(cache) == 2
+    cache.close()
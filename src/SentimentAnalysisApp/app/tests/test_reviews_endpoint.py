@@ -85,3 +85,26 @@ async def test_get_summary_endpoint(client: AsyncClient, session: AsyncSession,
 
 
 
+
+
+@pytest.mark.anyio
+async def test_read_reviews_cursor_pagination(client: AsyncClient, test_data: None):
+    resp = await client.get("/reviews/", params={"limit": 100})
+    assert resp.status_code == 200
+    expected = resp.json()
+
+    reviews = []
+    resp = await client.get("/reviews/", params={"limit": 1})
+    page = resp.json()
+    assert page["total"] == len(expected["reviews"])
+    while page["next_cursor"] is not None:
+        reviews.extend(page["reviews"])
+        resp = await client.get("/reviews/", params={"limit": 1, "cursor": page["next_cursor"]})
+        assert resp.status_code == 200
+        page = resp.json()
+        assert page["total"] == len(expected["reviews"])
+    reviews.extend(page["reviews"])
+    assert [review["id"] for review in reviews] == [review["id"] for review in expected["reviews"]]
+
+    resp = await client.get("/reviews/", params={"cursor": "invalid"})
+    assert resp.status_code == 400
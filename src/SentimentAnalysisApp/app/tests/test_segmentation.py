@@ -0,0 +1,27 @@
+from app.services.analyzer.segmentation import SentenceSegmenter, split_sentences_by_rules
+
+
+def test_split_sentences_by_rules():
+    assert split_sentences_by_rules("Hra je super. Grafika taky! 10/10 doporučuji.") == [
+        "Hra je super.", "Grafika taky!", "10/10 doporučuji."]
+    # no split before a lowercase word (abbreviations)
+    assert split_sentences_by_rules("Chybí např. čeština... (Ale) ok?  Šmarja") == [
+        "Chybí např. čeština...", "(Ale) ok?", "Šmarja"]
+
+
+def test_segmenter_fallback_is_cached():
+    segmenter = SentenceSegmenter()
+    assert segmenter.get("klingon") is split_sentences_by_rules
+    assert segmenter.get(None) is split_sentences_by_rules
+    assert segmenter.segmenters["klingon"] is split_sentences_by_rules
+    # ISO codes are resolved to the names of the Punkt models
+    assert segmenter.get("cs") is segmenter.get("czech")
+
+
+def test_split_many_keeps_order():
+    segmenter = SentenceSegmenter()
+    texts = ["Good game. Bad servers.", "Dobrá hra. Špatné servery.", "Jedna věta."]
+    languages = ["english", "klingon", "english"]
+    assert segmenter.split_many(texts, languages) == [segmenter.split(text, language)
+                                                      for text, language in zip(texts, languages)]
+    assert segmenter.split_many(texts, languages)[1] == ["Dobrá hra.", "Špatné servery."]
@@ -91,6 +91,10 @@ async def seed_initial_test_data(session: AsyncSession):
     reviews = await create_objs(session, models.Review, TEST_REVIEW)
     # seed table aspect
     aspects = await create_objs(session, models.Aspect, TEST_ASPECTS)
+    # rollup of the aspects read by the game list
+    await crud.game_stats.refresh(session)
+    # daily rollup of the reviews and aspects read by the summaries
+    await crud.review_stats.refresh(session)
 
     return {"category": categories,
             "source": sources,